@@ -1,35 +1,215 @@
 import sqlite3
 import logging
+import threading
+from collections import OrderedDict
 
 from models import GoatUser
 
+logger = logging.getLogger('goat.db')
+
 
 class DBConnector:
-    @staticmethod
-    def get_users(chat_id: int) -> list[GoatUser] | None:
-        _con = sqlite3.connect('goat.db')
-        _cur = _con.cursor()
-        db_result = _cur.execute('SELECT `user_id`,`first_name`,`last_name`,`user_name` FROM `users` WHERE '
-                                 '`chat_id`=?', [chat_id])
+    DEFAULT_PATH = 'goat.db'
+    STATEMENT_CACHE_SIZE = 64
+    ROSTER_CACHE_SIZE = 1024
+
+    _SELECT_USERS = 'SELECT `user_id`,`first_name`,`last_name`,`user_name` FROM `users` WHERE `chat_id`=?'
+    _COUNT_USERS = 'SELECT COUNT(*) FROM `users` WHERE `chat_id`=?'
+    _INSERT_USER = 'INSERT INTO `users`(`chat_id`, `user_id`, `first_name`, `last_name`, `user_name`) ' \
+                   'VALUES(?, ?, ?, ?, ?) ON CONFLICT(`chat_id`, `user_id`) DO NOTHING'
+    _SAVE_SNAPSHOT = 'INSERT INTO `game_snapshots`(`chat_id`, `data`) VALUES(?, ?) ' \
+                     'ON CONFLICT(`chat_id`) DO UPDATE SET `data`=excluded.`data`'
+    _SELECT_SNAPSHOT = 'SELECT `data` FROM `game_snapshots` WHERE `chat_id`=?'
+    _SELECT_SNAPSHOT_CHAT_IDS = 'SELECT `chat_id` FROM `game_snapshots`'
+    _DELETE_SNAPSHOT = 'DELETE FROM `game_snapshots` WHERE `chat_id`=?'
+    _INSERT_EVENTS = 'INSERT INTO `game_events`(`chat_id`, `data`) VALUES(?, ?)'
+    _SELECT_EVENTS = 'SELECT `data` FROM `game_events` WHERE `chat_id`=? ORDER BY `id`'
+    _SELECT_PRIVATE_CHAT = 'SELECT `reachable` FROM `private_chats` WHERE `user_id`=?'
+    _SAVE_PRIVATE_CHAT = 'INSERT INTO `private_chats`(`user_id`, `reachable`) VALUES(?, ?) ' \
+                         'ON CONFLICT(`user_id`) DO UPDATE SET `reachable`=excluded.`reachable`'
+
+    # Applied in order, each in its own transaction; PRAGMA user_version holds the number of applied ones.
+    MIGRATIONS = [
+        # 1: the schema goat.db shipped with
+        ['CREATE TABLE IF NOT EXISTS "users" ('
+         '"id" INTEGER NOT NULL UNIQUE, "chat_id" INTEGER NOT NULL, "user_id" INTEGER NOT NULL, '
+         '"first_name" TEXT, "last_name" TEXT, "user_name" TEXT, PRIMARY KEY("id" AUTOINCREMENT))'],
+        # 2: one row per player and chat, looked up by chat
+        ['DELETE FROM `users` WHERE `id` NOT IN (SELECT MIN(`id`) FROM `users` GROUP BY `chat_id`, `user_id`)',
+         'CREATE UNIQUE INDEX IF NOT EXISTS `users_chat_id_user_id` ON `users`(`chat_id`, `user_id`)'],
+        # 3: state of the games in progress, see gameSnapshot
+        ['CREATE TABLE IF NOT EXISTS `game_snapshots` (`chat_id` INTEGER NOT NULL PRIMARY KEY, `data` BLOB NOT NULL)'],
+        # 4: append-only game actions, see gameLog
+        ['CREATE TABLE IF NOT EXISTS `game_events` (`id` INTEGER PRIMARY KEY, `chat_id` INTEGER NOT NULL, '
+         '`data` BLOB NOT NULL)',
+         'CREATE INDEX IF NOT EXISTS `game_events_chat_id` ON `game_events`(`chat_id`, `id`)'],
+        # 5: whether the bot can message a user in private, see playerCache.PrivateChatCache
+        ['CREATE TABLE IF NOT EXISTS `private_chats` (`user_id` INTEGER NOT NULL PRIMARY KEY, '
+         '`reachable` INTEGER NOT NULL)'],
+    ]
+
+    def __init__(self, db_path: str = DEFAULT_PATH, timeout: float = 5.0,
+                 roster_cache_size: int = ROSTER_CACHE_SIZE):
+        logger.debug('DBConnector constructor called %s', db_path)
+        self.db_path = db_path
+        self.timeout = timeout
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self._migrated = False
+        # chat_id -> list[GoatUser], least recently used first; a cached list is never changed, only replaced
+        self._rosters = OrderedDict()
+        self._roster_cache_size = roster_cache_size
+        self._rosters_lock = threading.Lock()
+        # bumped by every roster write, a roster read before it is not cached
+        self._roster_version = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def _get_connection(self) -> sqlite3.Connection:
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            return connection
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError('DBConnector is closed')
+            logger.debug('DBConnector opening connection to %s for thread %s', self.db_path,
+                         threading.current_thread().name)
+            # sqlite3 keeps compiled statements per connection, keyed by SQL text,
+            # so the constant queries above are prepared once per thread.
+            connection = sqlite3.connect(self.db_path, timeout=self.timeout, check_same_thread=False,
+                                         cached_statements=self.STATEMENT_CACHE_SIZE)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            self._connections.append(connection)
+            if not self._migrated:
+                self._migrate(connection)
+                self._migrated = True
+        self._local.connection = connection
+        return connection
+
+    @classmethod
+    def _migrate(cls, connection: sqlite3.Connection):
+        version, = connection.execute('PRAGMA user_version').fetchone()
+        while version < len(cls.MIGRATIONS):
+            # IMMEDIATE takes the write lock up front, so a second process waits and then sees the new version.
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                version, = connection.execute('PRAGMA user_version').fetchone()
+                if version < len(cls.MIGRATIONS):
+                    logger.info('DBConnector migrating schema to version %s', version + 1)
+                    for statement in cls.MIGRATIONS[version]:
+                        connection.execute(statement)
+                    version += 1
+                    connection.execute(f'PRAGMA user_version={version}')
+                connection.commit()
+            except BaseException:
+                connection.rollback()
+                raise
+
+    def get_schema_version(self) -> int:
+        version, = self._get_connection().execute('PRAGMA user_version').fetchone()
+        return version
+
+    def close(self):
+        logger.debug('DBConnector.close called')
+        with self._lock:
+            self._closed = True
+            connections, self._connections = self._connections, []
+        for connection in connections:
+            connection.close()
+        self._local = threading.local()
+
+    def _get_cached_roster(self, chat_id: int) -> list[GoatUser] | None:
+        with self._rosters_lock:
+            roster = self._rosters.get(chat_id)
+            if roster is not None:
+                self._rosters.move_to_end(chat_id)
+            return roster
+
+    def _cache_roster(self, chat_id: int, roster: list[GoatUser], version: int):
+        if self._roster_cache_size <= 0:
+            return
+        with self._rosters_lock:
+            if version != self._roster_version:
+                return
+            self._rosters[chat_id] = roster
+            self._rosters.move_to_end(chat_id)
+            while len(self._rosters) > self._roster_cache_size:
+                self._rosters.popitem(last=False)
+
+    def invalidate_roster(self, chat_id: int | None = None):
+        with self._rosters_lock:
+            self._roster_version += 1
+            if chat_id is None:
+                self._rosters.clear()
+            else:
+                self._rosters.pop(chat_id, None)
+
+    def get_users(self, chat_id: int) -> list[GoatUser] | None:
+        roster = self._get_cached_roster(chat_id)
+        if roster is not None:
+            return list(roster)
+        # read before the query: a write committed after it bumps the version
+        version = self._roster_version
+        db_result = self._get_connection().execute(self._SELECT_USERS, (chat_id,))
         result = []
         for row in db_result:
             user_id, first_name, last_name, user_name = row
             result.append(GoatUser(user_id, first_name, last_name, user_name))
-        _con.close()
-        return result
-
-    @staticmethod
-    def add_user(chat_id: int, user: GoatUser) -> bool:
-        _con = sqlite3.connect('goat.db')
-        _cur = _con.cursor()
-        _cur.execute('SELECT `id` FROM `users` WHERE `chat_id`=? AND `user_id`=?', (chat_id, user.id))
-        result = _cur.fetchone()
-        if result is not None:
+        self._cache_roster(chat_id, result, version)
+        return list(result)
+
+    def count_users(self, chat_id: int) -> int:
+        roster = self._get_cached_roster(chat_id)
+        if roster is not None:
+            return len(roster)
+        count, = self._get_connection().execute(self._COUNT_USERS, (chat_id,)).fetchone()
+        return count
+
+    def add_user(self, chat_id: int, user: GoatUser) -> bool:
+        connection = self._get_connection()
+        with connection:
+            cursor = connection.execute(self._INSERT_USER,
+                                        (chat_id, user.id, user.first_name, user.last_name, user.user_name))
+        if cursor.rowcount == 0:
             return False
-        _cur.execute('INSERT INTO `users`(`chat_id`, `user_id`, `first_name`, `last_name`, `user_name`) '
-                     'VALUES(?, ?, ?, ?, ?)',
-                     (chat_id, user.id, user.first_name, user.last_name, user.user_name))
-        _con.commit()
-        _con.close()
+        self.invalidate_roster(chat_id)
         return True
 
+    def save_snapshot(self, chat_id: int, data: bytes, events: bytes = b''):
+        connection = self._get_connection()
+        with connection:
+            connection.execute(self._SAVE_SNAPSHOT, (chat_id, data))
+            if len(events) > 0:
+                connection.execute(self._INSERT_EVENTS, (chat_id, events))
+
+    def load_events(self, chat_id: int) -> bytes:
+        return b''.join(data for data, in self._get_connection().execute(self._SELECT_EVENTS, (chat_id,)))
+
+    def load_snapshot(self, chat_id: int) -> bytes | None:
+        row = self._get_connection().execute(self._SELECT_SNAPSHOT, (chat_id,)).fetchone()
+        return row[0] if row is not None else None
+
+    def get_snapshot_chat_ids(self) -> list[int]:
+        return [chat_id for chat_id, in self._get_connection().execute(self._SELECT_SNAPSHOT_CHAT_IDS)]
+
+    def delete_snapshot(self, chat_id: int):
+        connection = self._get_connection()
+        with connection:
+            connection.execute(self._DELETE_SNAPSHOT, (chat_id,))
+
+    def get_private_chat(self, user_id: int) -> bool | None:
+        """None when the bot has never talked to the user in private."""
+        row = self._get_connection().execute(self._SELECT_PRIVATE_CHAT, (user_id,)).fetchone()
+        return bool(row[0]) if row is not None else None
+
+    def set_private_chat(self, user_id: int, reachable: bool):
+        connection = self._get_connection()
+        with connection:
+            connection.execute(self._SAVE_PRIVATE_CHAT, (user_id, int(reachable)))
@@ -0,0 +1,112 @@
+import asyncio
+import logging
+
+from telebot import asyncio_filters, custom_filters
+from telebot.async_telebot import AsyncTeleBot
+
+from chatExecutor import ChatExecutor
+
+logger = logging.getLogger('goat.async')
+
+
+class BridgeClosedError(RuntimeError):
+    pass
+
+
+class AsyncBotBridge:
+    """Compatibility shim: a sync TeleBot facade for the handlers and the outbox, which stay synchronous.
+
+    Only updates are received asynchronously. Each API call runs on the loop while the calling ChatExecutor or
+    outbox thread waits for it, so a slow call still holds a thread as in polling mode. Calls after close() raise
+    BridgeClosedError instead of waiting on a loop that is going away."""
+
+    def __init__(self, async_bot: AsyncTeleBot, loop: asyncio.AbstractEventLoop):
+        self._async_bot = async_bot
+        self._loop = loop
+        self._closed = False
+
+    def close(self):
+        self._closed = True
+
+    def __getattr__(self, name):
+        method = getattr(self._async_bot, name)
+        if not asyncio.iscoroutinefunction(method):
+            return method
+
+        def call(*args, **kwargs):
+            if self._closed or self._loop.is_closed():
+                raise BridgeClosedError(f'{name} called after the async transport stopped')
+            return asyncio.run_coroutine_threadsafe(method(*args, **kwargs), self._loop).result()
+
+        return call
+
+
+class _AsyncFilterAdapter(asyncio_filters.SimpleCustomFilter):
+    def __init__(self, sync_filter):
+        self.key = sync_filter.key
+        self._sync_filter = sync_filter
+
+    async def check(self, message):
+        return self._sync_filter.check(message)
+
+
+class _AsyncAdvancedFilterAdapter(asyncio_filters.AdvancedCustomFilter):
+    def __init__(self, sync_filter):
+        self.key = sync_filter.key
+        self._sync_filter = sync_filter
+
+    async def check(self, message, value):
+        return self._sync_filter.check(message, value)
+
+
+def _adapt_filter(sync_filter):
+    if isinstance(sync_filter, custom_filters.AdvancedCustomFilter):
+        return _AsyncAdvancedFilterAdapter(sync_filter)
+    return _AsyncFilterAdapter(sync_filter)
+
+
+def _make_dispatcher(executor: ChatExecutor, chat_key, handler):
+    async def dispatch(message):
+        # No awaits before submit: updates are queued in the order telebot delivers them.
+        executor.submit(chat_key(message), handler, message)
+
+    dispatch.__name__ = handler.__name__
+    return dispatch
+
+
+async def _run(token: str, message_handlers: list[dict], custom_filters: list, on_bot_created, chat_key,
+               max_workers: int, executor: ChatExecutor | None, on_stopping):
+    loop = asyncio.get_running_loop()
+    async_bot = AsyncTeleBot(token)
+    bridge = AsyncBotBridge(async_bot, loop)
+    on_bot_created(bridge)
+    owned = executor is None
+    if owned:
+        executor = ChatExecutor(max_workers)
+    for custom_filter in custom_filters:
+        async_bot.add_custom_filter(_adapt_filter(custom_filter))
+    for handler in message_handlers:
+        async_bot.register_message_handler(_make_dispatcher(executor, chat_key, handler['function']),
+                                           **handler['filters'])
+    try:
+        await async_bot.infinity_polling()
+    finally:
+        # Handlers still in flight and whatever they queued, e.g. in the outbox, need the loop for their API calls.
+        await loop.run_in_executor(None, executor.wait_idle)
+        if on_stopping is not None:
+            await loop.run_in_executor(None, on_stopping)
+        if owned:
+            await loop.run_in_executor(None, executor.shutdown)
+        bridge.close()
+        await async_bot.close_session()
+
+
+def run_async(token: str, message_handlers: list[dict], custom_filters: list, on_bot_created, chat_key,
+              max_workers: int = 16, executor: ChatExecutor | None = None, on_stopping=None):
+    """Polls with AsyncTeleBot and runs the handlers on `executor`; one it is given is left running.
+
+    on_bot_created(bridge) gets the AsyncBotBridge before polling starts; on_stopping() runs once the handlers are idle
+    and before the loop closes, e.g. to drain the outbox."""
+    logger.debug('run_async(%s) called', max_workers)
+    asyncio.run(_run(token, message_handlers, custom_filters, on_bot_created, chat_key, max_workers, executor,
+                     on_stopping))
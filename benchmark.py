@@ -0,0 +1,712 @@
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import deque
+from itertools import permutations
+
+import telebot
+from telebot import types
+
+import gameLog
+import gameSnapshot
+from DBConnector import DBConnector
+from fakeTelegram import FakeTelegram
+from webhookTransport import WebhookServer
+from deals import AllCardsDeal, DealTypes, PantsDeal
+from goatLogging import configure_logging
+from goatRegistry import GoatRegistry
+from keyboards import HandKeyboards, TRUMP_KEYBOARD, get_pants_keyboard
+from messageCommands import classify
+from models import Card, CardKind, CardSuit, CardSuitString, Deck, GoatUser, SUIT_STRING_TO_SUIT, \
+    START_GAME_MESSAGES, cards_from_mask, get_trick_winner, get_trump_mask, mask_from_cards
+from outbox import Outbox
+from playerCache import PrivateChatCache
+from simulation import PLAYER_IDS, RandomPolicy, Simulation
+
+USERS_TABLE_DDL = DBConnector.MIGRATIONS[0][0]
+SCALE_CHATS = 250_000
+SCALE_USERS_PER_CHAT = 8
+
+
+def _per_call_us(fn, iterations: int) -> float:
+    start = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return (time.perf_counter() - start) / iterations * 1_000_000
+
+
+def _report(name: str, value: float, unit: str = 'us/call'):
+    print(f'{name:<48} {value:>12.2f} {unit}')
+
+
+def _create_users_db(directory: str, chats: int, users_per_chat: int) -> str:
+    db_path = os.path.join(directory, 'bench.db')
+    con = sqlite3.connect(db_path)
+    con.execute(USERS_TABLE_DDL)
+    con.executemany('INSERT INTO `users`(`chat_id`, `user_id`, `first_name`) VALUES(?, ?, ?)',
+                    ((chat_id, user_id, f'user{user_id}') for chat_id in range(chats)
+                     for user_id in range(users_per_chat)))
+    con.commit()
+    con.close()
+    return db_path
+
+
+def _timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def _connect_per_call_get_users(db_path: str, chat_id: int) -> list[GoatUser]:
+    con = sqlite3.connect(db_path)
+    result = [GoatUser(*row) for row in con.execute('SELECT `user_id`,`first_name`,`last_name`,`user_name` '
+                                                    'FROM `users` WHERE `chat_id`=?', [chat_id])]
+    con.close()
+    return result
+
+
+def _connect_per_call_add_user(db_path: str, chat_id: int, user: GoatUser) -> bool:
+    con = sqlite3.connect(db_path)
+    if con.execute('SELECT `id` FROM `users` WHERE `chat_id`=? AND `user_id`=?', (chat_id, user.id)).fetchone():
+        con.close()
+        return False
+    con.execute('INSERT INTO `users`(`chat_id`, `user_id`, `first_name`, `last_name`, `user_name`) '
+                'VALUES(?, ?, ?, ?, ?)', (chat_id, user.id, user.first_name, user.last_name, user.user_name))
+    con.commit()
+    con.close()
+    return True
+
+
+def bench_db(iterations: int):
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = _create_users_db(directory, 100, 8)
+
+        _report('get_users, connection per call',
+                _per_call_us(lambda i: _connect_per_call_get_users(db_path, i % 100), iterations))
+        _report('add_user, connection per call',
+                _per_call_us(lambda i: _connect_per_call_add_user(db_path, 1000 + i, GoatUser(i, 'a', 'b', 'c')),
+                             iterations))
+        with DBConnector(db_path) as db:
+            _report('get_users, DBConnector',
+                    _per_call_us(lambda i: db.get_users(i % 100), iterations))
+            _report('add_user, DBConnector',
+                    _per_call_us(lambda i: db.add_user(2000 + i, GoatUser(i, 'a', 'b', 'c')), iterations))
+
+
+def bench_roster(iterations: int):
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = _create_users_db(directory, 100, 8)
+
+        with DBConnector(db_path, roster_cache_size=0) as db:
+            _report('get_users, no roster cache', _per_call_us(lambda i: db.get_users(i % 100), iterations))
+            _report('count_users, no roster cache', _per_call_us(lambda i: db.count_users(i % 100), iterations))
+        with DBConnector(db_path) as db:
+            _report('get_users, roster cache', _per_call_us(lambda i: db.get_users(i % 100), iterations))
+            _report('count_users, roster cache', _per_call_us(lambda i: db.count_users(i % 100), iterations))
+
+
+def bench_scale(iterations: int):
+    chats, total = SCALE_CHATS, SCALE_CHATS * SCALE_USERS_PER_CHAT
+    with tempfile.TemporaryDirectory() as directory:
+        db_path = _create_users_db(directory, chats, SCALE_USERS_PER_CHAT)
+        print(f'{total} users in {chats} chats')
+
+        # the baseline schema: no index on chat_id, every lookup scans the table
+        con = sqlite3.connect(db_path)
+        scans = max(1, min(iterations, 20))
+        _report('get_users, version 1 schema (table scan)',
+                _per_call_us(lambda i: con.execute(DBConnector._SELECT_USERS, (i * 7919 % chats,)).fetchall(), scans))
+        _report('add_user, version 1 schema (SELECT + INSERT)',
+                _per_call_us(lambda i: _add_user_select_insert(con, chats + i, GoatUser(i, 'a', 'b', 'c')), scans))
+        con.close()
+
+        with DBConnector(db_path, roster_cache_size=0) as db:
+            _report('migration to current schema', _timed(db.get_schema_version), 's')
+            _report('get_users, indexed',
+                    _per_call_us(lambda i: db.get_users(i * 7919 % chats), iterations))
+            _report('count_users, indexed',
+                    _per_call_us(lambda i: db.count_users(i * 7919 % chats), iterations))
+            _report('add_user, upsert (new)',
+                    _per_call_us(lambda i: db.add_user(2 * chats + i, GoatUser(i, 'a', 'b', 'c')), iterations))
+            _report('add_user, upsert (existing)',
+                    _per_call_us(lambda i: db.add_user(i * 7919 % chats, GoatUser(0, 'a', 'b', 'c')), iterations))
+
+
+def _add_user_select_insert(con: sqlite3.Connection, chat_id: int, user: GoatUser) -> bool:
+    with con:
+        if con.execute('SELECT `id` FROM `users` WHERE `chat_id`=? AND `user_id`=?', (chat_id, user.id)).fetchone():
+            return False
+        con.execute('INSERT INTO `users`(`chat_id`, `user_id`, `first_name`, `last_name`, `user_name`) '
+                    'VALUES(?, ?, ?, ?, ?)', (chat_id, user.id, user.first_name, user.last_name, user.user_name))
+    return True
+
+
+class _SnapshotPrompts(deque):
+    """Prompt queue of a Simulation that snapshots the game before every card step."""
+
+    def __init__(self, simulation: Simulation, db: DBConnector):
+        super().__init__()
+        self.simulation = simulation
+        self.db = db
+        self.sizes = []
+        self.dump_time = 0.0
+        self.save_time = 0.0
+        self.load_time = 0.0
+
+    def popleft(self):
+        prompt = super().popleft()
+        if prompt[0] == 'step':
+            start = time.perf_counter()
+            data = gameSnapshot.dump(True, 0, self.simulation.game)
+            dumped = time.perf_counter()
+            self.db.save_snapshot(-1, data)
+            saved = time.perf_counter()
+            gameSnapshot.load(data, self.simulation.create_game)
+            self.load_time += time.perf_counter() - saved
+            self.dump_time += dumped - start
+            self.save_time += saved - dumped
+            self.sizes.append(len(data))
+        return prompt
+
+
+def bench_snapshot(iterations: int):
+    random.seed(0)
+    simulation = Simulation(RandomPolicy(0))
+    with tempfile.TemporaryDirectory() as directory, DBConnector(os.path.join(directory, 'bench.db')) as db:
+        prompts = simulation._prompts = _SnapshotPrompts(simulation, db)
+        while len(prompts.sizes) < iterations:
+            simulation.run(1)
+    count = len(prompts.sizes)
+    _report('snapshot size, average', sum(prompts.sizes) / count, 'bytes')
+    _report('snapshot size, max', max(prompts.sizes), 'bytes')
+    _report('snapshot encode per card', prompts.dump_time / count * 1_000_000)
+    _report('snapshot write per card (WAL)', prompts.save_time / count * 1_000_000)
+    _report('snapshot decode', prompts.load_time / count * 1_000_000)
+
+
+def bench_replay(iterations: int):
+    # iterations are deals here
+    random.seed(0)
+    log = gameLog.GameLog()
+    simulation = Simulation(RandomPolicy(0), log=log)
+    simulation.run(iterations)
+    data = log.take()
+    start = time.perf_counter()
+    game, count = gameLog.replay(data)
+    elapsed = time.perf_counter() - start
+    if gameSnapshot.dump(True, 0, game) != gameSnapshot.dump(True, 0, simulation.game):
+        raise RuntimeError('replayed game differs from the simulated one')
+    _report('log size per card step', len(data) / simulation.stats.steps, 'bytes')
+    _report('replay per event', elapsed / count * 1_000_000)
+    _report('replay', iterations / elapsed, 'deals/s')
+    _report('simulation with log', simulation.stats.get_deals_per_second(), 'deals/s')
+
+
+class _PantsKeyPolicy(RandomPolicy):
+    """Plays at random and keeps the moves key of every double pants prompt."""
+
+    def __init__(self, seed: int | None = None):
+        super().__init__(seed)
+        self.moves_keys = []
+
+    def choose_pants(self, game, player_id: int) -> tuple:
+        moves_key = game.get_pants_moves_key(player_id)
+        if moves_key[0] == 2:
+            self.moves_keys.append(moves_key)
+        return super().choose_pants(game, player_id)
+
+
+def _pants_keyboard_per_prompt(moves_key: tuple) -> str:
+    # the prompt before moves keys: every ordered pair listed, formatted, laid out and serialized again
+    markup = types.ReplyKeyboardMarkup()
+    markup.selective = True
+    cards_str = []
+    for card_pair in list(permutations(cards_from_mask(moves_key[1]), 2)):
+        cards_str.append(f'{card_pair[0].to_string()} {card_pair[1].to_string()}')
+    markup.add(*cards_str, row_width=4)
+    return markup.to_json()
+
+
+def bench_pants(iterations: int):
+    random.seed(0)
+    policy = _PantsKeyPolicy(0)
+    Simulation(policy, deal_names=[DealTypes.names[5]]).run(200)
+    keys = policy.moves_keys
+    offered = sum(sum(1 for _ in PantsDeal.iter_pants_moves(key)) for key in keys)
+    print(f'{len(keys)} double pants prompts, {offered / len(keys):.1f} ordered pairs per prompt')
+    _report('keyboard per prompt', _per_call_us(lambda i: _pants_keyboard_per_prompt(keys[i % len(keys)]),
+                                                iterations))
+
+    def build_cold(i: int):
+        get_pants_keyboard.cache_clear()
+        get_pants_keyboard(keys[i % len(keys)])
+
+    _report('keyboard from moves key', _per_call_us(build_cold, iterations))
+    for key in keys:
+        get_pants_keyboard(key)
+    _report('keyboard from moves key, cached', _per_call_us(lambda i: get_pants_keyboard(keys[i % len(keys)]),
+                                                           iterations))
+
+
+def _trump_keyboard_per_prompt() -> str:
+    markup = types.ReplyKeyboardMarkup(one_time_keyboard=True)
+    markup.selective = True
+    markup.row(types.KeyboardButton(CardSuitString.DIAMONDS.value), types.KeyboardButton(CardSuitString.HEARTS.value))
+    markup.row(types.KeyboardButton(CardSuitString.SPADES.value), types.KeyboardButton(CardSuitString.CLUBS.value))
+    markup.row("Без козыря")
+    return markup.to_json()
+
+
+def _hand_keyboard_per_prompt(hand: int) -> str:
+    markup = types.ReplyKeyboardMarkup()
+    markup.selective = True
+    markup.add(*[card.to_string() for card in cards_from_mask(hand)], row_width=4)
+    return markup.to_json()
+
+
+def bench_keyboards(iterations: int):
+    _report('trump keyboard per prompt', _per_call_us(lambda i: _trump_keyboard_per_prompt(), iterations))
+    _report('trump keyboard, serialized once', _per_call_us(lambda i: TRUMP_KEYBOARD, iterations))
+    # a player's hand over a deal: eight cards, one played per prompt
+    random.seed(0)
+    hands = []
+    for _ in range(max(1, iterations // 8)):
+        cards = random.sample(Card.get_all(), 8)
+        hands.extend(mask_from_cards(cards[i:]) for i in range(8))
+    _report('hand keyboard per prompt', _per_call_us(lambda i: _hand_keyboard_per_prompt(hands[i % len(hands)]),
+                                                     iterations))
+    hand_keyboards = HandKeyboards()
+    _report('hand keyboard, incremental', _per_call_us(lambda i: hand_keyboards.get(1, hands[i % len(hands)]),
+                                                       iterations))
+
+
+ROUTING_CHATS = 10_000
+
+
+class _SeatedSession:
+    __slots__ = ('chat_id', 'is_started', 'game')
+
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.is_started = True
+        self.game = gameLog.create_silent_game(chat_id * 4)
+        for player_id in range(chat_id * 4 + 1, chat_id * 4 + 4):
+            self.game.add_player(player_id)
+
+
+def _find_by_player_scan(registry: GoatRegistry, user_id: int):
+    # find_by_player before the seat index: every started game is asked for the player
+    for chat_id, entry in registry._sessions.items():
+        session = entry[0]
+        if session.is_started and session.game.has_player(user_id):
+            registry._touch(chat_id, entry)
+            return session
+    return None
+
+
+def bench_routing(iterations: int):
+    registry = GoatRegistry(_SeatedSession, max_sessions=ROUTING_CHATS)
+    for chat_id in range(ROUTING_CHATS):
+        session = registry.get_or_create(chat_id)
+        registry.set_seats(chat_id, session.game.get_player_ids())
+    print(f'{ROUTING_CHATS} started games')
+    players = ROUTING_CHATS * 4
+    scans = max(1, min(iterations, 200))
+    _report('find_by_player, scan',
+            _per_call_us(lambda i: _find_by_player_scan(registry, i * 7919 % players), scans))
+    _report('find_by_player, seat index', _per_call_us(lambda i: registry.find_by_player(i * 7919 % players),
+                                                       iterations))
+    _report('find_by_player, not seated', _per_call_us(lambda i: registry.find_by_player(players + i), iterations))
+
+
+def _text_message(text: str, chat_id: int = -100, reply_to_bot: bool = True):
+    chat = {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'}
+    data = {'message_id': 2, 'date': 0, 'chat': chat, 'from': {'id': 7, 'is_bot': False, 'first_name': 'u'},
+            'text': text}
+    if reply_to_bot:
+        data['reply_to_message'] = {'message_id': 1, 'date': 0, 'chat': chat, 'text': '',
+                                    'from': {'id': 1, 'is_bot': True, 'first_name': 'b', 'username': 'GoatGroupBot'}}
+    return json.dumps(data)
+
+
+def _is_reply_to_bot(message) -> bool:
+    reply_message = message.reply_to_message
+    return reply_message is not None and reply_message.from_user.is_bot is not False and \
+        reply_message.from_user.username.lower() == 'goatgroupbot'
+
+
+def _chained_filters(message):
+    # the custom filters the bot had before messageCommands, in handler order, and the handler's own parsing
+    if _is_reply_to_bot(message) and message.text.lower() in [x.lower() for x in START_GAME_MESSAGES.keys()]:
+        return 'join'
+    if _is_reply_to_bot(message) and message.text.lower() in SUIT_STRING_TO_SUIT:
+        return SUIT_STRING_TO_SUIT[message.text]
+    text = message.text.strip()
+    if _is_reply_to_bot(message) and 2 <= len(text) <= 3 and Card.try_parse(text)[0]:
+        return Card.try_parse(message.text)[1]
+    if message.chat.id == message.from_user.id and 2 <= len(text) <= 3 and Card.try_parse(text)[0]:
+        return Card.try_parse(message.text)[1]
+    if 5 <= len(message.text) <= 7:
+        pair = message.text.split(' ', 2)
+        if len(pair) == 2 and Card.try_parse(pair[0].strip())[0] and Card.try_parse(pair[1].strip())[0]:
+            pair = message.text.split(' ', 2)
+            return Card.try_parse(pair[0])[1], Card.try_parse(pair[1])[1]
+    if _is_reply_to_bot(message) and DealTypes().is_deal(message.text):
+        return message.text
+    return None
+
+
+def bench_classify(iterations: int):
+    # the mix of a deal: mostly cards, a trump, a deal name, pants pairs and chatter
+    texts = [_text_message(card.text) for card in Deck().cards] + \
+        [_text_message(card.text, chat_id=7, reply_to_bot=False) for card in Deck().cards[:8]] + \
+        [_text_message(f'{left.text} {right.text}', reply_to_bot=False)
+         for left, right in zip(Deck().cards[:4], Deck().cards[4:8])] + \
+        [_text_message('\U00002665'), _text_message(DealTypes.names[2]), _text_message('Погнали'),
+         _text_message('ну ты даешь', reply_to_bot=False)]
+    messages = [types.Message.de_json(text) for text in texts]
+    _report('chained filters', _per_call_us(lambda i: _chained_filters(messages[i % len(messages)]), iterations))
+
+    def classify_fresh(i: int):
+        message = messages[i % len(messages)]
+        message.__dict__.pop('goat_command', None)
+        classify(message)
+
+    _report('classify', _per_call_us(classify_fresh, iterations))
+    _report('classify, memoized', _per_call_us(lambda i: classify(messages[i % len(messages)]), iterations))
+
+
+TRANSPORT_CHATS = 50
+TRANSPORT_API_LATENCY = 0.05
+
+
+def _echo_bot() -> telebot.TeleBot:
+    tele_bot = telebot.TeleBot('1:bench')
+
+    @tele_bot.message_handler()
+    def echo(message: types.Message):
+        tele_bot.send_message(message.chat.id, message.text)
+
+    return tele_bot
+
+
+def _push_transport_messages(fake: FakeTelegram, count: int) -> float:
+    messages = [fake.make_message(-1 - i % TRANSPORT_CHATS, 10 + i % 4, str(i)) for i in range(count)]
+    start = time.perf_counter()
+    fake.push(messages)
+    if not fake.wait_sent(count):
+        raise RuntimeError(f'only {len(fake.sent)} of {count} updates were handled')
+    return time.perf_counter() - start
+
+
+def _is_ordered_per_chat(sent: list) -> bool:
+    last = {}
+    for chat_id, text in sent:
+        if int(text) < last.get(chat_id, -1):
+            return False
+        last[chat_id] = int(text)
+    return True
+
+
+def bench_transport(iterations: int):
+    # iterations are updates here, spread over TRANSPORT_CHATS chats; every handler makes one API call
+    saved_api_url = telebot.apihelper.API_URL
+    fake = FakeTelegram(TRANSPORT_API_LATENCY)
+    fake.start()
+    fake.use()
+    try:
+        tele_bot = _echo_bot()
+        thread = threading.Thread(target=tele_bot.infinity_polling, kwargs={'long_polling_timeout': 1},
+                                  daemon=True)
+        thread.start()
+        elapsed = _push_transport_messages(fake, iterations)
+        tele_bot.stop_polling()
+        thread.join()
+        _report('polling, TeleBot worker pool', iterations / elapsed, 'updates/s')
+        _report('polling, ordered per chat', _is_ordered_per_chat(fake.sent), 'bool')
+
+        fake.sent.clear()
+        server = WebhookServer(_echo_bot(), lambda message: message.chat.id, '127.0.0.1', 0, max_pending=100)
+        server.start()
+        host, port = server.server_address[:2]
+        server.bot.set_webhook(url=f'http://{host}:{port}/', max_connections=16)
+        elapsed = _push_transport_messages(fake, iterations)
+        server.stop()
+        _report('webhook, 16 chat workers', iterations / elapsed, 'updates/s')
+        _report('webhook, ordered per chat', _is_ordered_per_chat(fake.sent), 'bool')
+        _report('webhook, redeliveries after 503', fake.retries, 'requests')
+    finally:
+        fake.stop()
+        telebot.apihelper.API_URL = saved_api_url
+
+
+TABLE_DEALS = 6
+# time between moves; the live table debounce is kept below it, as with people playing
+TABLE_MOVE_DELAY = 0.02
+TABLE_DEBOUNCE = 0.01
+
+
+class _BenchOutbox(Outbox):
+    # the fake has no rate limits, only the API calls are counted
+    GLOBAL_RATE = 100000
+    PRIVATE_CHAT_RATE = PRIVATE_CHAT_BURST = 100000
+    GROUP_CHAT_RATE = GROUP_CHAT_BURST = 100000
+
+
+def _import_goat(directory: str):
+    """goat.py builds its bot and opens its database on import; any token in the right format does for the fake
+    API."""
+    os.environ.setdefault('GOAT_DB_PATH', os.path.join(directory, 'goat.db'))
+    os.environ.setdefault('GOAT_TOKEN', '1:bench')
+    from goat import Goat
+    return Goat
+
+
+def _start_bench_game(goat_class, db: DBConnector, outbox: Outbox, live_table: bool = False):
+    """A Goat with four seated players; returns it and the queue of (handler name, player id) prompts."""
+    session = goat_class(outbox.bot, -100, db, outbox, live_table=live_table)
+    prompts = deque()
+    for name in ('on_request_trump', 'on_ask_for_step', 'on_ask_for_pants_step', 'on_ask_for_deal'):
+        handler = getattr(session, name)
+        setattr(session, name, lambda player_id, name=name, handler=handler: (prompts.append((name, player_id)),
+                                                                               handler(player_id)))
+    for player_id in PLAYER_IDS:
+        session.profiles.remember(types.User(player_id, False, f'user{player_id}'))
+    session.is_started = True
+    session.game = session._create_game(PLAYER_IDS[0], gameLog.GameLog())
+    for player_id in PLAYER_IDS[1:]:
+        session.game.add_player(player_id)
+    session._update_seats()
+    return session, prompts
+
+
+def _bench_message(fake: FakeTelegram, chat_id: int, user_id: int, text: str) -> types.Message:
+    return types.Message.de_json(fake.make_message(chat_id, user_id, text))
+
+
+def _play_table_deals(goat_class, fake: FakeTelegram, db: DBConnector, live_table: bool) -> dict:
+    """Plays TABLE_DEALS random deals through a Goat; returns API calls by method and chat kind."""
+    outbox = _BenchOutbox(telebot.TeleBot('1:bench'))
+    outbox.start()
+    session, prompts = _start_bench_game(goat_class, db, outbox, live_table)
+    if session.table is not None:
+        session.table.debounce = TABLE_DEBOUNCE
+    fake.sent.clear()
+    fake.edited.clear()
+    policy = RandomPolicy(0)
+    game = session.game
+    game.first_deal()
+    deals = 0
+    while deals < TABLE_DEALS:
+        prompt, player_id = prompts.popleft()
+        time.sleep(TABLE_MOVE_DELAY)
+        if prompt == 'on_ask_for_deal':
+            deals += 1
+            if deals < TABLE_DEALS:
+                game.start_next_deal(player_id, DealTypes.names[deals % len(DealTypes.names)])
+        elif prompt == 'on_ask_for_step':
+            # cards are played as players send them: in private from the hand keyboard in live table mode
+            card = policy.choose_card(game, player_id)
+            if live_table:
+                session.on_card_private_received(_bench_message(fake, player_id, player_id, card.text), card)
+            else:
+                session.on_card_received(_bench_message(fake, session.chat_id, player_id, card.text), card)
+        elif prompt == 'on_ask_for_pants_step':
+            cards = policy.choose_pants(game, player_id)
+            if len(cards) == 1:
+                game.do_player_step(player_id, cards[0])
+            else:
+                game.do_player_pants_step(player_id, cards[0], cards[1])
+        else:
+            game.select_trump(player_id, policy.choose_trump(game, player_id))
+    outbox.stop()
+    return {'group sends': sum(1 for chat_id, _ in fake.sent if chat_id < 0),
+            'private sends': sum(1 for chat_id, _ in fake.sent if chat_id > 0),
+            'group edits': len(fake.edited)}
+
+
+def bench_table(iterations: int):
+    # a deal of every type, random play
+    with tempfile.TemporaryDirectory() as directory:
+        Goat = _import_goat(directory)
+        saved_api_url = telebot.apihelper.API_URL
+        fake = FakeTelegram()
+        fake.start()
+        fake.use()
+        try:
+            with DBConnector(os.path.join(directory, 'bench.db')) as db:
+                for live_table in (False, True):
+                    random.seed(0)
+                    counts = _play_table_deals(Goat, fake, db, live_table)
+                    mode = 'live table' if live_table else 'messages'
+                    for key, count in counts.items():
+                        _report(f'{mode}, {key} per deal', count / TABLE_DEALS, 'calls')
+                    _report(f'{mode}, group calls per deal', (counts['group sends'] + counts['group edits']) /
+                            TABLE_DEALS, 'calls')
+                    _report(f'{mode}, all calls per deal', sum(counts.values()) / TABLE_DEALS, 'calls')
+        finally:
+            fake.stop()
+            telebot.apihelper.API_URL = saved_api_url
+
+
+FANOUT_API_LATENCY = 0.05
+
+
+def _deliver_hands(goat_class, fake: FakeTelegram, db: DBConnector, workers: int) -> tuple:
+    """Starts a deal and waits for the hands of the three other players; returns (seconds, group notices)."""
+    outbox = _BenchOutbox(telebot.TeleBot('1:bench'), workers=workers)
+    outbox.start()
+    session, prompts = _start_bench_game(goat_class, db, outbox)
+    session.game.first_deal()
+    name, player_id = prompts.popleft()
+    fake.sent.clear()
+    start = time.perf_counter()
+    session.game.select_trump(player_id, CardSuit.HEARTS)
+    outbox.stop()
+    elapsed = time.perf_counter() - start
+    return elapsed, sum(1 for chat_id, text in fake.sent if chat_id < 0 and 'не могу прислать' in text)
+
+
+def bench_fanout(iterations: int):
+    # the first deal hands cards to everyone in private once the trump is chosen
+    with tempfile.TemporaryDirectory() as directory:
+        Goat = _import_goat(directory)
+        saved_api_url = telebot.apihelper.API_URL
+        fake = FakeTelegram(FANOUT_API_LATENCY)
+        fake.start()
+        fake.use()
+        try:
+            with DBConnector(os.path.join(directory, 'bench.db')) as db:
+                for workers in (1, Outbox.WORKERS):
+                    random.seed(0)
+                    elapsed, _ = _deliver_hands(Goat, fake, db, workers)
+                    _report(f'hands delivered, {workers} outbox workers', elapsed * 1000, 'ms')
+                fake.blocked.add(PLAYER_IDS[2])
+                random.seed(0)
+                elapsed, notices = _deliver_hands(Goat, fake, db, Outbox.WORKERS)
+                _report('hands delivered, one player blocked the bot', elapsed * 1000, 'ms')
+                _report('group notices of undelivered hands', notices, 'messages')
+        finally:
+            fake.stop()
+            telebot.apihelper.API_URL = saved_api_url
+
+
+JOIN_API_LATENCY = 0.01
+JOIN_USERS = 50
+
+
+def bench_joins(iterations: int):
+    # the private chat check of a join: a probe message the first time, the DB after that
+    with tempfile.TemporaryDirectory() as directory:
+        Goat = _import_goat(directory)
+        saved_api_url = telebot.apihelper.API_URL
+        fake = FakeTelegram(JOIN_API_LATENCY)
+        fake.start()
+        fake.use()
+        try:
+            with DBConnector(os.path.join(directory, 'bench.db')) as db:
+                tele_bot = telebot.TeleBot('1:bench')
+                session = Goat(tele_bot, -100, db, Outbox(tele_bot))
+                users = [types.User(1000 + i, False, f'user{i}') for i in range(JOIN_USERS)]
+                for name in ('first join, probe', 'next joins, cached', 'next joins, other process'):
+                    if name.endswith('process'):
+                        session.private_chats = PrivateChatCache(db)
+                    fake.calls.clear()
+                    elapsed = _timed(lambda: [session.check_can_send_private(user) for user in users])
+                    _report(name, elapsed / JOIN_USERS * 1e6)
+                    _report(f'{name}, API calls per join', sum(fake.calls.values()) / JOIN_USERS, 'calls')
+        finally:
+            fake.stop()
+            telebot.apihelper.API_URL = saved_api_url
+
+
+def _no_op(*args):
+    pass
+
+
+def _card_step_path(deal: AllCardsDeal, trick: list, i: int):
+    deal.cards = trick
+    deal._get_bribe_data(trick, CardSuit.HEARTS)
+    deal._check_for_jackpot()
+    deal.is_completed()
+    deal.get_player_cards(i % 4)
+    deal._get_owner_internal(deal.get_player_hand(0), 0)
+
+
+def bench_logging(iterations: int):
+    deal = AllCardsDeal(0)
+    deal.request_send_current_cards_to_pm_handler = _no_op
+    deal.request_trump_handler = _no_op
+    deal.process_deal()
+    deal.trump = CardSuit.HEARTS
+    trick = [{'card': card, 'owner': i} for i, card in enumerate(deal.get_player_cards(0)[:4])]
+    root = logging.getLogger()
+    saved_handlers, saved_level = root.handlers[:], root.level
+    try:
+        for name, kwargs in [('DEBUG', {'level': 'DEBUG'}),
+                             ('DEBUG, 1% of step events', {'level': 'DEBUG', 'step_sample_rate': 0.01}),
+                             ('INFO', {'level': 'INFO'}),
+                             ('production', {'production': True})]:
+            configure_logging(**kwargs)
+            root.handlers[0].setStream(io.StringIO())
+            _report(f'card step path, {name}', _per_call_us(lambda i: _card_step_path(deal, trick, i), iterations))
+    finally:
+        configure_logging(production=False, step_sample_rate=1.0)
+        root.handlers[:] = saved_handlers
+        root.setLevel(saved_level)
+
+
+def bench_cards(iterations: int):
+    texts = [card.to_string() for card in Deck().cards]
+    cards = [Card.try_parse(text)[1] for text in texts]
+    pairs = [(cards[i], cards[(i * 7 + 3) % len(cards)]) for i in range(len(cards))]
+    trick = cards[:4]
+    _report('Card.try_parse', _per_call_us(lambda i: Card.try_parse(texts[i % len(texts)]), iterations))
+    _report('Card(kind, suit)', _per_call_us(lambda i: Card(CardKind.ACE, CardSuit.CLUBS), iterations))
+    _report('Card.greater_than',
+            _per_call_us(lambda i: pairs[i % len(pairs)][0].greater_than(pairs[i % len(pairs)][1], CardSuit(i % 5)),
+                         iterations))
+    _report('Card.equals', _per_call_us(lambda i: pairs[i % len(pairs)][0].equals(pairs[i % len(pairs)][1]),
+                                        iterations))
+    _report('get_trick_winner', _per_call_us(lambda i: get_trick_winner(trick, CardSuit.HEARTS), iterations))
+    _report('score of a trick', _per_call_us(lambda i: sum(card.get_value() for card in trick), iterations))
+    hand_cards = cards[:8]
+    hand = mask_from_cards(hand_cards)
+    trump_mask = get_trump_mask(CardSuit.HEARTS)
+    _report('hand contains card (list)', _per_call_us(lambda i: cards[i % len(cards)] in hand_cards, iterations))
+    _report('hand contains card (mask)', _per_call_us(lambda i: hand & cards[i % len(cards)].bit != 0, iterations))
+    _report('non-trump count (list)',
+            _per_call_us(lambda i: sum(1 for card in hand_cards if not card.is_trump(CardSuit.HEARTS)), iterations))
+    _report('non-trump count (mask)', _per_call_us(lambda i: (hand & ~trump_mask).bit_count(), iterations))
+
+
+BENCHMARKS = {'db': bench_db, 'roster': bench_roster, 'scale': bench_scale, 'logging': bench_logging,
+              'cards': bench_cards, 'snapshot': bench_snapshot, 'replay': bench_replay,
+              'classify': bench_classify, 'transport': bench_transport, 'routing': bench_routing,
+              'pants': bench_pants, 'keyboards': bench_keyboards,
+              'table': bench_table, 'fanout': bench_fanout, 'joins': bench_joins}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GoatGroupBot micro benchmarks')
+    parser.add_argument('names', nargs='*', metavar='name',
+                        help=f'benchmarks to run ({", ".join(BENCHMARKS.keys())}), all by default')
+    parser.add_argument('-n', '--iterations', type=int, default=2000)
+    args = parser.parse_args()
+    unknown = [name for name in args.names if name not in BENCHMARKS]
+    if len(unknown) > 0:
+        parser.error(f'unknown benchmarks: {", ".join(unknown)}')
+    for name in args.names or BENCHMARKS.keys():
+        print(f'--- {name}')
+        BENCHMARKS[name](args.iterations)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+import logging
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('goat.executor')
+
+
+class ChatExecutor:
+    """Runs tasks on a shared thread pool, one at a time and in submission order for each chat.
+
+    try_submit_all() refuses work once max_pending tasks are queued or running; submit() always queues."""
+
+    def __init__(self, max_workers: int = 16, max_pending: int | None = None):
+        logger.debug('ChatExecutor constructor called %s, %s', max_workers, max_pending)
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='goat-chat')
+        self._max_pending = max_pending
+        # chat key -> deque of pending (fn, args), present while the chat is being drained
+        self._queues = {}
+        # tasks queued or running
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def submit(self, key, fn, *args):
+        with self._lock:
+            started = self._enqueue(key, fn, args)
+        if started:
+            self._pool.submit(self._drain, key)
+
+    def try_submit_all(self, tasks: list[tuple]) -> bool:
+        """Queues (key, fn, args) tasks in order, all of them or none if that would exceed max_pending."""
+        with self._lock:
+            if self._max_pending is not None and self._pending + len(tasks) > self._max_pending:
+                return False
+            started = [key for key, fn, args in tasks if self._enqueue(key, fn, args)]
+        for key in started:
+            self._pool.submit(self._drain, key)
+        return True
+
+    def _enqueue(self, key, fn, args) -> bool:
+        """Returns True when the chat has no drain running yet."""
+        self._pending += 1
+        queue = self._queues.get(key)
+        if queue is not None:
+            queue.append((fn, args))
+            return False
+        self._queues[key] = deque([(fn, args)])
+        return True
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._pending
+
+    def wait_idle(self):
+        """Blocks until every task queued so far has run."""
+        with self._idle:
+            while self._pending > 0:
+                self._idle.wait()
+
+    def _drain(self, key):
+        while True:
+            with self._lock:
+                queue = self._queues[key]
+                if len(queue) == 0:
+                    del self._queues[key]
+                    return
+                fn, args = queue.popleft()
+            try:
+                fn(*args)
+            except Exception:
+                logger.exception('ChatExecutor task for chat %s failed', key)
+            finally:
+                with self._lock:
+                    self._pending -= 1
+                    if self._pending == 0:
+                        self._idle.notify_all()
+
+    def shutdown(self, wait: bool = True):
+        logger.debug('ChatExecutor.shutdown called')
+        self._pool.shutdown(wait=wait)
@@ -1,7 +1,12 @@
 from enum import Enum
 from itertools import permutations
-from models import Card, CardSuit, Deck, CardKind, StepResult
+from models import Card, CardSuit, Deck, CardKind, StepResult, get_trick_winner, cards_from_mask, get_trump_mask, \
+    KIND_MASKS
 import logging
+from goatLogging import STEP_LOGGER_NAME, LazyCards
+
+logger = logging.getLogger('goat.deals')
+step_logger = logging.getLogger(STEP_LOGGER_NAME)
 
 
 class DealType(Enum):
@@ -18,50 +23,56 @@ class Deal:
     request_show_jackpot_handler = None
 
     def __init__(self, owner_index: int):
-        logging.debug(f'Deal construct owner_index: {owner_index}')
+        logger.debug('Deal construct owner_index: %s', owner_index)
         self.is_started = False
         self.deck = Deck()
         self.deck.shuffle()
         self.cards_history = []
         self.owner_index = owner_index
-        self.player1_cards = []
-        self.player2_cards = []
-        self.player3_cards = []
-        self.player4_cards = []
+        # bitmask over Card.index per player, see models.cards_from_mask
+        self.player_hands = [0, 0, 0, 0]
         self.player_index = owner_index
         self.team1_cards = []
         self.team2_cards = []
         self.cards = []
         self.trump = None
+        self.is_jackpot = False
 
     def get_deal_type(self) -> DealType:
         raise NotImplementedError()
 
     def get_player_cards(self, player_index: int) -> list:
-        logging.debug(f'Deal.get_player_cards({player_index}) called')
-        cards = {0: self.player1_cards, 1: self.player2_cards, 2: self.player3_cards, 3: self.player4_cards}
-        return cards.get(player_index)
+        step_logger.debug('Deal.get_player_cards(%s) called', player_index)
+        if player_index is None or not 0 <= player_index < 4:
+            return None
+        return cards_from_mask(self.player_hands[player_index])
+
+    def get_player_hand(self, player_index: int) -> int:
+        return self.player_hands[player_index]
+
+    def get_player_card_count(self, player_index: int) -> int:
+        return self.player_hands[player_index].bit_count()
+
+    def has_player_card(self, player_index: int, card: Card) -> bool:
+        return self.player_hands[player_index] & card.bit != 0
+
+    def _add_player_card(self, player_index: int, card: Card):
+        self.player_hands[player_index] |= card.bit
 
     def _remove_player_card(self, player_index: int, card: Card):
-        logging.debug(f'Deal._remove_player_card({player_index}, {card.to_string()}) called')
-        player_cards = self.get_player_cards(player_index)
-        index = -1
-        for i in range(0, len(player_cards)):
-            if card.equals(player_cards[i]):
-                index = i
-                break
-        player_cards.remove(player_cards[index])
+        step_logger.debug('Deal._remove_player_card(%s, %s) called', player_index, card)
+        self.player_hands[player_index] &= ~card.bit
 
     @staticmethod
     def _get_team_index_by_player_index(player_index: int) -> int:
-        logging.debug(f'Deal._get_team_index_by_player_index({player_index}) called')
+        step_logger.debug('Deal._get_team_index_by_player_index(%s) called', player_index)
         if player_index == 0 or player_index == 2:
             return 0
         else:
             return 1
 
     def _get_team_taken_cards(self, team_index: int) -> list[Card]:
-        logging.debug(f'Deal._get_team_taken_cards({team_index}) called')
+        step_logger.debug('Deal._get_team_taken_cards(%s) called', team_index)
         if team_index == 0:
             return self.team1_cards
         else:
@@ -69,36 +80,30 @@ class Deal:
 
     @staticmethod
     def _calc_score(cards: list) -> int:
-        logging.debug(f'Deal._calc_score({" ".join([x.to_string() for x in cards])}) called')
+        if step_logger.isEnabledFor(logging.DEBUG):
+            step_logger.debug('Deal._calc_score(%s) called', LazyCards(cards))
         total_score = 0
         for card in cards:
             total_score += card['card'].get_value()
-        logging.debug(f'Deal._calc_score result {total_score}')
+        step_logger.debug('Deal._calc_score result %s', total_score)
         return total_score
 
     def get_team_score(self, team_index: int) -> int:
-        logging.debug(f'Deal.get_team_score({team_index}) called')
+        step_logger.debug('Deal.get_team_score(%s) called', team_index)
         return self._calc_score(self._get_team_taken_cards(team_index))
 
     def _process_jackpot(self):
-        logging.debug('Deal._process_jackpot called')
+        logger.debug('Deal._process_jackpot called')
+        self.is_jackpot = True
         self.request_show_jackpot_handler(self._get_jackpot_winner(), self._get_jackpot_looser())
         self.cards_history.append(self.cards.copy())
         self.cards.clear()
 
     def _process_bribe(self) -> int:
-        logging.debug('Deal._process_bribe called')
-        current_owner = 0
-        card = None
-        for i in range(0, 4):
-            if card is None:
-                card = self.cards[i]
-                current_owner = self.cards[i]['owner']
-            else:
-                if card['card'].greaterThan(self.cards[i]['card'], self.trump):
-                    current_owner = self.cards[i]['owner']
-                card = self.cards[i]
-        logging.debug(f'Deal._process_bribe owner: {current_owner} card: {card.to_string()}')
+        step_logger.debug('Deal._process_bribe called')
+        winner = self.cards[get_trick_winner([x['card'] for x in self.cards], self.trump)]
+        current_owner = winner['owner']
+        step_logger.debug('Deal._process_bribe owner: %s card: %s', current_owner, winner['card'])
         self._get_team_taken_cards(self._get_team_index_by_player_index(current_owner)).extend(self.cards)
         self.cards_history.append(self.cards.copy())
         self.cards.clear()
@@ -108,15 +113,18 @@ class Deal:
         raise NotImplementedError()
 
     def is_completed(self):
-        logging.debug('Deal.is_completed called')
-        return self.is_started \
-            and len(self.player1_cards) == 0 \
-            and len(self.player2_cards) == 0 \
-            and len(self.player3_cards) == 0 \
-            and len(self.player4_cards) == 0
+        step_logger.debug('Deal.is_completed called')
+        return self.is_jackpot or self.is_started and self._is_hands_empty()
+
+    def _is_hands_empty(self) -> bool:
+        hands = self.player_hands
+        return hands[0] | hands[1] | hands[2] | hands[3] == 0
+
+    def is_in_pants(self) -> bool:
+        return False
 
     def _check_for_jackpot(self) -> bool:
-        logging.debug('Deal._check_for_jackpot called')
+        step_logger.debug('Deal._check_for_jackpot called')
         is_queen_exists = False
         is_six_exists = False
         for card_obj in self.cards:
@@ -124,26 +132,28 @@ class Deal:
                 is_six_exists = True
             if card_obj['card'].suit == CardSuit.CLUBS and card_obj['card'].kind == CardKind.QUEEN:
                 is_queen_exists = True
-        logging.debug(f'Deal._check_for_jackpot is_queen_exists: {is_queen_exists} is_six_exists: {is_six_exists}')
+        step_logger.debug('Deal._check_for_jackpot is_queen_exists: %s is_six_exists: %s', is_queen_exists,
+                          is_six_exists)
         return is_queen_exists and is_six_exists
 
     def _get_jackpot_winner(self) -> int:
-        logging.debug('Deal._get_jackpot_winner called')
+        step_logger.debug('Deal._get_jackpot_winner called')
         for card_obj in self.cards:
             if card_obj['card'].suit == CardSuit.CLUBS and card_obj['card'].kind == CardKind.SIX:
                 return card_obj['owner']
         return -1
 
     def _get_jackpot_looser(self) -> int:
-        logging.debug('Deal._get_jackpot_looser called')
+        step_logger.debug('Deal._get_jackpot_looser called')
         for card_obj in self.cards:
-            if card_obj['card'].suit == CardSuit.CLUBS and card_obj['card'].king == CardKind.QUEEN:
+            if card_obj['card'].suit == CardSuit.CLUBS and card_obj['card'].kind == CardKind.QUEEN:
                 return card_obj['owner']
         return -1
 
     def do_player_step(self, player_index: int, card: Card) -> StepResult:
-        logging.debug(f'Deal.do_player_step({player_index}, {card.to_string()}) called')
-        if self.player_index != player_index:
+        step_logger.debug('Deal.do_player_step(%s, %s) called', player_index, card)
+        if self.player_index != player_index or self.is_wait_for_trump() or self.is_in_pants() \
+                or self.is_completed() or not self.has_player_card(player_index, card):
             return StepResult.ERROR
         self.cards.append({'card': card, 'owner': player_index})
         self._remove_player_card(player_index, card)
@@ -160,11 +170,13 @@ class Deal:
             self.request_show_bribe_handler(cards, top_card, top_card_owner)
             if self.is_completed():
                 return StepResult.END
+            if self._is_hands_empty():
+                self.process_deal_step()
         self.request_ask_for_step_handler(self.player_index)
         return StepResult.SUCCESS
 
     def get_jackpot_winner_team(self) -> int:
-        logging.debug('Deal.get_jackpot_winner called')
+        step_logger.debug('Deal.get_jackpot_winner called')
         for card_obj in self.cards_history[-1]:
             if card_obj['card'].suit == CardSuit.CLUBS and card_obj['card'].kind == CardKind.SIX:
                 return self._get_team_index_by_player_index(card_obj['owner'])
@@ -183,40 +195,34 @@ class Deal:
         pass
 
     def set_trump(self, trump: CardSuit):
-        logging.debug(f'Deal.set_trump({trump}) called')
+        logger.debug('Deal.set_trump(%s) called', trump)
         self.is_started = True
         self.trump = trump
         self.after_set_trump()
 
     def is_wait_for_trump(self):
-        logging.debug('Deal.is_wait_for_trump called')
+        step_logger.debug('Deal.is_wait_for_trump called')
         return self.trump is None
 
     def get_table_data(self) -> (list[Card], Card, int):
-        logging.debug('Deal.get_table_data called')
+        step_logger.debug('Deal.get_table_data called')
         return self._get_bribe_data(self.cards, CardSuit(self.trump))
 
     def get_last_bribe(self) -> (list[Card], Card, int):
-        logging.debug('Deal.get_last_bribe called')
+        step_logger.debug('Deal.get_last_bribe called')
         last_bribe = self.cards_history[-1]
         return self._get_bribe_data(last_bribe, CardSuit(self.trump))
 
     @staticmethod
     def _get_bribe_data(bribe: list, trump: CardSuit) -> (list[Card], Card, int):
-        bribe_str = " ".join([f'[{x["card"].to_string()} {x["owner"]}]' for x in bribe])
-        logging.debug(f'Deal._get_bribe_data({bribe_str}, {trump}) called')
-        result = []
-        top_card = None
-        top_card_owner = -1
-        for card_obj in bribe:
-            if top_card is None:
-                top_card = card_obj['card']
-                top_card_owner = card_obj['owner']
-            else:
-                if top_card.less_than(card_obj['card'], trump):
-                    top_card = card_obj['card']
-                    top_card_owner = card_obj['owner']
-            result.append(card_obj['card'])
+        if step_logger.isEnabledFor(logging.DEBUG):
+            step_logger.debug('Deal._get_bribe_data(%s, %s) called', LazyCards(bribe), trump)
+        result = [x['card'] for x in bribe]
+        if len(result) == 0:
+            return result, None, -1
+        top = bribe[get_trick_winner(result, trump)]
+        top_card = top['card']
+        top_card_owner = top['owner']
         return result, top_card, top_card_owner
 
 
@@ -224,29 +230,26 @@ class AllCardsDeal(Deal):
     DEFAULT_TRUMP_CARD = Card(CardKind.ACE, CardSuit.DIAMONDS)
 
     def __init__(self, owner_index: int):
-        logging.debug(f'AllCardsDeal constructor called {owner_index}')
+        logger.debug('AllCardsDeal constructor called %s', owner_index)
         super().__init__(owner_index)
 
     def get_deal_type(self):
         return DealType.CLASSIC
 
     def process_deal(self):
-        logging.debug('AllCardsDeal.process_deal called')
+        logger.debug('AllCardsDeal.process_deal called')
         for i in range(0, 8):
-            self.player1_cards.append(self.deck.get_next())
-            self.player2_cards.append(self.deck.get_next())
-            self.player3_cards.append(self.deck.get_next())
-            self.player4_cards.append(self.deck.get_next())
+            for player_index in range(4):
+                self._add_player_card(player_index, self.deck.get_next())
         self._update_owner()
-        logging.debug(f'AllCardsDeal.process_deal completed: {" ".join([x.to_string() for x in self.player1_cards])};'
-                      f'{" ".join([x.to_string() for x in self.player2_cards])};'
-                      f'{" ".join([x.to_string() for x in self.player3_cards])};'
-                      f'{" ".join([x.to_string() for x in self.player4_cards])} {self.owner_index}')
+        logger.debug('AllCardsDeal.process_deal completed: %s;%s;%s;%s %s', LazyCards(self.player_hands[0]),
+                     LazyCards(self.player_hands[1]), LazyCards(self.player_hands[2]), LazyCards(self.player_hands[3]),
+                     self.owner_index)
         self.request_send_current_cards_to_pm_handler(self.owner_index)
         self.request_trump_handler(self.owner_index)
 
     def after_set_trump(self):
-        logging.debug('AllCardsDeal.after_set_trump called')
+        logger.debug('AllCardsDeal.after_set_trump called')
         for i in range(4):
             if i == self.owner_index:
                 continue
@@ -254,53 +257,57 @@ class AllCardsDeal(Deal):
         self.request_ask_for_step_handler(self.owner_index)
 
     def process_deal_step(self):
-        logging.debug('AllCardsDeal.process_deal_step called')
+        logger.debug('AllCardsDeal.process_deal_step called')
         pass
 
     def can_process_next_deal_step(self) -> bool:
-        logging.debug('AllCardsDeal.can_process_deal_step called')
+        logger.debug('AllCardsDeal.can_process_deal_step called')
         return False
 
     def _get_new_turn_player(self, previous_taken: int) -> int:
-        logging.debug('AllCardsDeal._get_next_turn_player called')
+        step_logger.debug('AllCardsDeal._get_next_turn_player called')
         return previous_taken
 
-    def _get_owner_internal(self, cards: list[Card], index: int) -> bool:
-        logging.debug(f'AllCardsDeal._get_owner_internal({" ".join([x.to_string() for x in cards])}, {index}) called')
-        for current in cards:
-            if self.DEFAULT_TRUMP_CARD.equals(current):
-                self.owner_index = index
-                return True
+    def _get_owner_internal(self, hand: int, index: int) -> bool:
+        if step_logger.isEnabledFor(logging.DEBUG):
+            step_logger.debug('AllCardsDeal._get_owner_internal(%s, %s) called', LazyCards(hand), index)
+        if hand & self.DEFAULT_TRUMP_CARD.bit:
+            self.owner_index = index
+            self.player_index = index
+            return True
         return False
 
     def _update_owner(self):
-        logging.debug('AllCardsDeal._update_owner called')
+        logger.debug('AllCardsDeal._update_owner called')
         for i in range(4):
-            if self._get_owner_internal(self.get_player_cards(i), i):
+            if self._get_owner_internal(self.player_hands[i], i):
                 return
 
 
 class NumDeal(Deal):
     def __init__(self, owner_index: int):
-        logging.debug(f'NumDeal constructor {owner_index} called')
+        logger.debug('NumDeal constructor %s called', owner_index)
         super().__init__(owner_index)
 
     def get_deal_type(self) -> DealType:
         return DealType.CLASSIC
 
     def process_deal(self):
-        logging.debug('NumDeal.process_deal called')
+        logger.debug('NumDeal.process_deal called')
         self.process_deal_step()
 
     def can_process_next_deal_step(self) -> bool:
-        logging.debug('NumDeal.can_process_next_deal_step called')
+        logger.debug('NumDeal.can_process_next_deal_step called')
         return self.deck.get_rest_cards() > 0
 
+    def is_completed(self):
+        return super().is_completed() and (self.is_jackpot or not self.can_process_next_deal_step())
+
     def _get_cards_count(self) -> int:
         raise NotImplementedError()
 
     def after_set_trump(self):
-        logging.debug('NumDeal.after_set_trump called')
+        logger.debug('NumDeal.after_set_trump called')
         for i in range(4):
             if i == self.owner_index:
                 continue
@@ -308,18 +315,22 @@ class NumDeal(Deal):
         self.request_ask_for_step_handler(self.owner_index)
 
     def process_deal_step(self):
-        logging.debug('NumDeal.process_deal_step called')
-        for _ in range(0, self._get_cards_count()):
-            self.get_player_cards(self.owner_index).append(self.deck.get_next())
-        curr_player_index = self.owner_index
-        for _ in range(0, self._get_cards_count()):
-            for i in range(4):
-                if curr_player_index == self.owner_index:
-                    continue
-                self.get_player_cards(curr_player_index).append(self.deck.get_next())
-                curr_player_index = self._inc_player_index(curr_player_index)
-        self.request_send_current_cards_to_pm_handler(self.owner_index)
-        self.request_trump_handler()
+        logger.debug('NumDeal.process_deal_step called')
+        # the last step gets whatever is left when the hand size is not a multiple of the step
+        cards_count = min(self._get_cards_count(), self.deck.get_rest_cards() // 4)
+        for _ in range(0, cards_count):
+            self._add_player_card(self.owner_index, self.deck.get_next())
+        curr_player_index = self._inc_player_index(self.owner_index)
+        while curr_player_index != self.owner_index:
+            for _ in range(0, cards_count):
+                self._add_player_card(curr_player_index, self.deck.get_next())
+            curr_player_index = self._inc_player_index(curr_player_index)
+        if self.is_wait_for_trump():
+            self.request_send_current_cards_to_pm_handler(self.owner_index)
+            self.request_trump_handler(self.owner_index)
+            return
+        for i in range(4):
+            self.request_send_current_cards_to_pm_handler(i)
 
     @staticmethod
     def _inc_player_index(player_index: int) -> int:
@@ -334,7 +345,7 @@ class NumDeal(Deal):
 
 class TwoDeal(NumDeal):
     def __init__(self, owner_index: int):
-        logging.debug(f'TwoDeal constructor {owner_index} called')
+        logger.debug('TwoDeal constructor %s called', owner_index)
         super().__init__(owner_index)
 
     def _get_cards_count(self) -> int:
@@ -343,7 +354,7 @@ class TwoDeal(NumDeal):
 
 class ThreeDeal(NumDeal):
     def __init__(self, owner_index: int):
-        logging.debug(f'ThreeDeal constructor {owner_index} called')
+        logger.debug('ThreeDeal constructor %s called', owner_index)
         super().__init__(owner_index)
 
     def _get_cards_count(self) -> int:
@@ -352,7 +363,7 @@ class ThreeDeal(NumDeal):
 
 class FourDeal(NumDeal):
     def __init__(self, owner_index: int):
-        logging.debug(f'FourDeal constructor {owner_index} called')
+        logger.debug('FourDeal constructor %s called', owner_index)
         super().__init__(owner_index)
 
     def _get_cards_count(self) -> int:
@@ -370,11 +381,17 @@ class PantsDeal(Deal):
     request_ask_for_pants_step_handler = None
     request_show_current_pants_handler = None
 
+    # cards every player lays into the pants
+    PANTS_SIZE = 1
+    HAND_LIMIT = 8
+
     def __init__(self, owner_index: int):
-        logging.debug(f'PantsDeal constructor {owner_index} called')
+        logger.debug('PantsDeal constructor %s called', owner_index)
         super().__init__(owner_index)
         self.is_trump_received = False
-        self.player_cards_count = {0: 0, 1: 0, 2: 0, 3: 0}
+        self.pants_turns = 0
+        # hands are unordered masks, so the pair handed on to a teammate is tracked here
+        self.last_step_cards = {0: [], 1: [], 2: [], 3: []}
 
     def get_deal_type(self) -> DealType:
         return DealType.PANTS
@@ -385,96 +402,164 @@ class PantsDeal(Deal):
     def can_process_next_deal_step(self) -> bool:
         return self.is_trump_received
 
+    def is_in_pants(self) -> bool:
+        return self.is_trump_received and self.pants_turns < 4
+
     def _process_start_cards(self, player_index: int):
         raise NotImplementedError()
 
     @staticmethod
     def _get_teammate_by_player_index(player_index: int) -> int:
-        return (player_index + 2) % 3
+        return (player_index + 2) % 4
 
     def _can_take_cards(self, player_index: int) -> bool:
         raise NotImplementedError()
 
+    def _add_step_card(self, player_index: int, card: Card):
+        self._add_player_card(player_index, card)
+        self.last_step_cards[player_index].append(card)
+
     def process_step_cards(self, player_index: int) -> bool:
-        logging.debug(f'PantsDeal.process_step_cards({player_index}) called')
-        user_cards = self.get_player_cards(player_index)
-        if self.player_cards_count[player_index] == 8:
-            last_card = user_cards.pop(-1)
-            pre_last_card = user_cards.pop(-1)
-            self.player_cards_count[player_index] -= 2
+        step_logger.debug('PantsDeal.process_step_cards(%s) called', player_index)
+        if self.deck.get_rest_cards() < 2:
+            return False
+        if self.get_player_card_count(player_index) >= self.HAND_LIMIT:
             teammate_index = self._get_teammate_by_player_index(player_index)
             if not self._can_take_cards(teammate_index):
                 return False
-            teammate_cards = self.get_player_cards(teammate_index)
-            teammate_cards.append(pre_last_card)
-            teammate_cards.append(last_card)
-            self.player_cards_count[teammate_index] += 2
-        user_cards.append(self.deck.get_next())
-        user_cards.append(self.deck.get_last())
-        self.player_cards_count[player_index] += 2
+            user_step_cards = self.last_step_cards[player_index]
+            last_card = user_step_cards.pop(-1)
+            pre_last_card = user_step_cards.pop(-1)
+            self._remove_player_card(player_index, last_card)
+            self._remove_player_card(player_index, pre_last_card)
+            self._add_step_card(teammate_index, pre_last_card)
+            self._add_step_card(teammate_index, last_card)
+        self._add_step_card(player_index, self.deck.get_next())
+        self._add_step_card(player_index, self.deck.get_last())
         return True
 
     def can_player_make_step(self, player_index: int) -> bool:
-        logging.debug(f'PantsDeal.can_player_make_step({player_index}) called')
-        non_trump_count = 0
-        player_cards = self.get_player_cards(player_index)
-        for card in player_cards:
-            if not card.is_trump(self.trump) and card.kind != CardKind.ACE:
-                non_trump_count += 1
-        return non_trump_count >= 2
+        step_logger.debug('PantsDeal.can_player_make_step(%s) called', player_index)
+        non_trump = self.player_hands[player_index] & ~get_trump_mask(self.trump) & ~KIND_MASKS[CardKind.ACE]
+        return non_trump.bit_count() >= 2
+
+    def _has_cards_for_pants(self, player_index: int) -> bool:
+        return (self.player_hands[player_index] & ~get_trump_mask(self.trump)).bit_count() >= self.PANTS_SIZE
+
+    def _get_pants_mask(self, player_index: int) -> int:
+        # a player who could not draw enough non-trump cards lays whatever they hold
+        if self._has_cards_for_pants(player_index):
+            return self.player_hands[player_index] & ~get_trump_mask(self.trump)
+        return self.player_hands[player_index]
 
     def _get_card_list_for_pants(self, player_index: int) -> list[Card]:
-        logging.debug(f'PantsDeal._get_card_list_for_pants({player_index}) called')
-        player_cards = self.get_player_cards(player_index)
-        result = []
-        for card in player_cards:
-            if not card.is_trump(self.trump):
-                result.append(card)
-        return result
+        step_logger.debug('PantsDeal._get_card_list_for_pants(%s) called', player_index)
+        return cards_from_mask(self._get_pants_mask(player_index))
 
     def get_cards_for_pants(self, player_index: int) -> list:
         raise NotImplementedError()
 
+    def get_pants_moves_key(self, player_index: int) -> tuple:
+        """Everything the pants moves of the player depend on: equal keys give equal moves."""
+        return self.PANTS_SIZE, self._get_pants_mask(player_index)
+
+    @staticmethod
+    def iter_pants_moves(moves_key: tuple):
+        """Yields the card tuples a player can lay, both orders of every pair in double pants."""
+        size, mask = moves_key
+        if size == 1:
+            for card in cards_from_mask(mask):
+                yield card,
+            return
+        yield from permutations(cards_from_mask(mask), 2)
+
+    def get_card_pairs_for_pants(self, player_index: int) -> list:
+        return list(self.iter_pants_moves(self.get_pants_moves_key(player_index)))
+
     def process_other_cards(self):
-        logging.debug('PantsDeal.process_other_cards called')
-        rest_card_count = self.deck.get_rest_cards()
-        while rest_card_count > 0:
+        logger.debug('PantsDeal.process_other_cards called')
+        while self.deck.get_rest_cards() > 0:
             min_card_player_index = self._get_min_card_count_index(self.owner_index)
-            self.get_player_cards(min_card_player_index).append(self.deck.get_next())
-            self.player_cards_count[min_card_player_index] += 1
+            self._add_player_card(min_card_player_index, self.deck.get_next())
 
     def _get_min_card_count_index(self, start_index: int) -> int:
-        logging.debug(f'PantsDeal._get_min_card_count_index({start_index}) called')
+        step_logger.debug('PantsDeal._get_min_card_count_index(%s) called', start_index)
         curr_start_index = start_index
-        min_card_count = 8
-        min_card_player_index = -1
-        for i in range(4):
-            if min_card_count > self.player_cards_count[curr_start_index]:
-                min_card_count = self.player_cards_count[curr_start_index]
+        min_card_count = self.get_player_card_count(start_index)
+        min_card_player_index = start_index
+        for i in range(3):
+            curr_start_index = self._inc_player_index(curr_start_index)
+            if min_card_count > self.get_player_card_count(curr_start_index):
+                min_card_count = self.get_player_card_count(curr_start_index)
                 min_card_player_index = curr_start_index
-                curr_start_index = self._inc_player_index(curr_start_index)
         return min_card_player_index
 
     @staticmethod
-    def _inc_player_index(self: int) -> int:
-        next_player_index = self + 1
+    def _inc_player_index(player_index: int) -> int:
+        next_player_index = player_index + 1
         if next_player_index > 3:
             next_player_index = 0
         return next_player_index
 
     def process_deal(self):
-        logging.debug('PantsDeal.process_deal called')
+        logger.debug('PantsDeal.process_deal called')
         self._process_start_cards(self.owner_index)
         self.request_send_current_cards_to_pm_handler(self.owner_index)
         self.request_trump_handler(self.owner_index)
 
     def after_set_trump(self):
-        logging.debug('PantsDeal.after_set_trump called')
-        self.request_ask_for_pants_step_handler(self.owner_index)
+        logger.debug('PantsDeal.after_set_trump called')
+        self.is_trump_received = True
+        self._start_pants_turn(self.owner_index)
+
+    def _start_pants_turn(self, player_index: int):
+        logger.debug('PantsDeal._start_pants_turn(%s) called', player_index)
+        self.player_index = player_index
+        if player_index != self.owner_index:
+            self._process_start_cards(player_index)
+        while not self._has_cards_for_pants(player_index) and self.process_step_cards(player_index):
+            pass
+        self.request_send_current_cards_to_pm_handler(player_index)
+        self.request_ask_for_pants_step_handler(player_index)
 
     def set_pant_card(self, player_index: int, cards) -> bool:
+        if step_logger.isEnabledFor(logging.DEBUG):
+            step_logger.debug('PantsDeal.set_pant_card(%s, %s) called', player_index, LazyCards(cards))
+        if not self.is_in_pants() or self.player_index != player_index or len(cards) != self.PANTS_SIZE \
+                or len(set(cards)) != len(cards):
+            return False
+        pants_mask = self._get_pants_mask(player_index)
+        for card in cards:
+            if card is None or pants_mask & card.bit == 0:
+                return False
+        for card in cards:
+            self._remove_player_card(player_index, card)
+            if card in self.last_step_cards[player_index]:
+                self.last_step_cards[player_index].remove(card)
+        self._lay_pant_cards(player_index, cards)
+        self.pants_turns += 1
+        if self.pants_turns < 4:
+            self.request_show_current_pants_handler(self.get_pants_cards())
+            self._start_pants_turn(self._inc_player_index(player_index))
+            return True
+        self._complete_pants()
+        return True
+
+    def _lay_pant_cards(self, player_index: int, cards):
         raise NotImplementedError()
 
+    def _complete_pants(self):
+        raise NotImplementedError()
+
+    def _take_pant_cards(self, pant_cards: list, taken: int):
+        self._get_team_taken_cards(self._get_team_index_by_player_index(taken)).extend(pant_cards)
+
+    def _start_tricks(self):
+        logger.debug('PantsDeal._start_tricks called')
+        self.process_other_cards()
+        for i in range(4):
+            self.request_send_current_cards_to_pm_handler(i)
+
     def _complete_pant_part(self):
         raise NotImplementedError()
 
@@ -487,52 +572,41 @@ class PantsDeal(Deal):
 
 class SinglePantsDeal(PantsDeal):
     def __init__(self, owner_index: int):
-        logging.debug(f'SinglePantsDeal constructor {owner_index} called')
+        logger.debug('SinglePantsDeal constructor %s called', owner_index)
         super().__init__(owner_index)
         self.pant_cards = []
 
     def get_cards_for_pants(self, player_index: int) -> list:
-        logging.debug(f'SinglePantsDeal.get_cards_for_pants({player_index}) called')
+        step_logger.debug('SinglePantsDeal.get_cards_for_pants(%s) called', player_index)
         return self._get_card_list_for_pants(player_index)
 
-    def set_pant_card(self, player_index: int, cards) -> bool:
-        logging.debug(f'SinglePantsDeal.set_pant_card({player_index}, {cards}) called')
-        if len(cards) != 1:
-            return False
-        card = cards[0]
-        if card.is_trump(self.trump):
-            return False
-        self.player_cards_count[player_index] -= 1
-        self.pant_cards.append({'card': card, 'owner': player_index})
-        result, top_card, top_card_owner = self._complete_pant_part()
-        if result:
-            owner_team_index = self._get_team_index_by_player_index(self.owner_index)
-            card_owner_team_index = self._get_team_index_by_player_index(top_card_owner)
-            if card_owner_team_index != owner_team_index:
-                self.player_index = top_card_owner
-            else:
-                self.player_index = self.owner_index
-            self.request_show_pants_handler([x['card'] for x in self.pant_cards], top_card, top_card_owner,
-                                            None, None, -1)
-            self.request_ask_for_step_handler(self.player_index)
-            return True
-        self.request_show_current_pants_handler(self.get_pants_cards())
-        return True
+    def _lay_pant_cards(self, player_index: int, cards):
+        self.pant_cards.append({'card': cards[0], 'owner': player_index})
+
+    def _complete_pants(self):
+        logger.debug('SinglePantsDeal._complete_pants called')
+        _, top_card, top_card_owner = self._complete_pant_part()
+        self._take_pant_cards(self.pant_cards, top_card_owner)
+        owner_team_index = self._get_team_index_by_player_index(self.owner_index)
+        card_owner_team_index = self._get_team_index_by_player_index(top_card_owner)
+        if card_owner_team_index != owner_team_index:
+            self.player_index = top_card_owner
+        else:
+            self.player_index = self.owner_index
+        self._start_tricks()
+        self.request_show_pants_handler([x['card'] for x in self.pant_cards], top_card, top_card_owner,
+                                        None, None, -1, self.player_index)
+        self.request_ask_for_step_handler(self.player_index)
 
     def _complete_pant_part(self) -> (bool, Card, int):
-        logging.debug('SinglePantsDeal._complete_pant_part called')
+        step_logger.debug('SinglePantsDeal._complete_pant_part called')
         if len(self.pant_cards) != 4:
             return False, None, -1
-        top_pant_card = self.pant_cards[0]['card']
-        top_pant_player = self.pant_cards[0]['owner']
-        for i in range(1, 4):
-            if top_pant_card.less_than(self.pant_cards[i]['card']):
-                top_pant_card = self.pant_cards[i]['card']
-                top_pant_player = self.pant_cards[i]['owner']
-        return True, top_pant_card, top_pant_player
+        top = self.pant_cards[get_trick_winner([x['card'] for x in self.pant_cards], self.trump)]
+        return True, top['card'], top['owner']
 
     def get_pants_cards(self) -> list:
-        logging.debug('SinglePantsDeal.get_pants_cards called')
+        step_logger.debug('SinglePantsDeal.get_pants_cards called')
         result = []
         if len(self.pant_cards) < 2:
             return result
@@ -541,77 +615,65 @@ class SinglePantsDeal(PantsDeal):
         return result
 
     def _can_take_cards(self, player_index: int) -> bool:
-        logging.debug(f'SinglePantsDeal._car_take_cards({player_index}) called')
-        return self.player_cards_count[player_index] <= 4
+        step_logger.debug('SinglePantsDeal._car_take_cards(%s) called', player_index)
+        return self.get_player_card_count(player_index) <= 4
 
     def _process_start_cards(self, player_index: int):
-        logging.debug(f'SinglePantsDeal._process_start_cards({player_index}) called')
-        user_cards = self.get_player_cards(player_index)
-        user_cards.append(self.deck.get_next())
-        user_cards.append(self.deck.get_last())
-        self.player_cards_count[player_index] += 2
+        logger.debug('SinglePantsDeal._process_start_cards(%s) called', player_index)
+        self._add_step_card(player_index, self.deck.get_next())
+        self._add_step_card(player_index, self.deck.get_last())
 
 
 class DoublePantsDeal(PantsDeal):
+    PANTS_SIZE = 2
+
     def __init__(self, owner_index: int):
-        logging.debug(f'DoublePantsDeal constructor {owner_index} called')
+        logger.debug('DoublePantsDeal constructor %s called', owner_index)
         super().__init__(owner_index)
         self.left_pant_cards = []
         self.right_pant_cards = []
 
     def get_cards_for_pants(self, player_index: int) -> list:
-        logging.debug(f'DoublePantsDeal.get_cards_for_pants({player_index}) called')
-        return list(permutations(self._get_card_list_for_pants(player_index), 2))
+        step_logger.debug('DoublePantsDeal.get_cards_for_pants(%s) called', player_index)
+        return self.get_card_pairs_for_pants(player_index)
 
-    def set_pant_card(self, player_index: int, cards) -> bool:
-        logging.debug(f'DoublePantsDeal.set_pant_card({player_index}, {cards}) called')
-        if len(cards) != 2:
-            return False
+    def _lay_pant_cards(self, player_index: int, cards):
         left_card, right_card = cards
-        if left_card.is_trump(self.trump) or right_card.is_trump(self.trump):
-            return False
-        self.player_cards_count[player_index] -= 2
         self.left_pant_cards.append({'card': left_card, 'owner': player_index})
         self.right_pant_cards.append({'card': right_card, 'owner': player_index})
-        result, top_left_card, top_left_card_owner, top_right_card, top_right_card_owner = self._complete_pant_part()
-        if result:
-            owner_team_index = self._get_team_index_by_player_index(self.owner_index)
-            left_owner_team_index = self._get_team_index_by_player_index(top_left_card_owner)
-            right_owner_team_index = self._get_team_index_by_player_index(top_right_card_owner)
-            if left_owner_team_index != owner_team_index or right_owner_team_index != owner_team_index:
-                if left_owner_team_index != owner_team_index and right_owner_team_index != owner_team_index:
-                    self.player_index = self._inc_player_index(self.owner_index)
-                elif left_owner_team_index != owner_team_index:
-                    self.player_index = top_left_card_owner
-                else:
-                    self.player_index = top_right_card_owner
-            self.request_show_pants_handler(
-                [x['card'] for x in self.left_pant_cards], top_left_card, top_left_card_owner,
-                [x['card'] for x in self.right_pant_cards], top_right_card, top_right_card_owner)
-            self.request_ask_for_step_handler(self.player_index)
-            return True
-        self.request_show_current_pants_handler(self.get_pants_cards())
-        return True
+
+    def _complete_pants(self):
+        logger.debug('DoublePantsDeal._complete_pants called')
+        _, top_left_card, top_left_card_owner, top_right_card, top_right_card_owner = self._complete_pant_part()
+        self._take_pant_cards(self.left_pant_cards, top_left_card_owner)
+        self._take_pant_cards(self.right_pant_cards, top_right_card_owner)
+        self.player_index = self.owner_index
+        owner_team_index = self._get_team_index_by_player_index(self.owner_index)
+        left_owner_team_index = self._get_team_index_by_player_index(top_left_card_owner)
+        right_owner_team_index = self._get_team_index_by_player_index(top_right_card_owner)
+        if left_owner_team_index != owner_team_index or right_owner_team_index != owner_team_index:
+            if left_owner_team_index != owner_team_index and right_owner_team_index != owner_team_index:
+                self.player_index = self._inc_player_index(self.owner_index)
+            elif left_owner_team_index != owner_team_index:
+                self.player_index = top_left_card_owner
+            else:
+                self.player_index = top_right_card_owner
+        self._start_tricks()
+        self.request_show_pants_handler(
+            [x['card'] for x in self.left_pant_cards], top_left_card, top_left_card_owner,
+            [x['card'] for x in self.right_pant_cards], top_right_card, top_right_card_owner, self.player_index)
+        self.request_ask_for_step_handler(self.player_index)
 
     def _complete_pant_part(self) -> (bool, Card, int, Card, int):
-        logging.debug('DoublePantsDeal.+complete_pant_part called')
+        step_logger.debug('DoublePantsDeal._complete_pant_part called')
         if len(self.left_pant_cards) != 4 or len(self.right_pant_cards) != 4:
             return False, None, -1, None, -1
-        top_left_pant_card, top_right_pant_card = \
-            self.left_pant_cards[0]['card'], self.right_pant_cards[0]['card']
-        top_left_pant_player, top_right_pant_player = \
-            self.left_pant_cards[0]['owner'], self.right_pant_cards[0]['owner']
-        for i in range(1, 4):
-            if top_left_pant_card.less_than(self.left_pant_cards[i]['card']):
-                top_left_pant_card = self.left_pant_cards[i]['card']
-                top_left_pant_player = self.left_pant_cards[i]['owner']
-            if top_right_pant_card.less_than(self.right_pant_cards[i]['card']):
-                top_right_pant_card = self.right_pant_cards[i]['card']
-                top_right_pant_player = self.right_pant_cards[i]['owner']
-        return True, top_left_pant_card, top_left_pant_player, top_right_pant_card, top_right_pant_player
+        top_left = self.left_pant_cards[get_trick_winner([x['card'] for x in self.left_pant_cards], self.trump)]
+        top_right = self.right_pant_cards[get_trick_winner([x['card'] for x in self.right_pant_cards], self.trump)]
+        return True, top_left['card'], top_left['owner'], top_right['card'], top_right['owner']
 
     def get_pants_cards(self) -> list:
-        logging.debug('DoublePantsDeal.get_pants_cards called')
+        step_logger.debug('DoublePantsDeal.get_pants_cards called')
         result = []
         if len(self.left_pant_cards) < 2 or len(self.right_pant_cards) < 2:
             return result
@@ -620,25 +682,25 @@ class DoublePantsDeal(PantsDeal):
         return result
 
     def _can_take_cards(self, player_index: int) -> bool:
-        logging.debug(f'DoublePantsDeal._can_take_cards({player_index}) called')
-        return self.player_cards_count[player_index] <= 2
+        step_logger.debug('DoublePantsDeal._can_take_cards(%s) called', player_index)
+        return self.get_player_card_count(player_index) <= 2
 
     def _process_start_cards(self, player_index: int):
-        logging.debug(f'DoublePantsDeal._process_start_cards({player_index}) called')
-        user_cards = self.get_player_cards(player_index)
-        user_cards.append(self.deck.get_next())
-        user_cards.append(self.deck.get_next())
-        user_cards.append(self.deck.get_last())
-        user_cards.append(self.deck.get_last())
-        self.player_cards_count[player_index] += 4
+        logger.debug('DoublePantsDeal._process_start_cards(%s) called', player_index)
+        self._add_step_card(player_index, self.deck.get_next())
+        self._add_step_card(player_index, self.deck.get_next())
+        self._add_step_card(player_index, self.deck.get_last())
+        self._add_step_card(player_index, self.deck.get_last())
 
 
 class DealTypes:
     names = ['По всем', 'По 2', 'По 3', 'По 4', 'Одинарные штаны', 'Двойные штаны']
+    # same order as names; the position is the deal type code in snapshots and game logs
+    classes = [AllCardsDeal, TwoDeal, ThreeDeal, FourDeal, SinglePantsDeal, DoublePantsDeal]
 
     @staticmethod
     def get_deal(name: str, player_index: int) -> Deal | None:
-        logging.debug(f'DealTypes.get_deal({name}, {player_index}) called')
+        logger.debug('DealTypes.get_deal(%s, %s) called', name, player_index)
         if name == 'По всем':
             return AllCardsDeal(player_index)
         if name == 'По 2':
@@ -654,5 +716,5 @@ class DealTypes:
         return None
 
     def is_deal(self, text: str) -> bool:
-        logging.debug(f'DealTypes.is_deal({text}) called')
+        logger.debug('DealTypes.is_deal(%s) called', text)
         return text.lower() in [x.lower() for x in self.names]
@@ -0,0 +1,233 @@
+import itertools
+import json
+import logging
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl
+
+from telebot import apihelper
+
+from chatExecutor import ChatExecutor
+
+logger = logging.getLogger('goat.fake')
+
+BOT_USER = {'id': 1, 'is_bot': True, 'first_name': 'Goat', 'username': 'GoatGroupBot'}
+
+
+class _ApiError(Exception):
+    def __init__(self, error_code: int, description: str):
+        super().__init__(description)
+        self.error_code = error_code
+        self.description = description
+
+
+class _FakeHTTPServer(ThreadingHTTPServer):
+    # the bot under test and the webhook pusher both open many connections at once
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class _FakeRequestHandler(BaseHTTPRequestHandler):
+    # set on the subclass made by FakeTelegram
+    fake = None
+    protocol_version = 'HTTP/1.1'
+    # headers and body go out in separate writes, keep-alive clients would wait for the delayed ACK
+    disable_nagle_algorithm = True
+
+    def _params(self) -> dict:
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        if self.headers.get('Content-Type', '').startswith('application/json'):
+            return json.loads(body) if body else {}
+        return dict(parse_qsl(body))
+
+    def do_POST(self):
+        path, _, query = self.path.partition('?')
+        params = dict(parse_qsl(query))
+        params.update(self._params())
+        self._respond(path.rsplit('/', 1)[-1], params)
+
+    def do_GET(self):
+        path, _, query = self.path.partition('?')
+        self._respond(path.rsplit('/', 1)[-1], dict(parse_qsl(query)))
+
+    def _respond(self, method: str, params: dict):
+        with self.fake._condition:
+            self.fake.calls[method] = self.fake.calls.get(method, 0) + 1
+        handler = getattr(self.fake, f'_api_{method}', None)
+        if handler is None:
+            body = {'ok': False, 'error_code': 404, 'description': f'Not Found: method {method}'}
+        else:
+            try:
+                body = {'ok': True, 'result': handler(params)}
+            except _ApiError as e:
+                body = {'ok': False, 'error_code': e.error_code, 'description': e.description}
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class FakeTelegram:
+    """Local stand-in for the Bot API: queues updates for getUpdates or pushes them to a webhook, records sends.
+
+    use() points telebot at it. api_latency is added to every call to model the round trip to Telegram."""
+
+    def __init__(self, api_latency: float = 0.0, host: str = '127.0.0.1', port: int = 0):
+        self.api_latency = api_latency
+        handler = type('FakeRequestHandler', (_FakeRequestHandler,), {'fake': self})
+        self._server = _FakeHTTPServer((host, port), handler)
+        self._condition = threading.Condition()
+        self._updates = deque()
+        self._update_ids = itertools.count(1)
+        self._message_ids = itertools.count(1)
+        # (chat_id, text) in the order sendMessage was called
+        self.sent = []
+        # chat_id -> last message sent there, to reply to
+        self.last_sent = {}
+        # (chat_id, message_id, text) in the order editMessageText was called
+        self.edited = []
+        # Bot API method -> calls
+        self.calls = {}
+        # user ids that blocked the bot, sending to them fails with 403
+        self.blocked = set()
+        self.webhook_url = None
+        self.webhook_secret = None
+        self._pusher = None
+        self.retries = 0
+
+    @property
+    def api_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f'http://{host}:{port}/bot{{0}}/{{1}}'
+
+    def start(self):
+        threading.Thread(target=self._server.serve_forever, name='goat-fake-telegram', daemon=True).start()
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._pusher is not None:
+            self._pusher.shutdown()
+
+    def use(self):
+        apihelper.API_URL = self.api_url
+
+    def make_message(self, chat_id: int, user_id: int, text: str, reply_to_bot: bool = False,
+                     reply_to_message_id: int | None = None) -> dict:
+        chat = {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'}
+        message = {'message_id': next(self._message_ids), 'date': int(time.time()), 'chat': chat, 'text': text,
+                   'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}}
+        if text.startswith('/'):
+            message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': len(text.split()[0])}]
+        if reply_to_bot:
+            message['reply_to_message'] = {'message_id': reply_to_message_id or next(self._message_ids),
+                                           'date': message['date'], 'chat': chat, 'from': BOT_USER, 'text': ''}
+        return message
+
+    def push(self, messages: list[dict]):
+        """Delivers messages as updates: to the webhook if one is set, to getUpdates otherwise."""
+        updates = [{'update_id': next(self._update_ids), 'message': message} for message in messages]
+        if self.webhook_url is not None:
+            # one request at a time per chat, like Telegram
+            for update in updates:
+                self._pusher.submit(update['message']['chat']['id'], self._deliver, update)
+            return
+        with self._condition:
+            self._updates.extend(updates)
+            self._condition.notify_all()
+
+    def _deliver(self, update: dict):
+        data = json.dumps(update).encode()
+        while True:
+            request = urllib.request.Request(self.webhook_url, data, {'Content-Type': 'application/json'})
+            if self.webhook_secret is not None:
+                request.add_header('X-Telegram-Bot-Api-Secret-Token', self.webhook_secret)
+            try:
+                with urllib.request.urlopen(request) as response:
+                    response.read()
+                return
+            except urllib.error.HTTPError as e:
+                if e.code != 503:
+                    logger.error('FakeTelegram webhook answered %s', e.code)
+                    return
+                self.retries += 1
+                time.sleep(0.01)
+
+    def wait_sent(self, count: int, timeout: float = 60.0) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while len(self.sent) < count:
+                left = deadline - time.monotonic()
+                if left <= 0:
+                    return False
+                self._condition.wait(left)
+        return True
+
+    def _api_getMe(self, params: dict) -> dict:
+        return BOT_USER
+
+    def _api_getUpdates(self, params: dict) -> list:
+        offset = int(params.get('offset', 0) or 0)
+        limit = int(params.get('limit', 100) or 100)
+        deadline = time.monotonic() + float(params.get('timeout', 0) or 0)
+        with self._condition:
+            while len(self._updates) > 0 and self._updates[0]['update_id'] < offset:
+                self._updates.popleft()
+            while len(self._updates) == 0 and time.monotonic() < deadline:
+                self._condition.wait(deadline - time.monotonic())
+            return list(itertools.islice(self._updates, limit))
+
+    def _api_sendMessage(self, params: dict) -> dict:
+        if self.api_latency > 0:
+            time.sleep(self.api_latency)
+        chat_id = int(params['chat_id'])
+        if chat_id in self.blocked:
+            raise _ApiError(403, 'Forbidden: bot was blocked by the user')
+        message = {'message_id': next(self._message_ids), 'date': int(time.time()), 'from': BOT_USER,
+                   'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'}, 'text': params.get('text')}
+        with self._condition:
+            self.sent.append((chat_id, params.get('text', '')))
+            self.last_sent[chat_id] = message
+            self._condition.notify_all()
+        return message
+
+    def _api_editMessageText(self, params: dict) -> dict:
+        if self.api_latency > 0:
+            time.sleep(self.api_latency)
+        chat_id = int(params['chat_id'])
+        message = {'message_id': int(params['message_id']), 'date': int(time.time()), 'from': BOT_USER,
+                   'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'}, 'text': params.get('text')}
+        with self._condition:
+            self.edited.append((chat_id, message['message_id'], params.get('text', '')))
+        return message
+
+    def _api_deleteMessage(self, params: dict) -> bool:
+        return True
+
+    def _api_getChatMemberCount(self, params: dict) -> int:
+        return 4
+
+    def _api_getChatMember(self, params: dict) -> dict:
+        user_id = int(params['user_id'])
+        return {'status': 'member', 'user': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}}
+
+    def _api_setWebhook(self, params: dict) -> bool:
+        self.webhook_url = params.get('url') or None
+        self.webhook_secret = params.get('secret_token')
+        connections = int(params.get('max_connections', 40) or 40)
+        if self._pusher is not None:
+            self._pusher.shutdown(wait=False)
+        self._pusher = ChatExecutor(connections) if self.webhook_url is not None else None
+        return True
+
+    def _api_deleteWebhook(self, params: dict) -> bool:
+        return self._api_setWebhook({})
@@ -0,0 +1,182 @@
+import argparse
+import logging
+import struct
+import time
+
+from DBConnector import DBConnector
+from deals import Deal, DealTypes
+from goatGame import GoatGame
+from models import Card, CardSuit, Deck
+
+logger = logging.getLogger('goat.log')
+
+# Every event is a type byte followed by a fixed size payload, so a log is just the events back to back.
+# Players are seat indexes, cards are Card.index.
+GAME_STARTED = 1
+PLAYER_ADDED = 2
+DEAL_STARTED = 3
+TRUMP_SELECTED = 4
+CARD_PLAYED = 5
+PANTS_PLAYED = 6
+
+_PAYLOADS = {
+    GAME_STARTED: struct.Struct('<q'),  # owner id
+    PLAYER_ADDED: struct.Struct('<q'),  # player id
+    DEAL_STARTED: struct.Struct(f'<Bb{Deck.COUNT}s'),  # DealTypes.classes index, owner, deck order
+    TRUMP_SELECTED: struct.Struct('<bB'),  # player, suit
+    CARD_PLAYED: struct.Struct('<bB'),  # player, card
+    PANTS_PLAYED: struct.Struct('<bBB'),  # player, left card, right card
+}
+
+
+class ReplayError(ValueError):
+    pass
+
+
+class GameLog:
+    """Events of one game not written to the database yet; GoatGame appends, the owner of the game takes them."""
+    __slots__ = ('_pending',)
+
+    def __init__(self):
+        self._pending = bytearray()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def _append(self, event: int, *values) -> int:
+        mark = len(self._pending)
+        self._pending.append(event)
+        self._pending += _PAYLOADS[event].pack(*values)
+        return mark
+
+    def rollback(self, mark: int):
+        del self._pending[mark:]
+
+    def take(self) -> bytes:
+        result = bytes(self._pending)
+        self._pending.clear()
+        return result
+
+    def peek(self) -> bytes:
+        return bytes(self._pending)
+
+    def discard(self, size: int):
+        """Drops the first `size` bytes, once they are written."""
+        del self._pending[:size]
+
+    def game_started(self, owner_id: int) -> int:
+        return self._append(GAME_STARTED, owner_id)
+
+    def player_added(self, player_id: int) -> int:
+        return self._append(PLAYER_ADDED, player_id)
+
+    def deal_started(self, deal: Deal) -> int:
+        return self._append(DEAL_STARTED, DealTypes.classes.index(type(deal)), deal.owner_index,
+                            bytes(card.index for card in deal.deck.cards))
+
+    def trump_selected(self, player_index: int, trump: CardSuit) -> int:
+        return self._append(TRUMP_SELECTED, player_index, int(trump))
+
+    def card_played(self, player_index: int, card: Card) -> int:
+        return self._append(CARD_PLAYED, player_index, card.index)
+
+    def pants_played(self, player_index: int, left_card: Card, right_card: Card) -> int:
+        return self._append(PANTS_PLAYED, player_index, left_card.index, right_card.index)
+
+
+def iter_events(data: bytes):
+    """Yields (event, payload values) from an encoded log."""
+    offset = 0
+    while offset < len(data):
+        event = data[offset]
+        payload = _PAYLOADS.get(event)
+        if payload is None or offset + 1 + payload.size > len(data):
+            raise ReplayError(f'broken event {event} at byte {offset}')
+        yield event, payload.unpack_from(data, offset + 1)
+        offset += 1 + payload.size
+
+
+def describe(event: int, values: tuple) -> str:
+    if event == GAME_STARTED:
+        return f'game started by {values[0]}'
+    if event == PLAYER_ADDED:
+        return f'player {values[0]} joined'
+    if event == DEAL_STARTED:
+        return f'deal {DealTypes.names[values[0]]} owner {values[1]}: ' \
+               f'{" ".join(str(Card.from_index(x)) for x in values[2])}'
+    if event == TRUMP_SELECTED:
+        return f'player {values[0]} selected {CardSuit(values[1]).name}'
+    if event == CARD_PLAYED:
+        return f'player {values[0]} played {Card.from_index(values[1])}'
+    return f'player {values[0]} laid {Card.from_index(values[1])} {Card.from_index(values[2])}'
+
+
+def _no_op(*args):
+    pass
+
+
+def create_silent_game(owner_id: int) -> GoatGame:
+    return GoatGame(owner_id, *([_no_op] * 10))
+
+
+def replay(data: bytes, game_factory=create_silent_game, until: int | None = None):
+    """Rebuilds the last game in `data`, or the game as it was after `until` events; returns (game, event count)."""
+    game = None
+    count = 0
+    for event, values in iter_events(data):
+        if until is not None and count >= until:
+            break
+        if event == GAME_STARTED:
+            game = game_factory(values[0])
+            done = True
+        elif game is None:
+            raise ReplayError(f'event {count} comes before the game start')
+        elif event == PLAYER_ADDED:
+            done = game.add_player(values[0])
+        elif event == DEAL_STARTED:
+            deal = DealTypes.classes[values[0]](values[1])
+            deal.deck.cards = [Card.from_index(x) for x in values[2]]
+            game.start_deal(deal)
+            done = True
+        elif event == TRUMP_SELECTED:
+            done = game.select_trump(game.get_player_id_by_index(values[0]), CardSuit(values[1]))
+        elif event == CARD_PLAYED:
+            done = game.do_player_step(game.get_player_id_by_index(values[0]), Card.from_index(values[1]))
+        else:
+            done = game.do_player_pants_step(game.get_player_id_by_index(values[0]), Card.from_index(values[1]),
+                                             Card.from_index(values[2]))
+        if not done:
+            raise ReplayError(f'event {count} ({describe(event, values)}) was rejected')
+        count += 1
+    return game, count
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Prints and replays the game log of a chat')
+    parser.add_argument('chat_id', type=int)
+    parser.add_argument('--db', default=DBConnector.DEFAULT_PATH)
+    parser.add_argument('--until', type=int, help='replay only the first UNTIL events')
+    parser.add_argument('-q', '--quiet', action='store_true', help='do not print the events')
+    args = parser.parse_args()
+    with DBConnector(args.db) as db:
+        data = db.load_events(args.chat_id)
+    if not args.quiet:
+        for i, (event, values) in enumerate(iter_events(data)):
+            print(f'{i:>6} {describe(event, values)}')
+    start = time.perf_counter()
+    game, count = replay(data, until=args.until)
+    elapsed = time.perf_counter() - start
+    print(f'replayed {count} events ({len(data)} bytes) in {elapsed * 1000:.2f}ms')
+    if game is not None:
+        print(f'score {game.first_team_total_score}:{game.second_team_total_score}')
+        if game.deal is not None:
+            deal = game.deal
+            print(f'{type(deal).__name__} trump {deal.trump} next player {deal.player_index} '
+                  f'completed {deal.is_completed()}')
+            for i in range(4):
+                print(f'  player {i} ({game.get_player_id_by_index(i)}): '
+                      f'{" ".join(str(x) for x in deal.get_player_cards(i))}')
+
+
+if __name__ == '__main__':
+    main()
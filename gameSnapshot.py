@@ -0,0 +1,154 @@
+import logging
+import struct
+
+from deals import Deal, DealTypes, PantsDeal, SinglePantsDeal
+from models import Card, CardSuit, Deck
+
+logger = logging.getLogger('goat.snapshot')
+
+# Layout, little endian:
+#   header  version B, flags B (started, has game), request_game_message_id q
+#   game    4 player ids q, 2 team totals h, has deal B
+#   deal    type B, owner b, player b, trump b (-1 = not chosen), flags B (started, jackpot, trump received),
+#           pants turns B, 4 hand masks Q, deck current b, deck last b, 32 deck card indices
+#           then entry lists: team 1 cards, team 2 cards, current trick, history (count B + lists),
+#           4 pants step card lists, pants piles (single: one, double: left and right)
+# An entry list is a count B followed by one byte per card: card index | owner << 6.
+VERSION = 1
+
+_HEADER = struct.Struct('<BBq')
+_GAME = struct.Struct('<4q2hB')
+_DEAL = struct.Struct('<BbbbBB4Qbb')
+
+_STARTED = 1
+_HAS_GAME = 2
+_DEAL_STARTED = 1
+_DEAL_JACKPOT = 2
+_DEAL_TRUMP_RECEIVED = 4
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _pack_entries(out: bytearray, entries: list):
+    out.append(len(entries))
+    out.extend(x['card'].index | x['owner'] << 6 for x in entries)
+
+
+def _pack_cards(out: bytearray, cards: list[Card]):
+    out.append(len(cards))
+    out.extend(card.index for card in cards)
+
+
+class _Reader:
+    __slots__ = ('data', 'offset')
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.offset = 0
+
+    def unpack(self, layout: struct.Struct) -> tuple:
+        values = layout.unpack_from(self.data, self.offset)
+        self.offset += layout.size
+        return values
+
+    def read(self, count: int) -> bytes:
+        if self.offset + count > len(self.data):
+            raise SnapshotError('snapshot is truncated')
+        result = self.data[self.offset:self.offset + count]
+        self.offset += count
+        return result
+
+    def entries(self) -> list:
+        return [{'card': Card.from_index(x & 0x3f), 'owner': x >> 6} for x in self.read(self.read(1)[0])]
+
+    def cards(self) -> list[Card]:
+        return [Card.from_index(x) for x in self.read(self.read(1)[0])]
+
+
+def dump(is_started: bool, request_game_message_id: int, game) -> bytes:
+    flags = (_STARTED if is_started else 0) | (_HAS_GAME if game is not None else 0)
+    out = bytearray(_HEADER.pack(VERSION, flags, request_game_message_id))
+    if game is not None:
+        out += _GAME.pack(game.player1_id, game.player2_id, game.player3_id, game.player4_id,
+                          game.first_team_total_score, game.second_team_total_score, game.deal is not None)
+        if game.deal is not None:
+            _dump_deal(out, game.deal)
+    return bytes(out)
+
+
+def _dump_deal(out: bytearray, deal: Deal):
+    pants = isinstance(deal, PantsDeal)
+    flags = (_DEAL_STARTED if deal.is_started else 0) | (_DEAL_JACKPOT if deal.is_jackpot else 0) \
+        | (_DEAL_TRUMP_RECEIVED if pants and deal.is_trump_received else 0)
+    out += _DEAL.pack(DealTypes.classes.index(type(deal)), deal.owner_index, deal.player_index,
+                      -1 if deal.trump is None else int(deal.trump), flags, deal.pants_turns if pants else 0,
+                      *deal.player_hands, deal.deck.currentIndex, deal.deck.lastIndex)
+    out.extend(card.index for card in deal.deck.cards)
+    _pack_entries(out, deal.team1_cards)
+    _pack_entries(out, deal.team2_cards)
+    _pack_entries(out, deal.cards)
+    out.append(len(deal.cards_history))
+    for bribe in deal.cards_history:
+        _pack_entries(out, bribe)
+    if pants:
+        for i in range(4):
+            _pack_cards(out, deal.last_step_cards[i])
+        if isinstance(deal, SinglePantsDeal):
+            _pack_entries(out, deal.pant_cards)
+        else:
+            _pack_entries(out, deal.left_pant_cards)
+            _pack_entries(out, deal.right_pant_cards)
+
+
+def load(data: bytes, game_factory) -> (bool, int, object):
+    """Returns (is_started, request_game_message_id, game); game_factory(owner_id) creates the GoatGame to fill."""
+    reader = _Reader(data)
+    try:
+        version, flags, request_game_message_id = reader.unpack(_HEADER)
+        if version != VERSION:
+            raise SnapshotError(f'unknown snapshot version {version}')
+        game = None
+        if flags & _HAS_GAME:
+            player1_id, player2_id, player3_id, player4_id, first_score, second_score, has_deal = \
+                reader.unpack(_GAME)
+            game = game_factory(player1_id)
+            game.player2_id, game.player3_id, game.player4_id = player2_id, player3_id, player4_id
+            game.first_team_total_score, game.second_team_total_score = first_score, second_score
+            if has_deal:
+                game.resume_deal(_load_deal(reader))
+        if reader.offset != len(data):
+            raise SnapshotError('snapshot has trailing data')
+    except SnapshotError:
+        raise
+    except (struct.error, IndexError, KeyError, ValueError) as e:
+        raise SnapshotError(f'snapshot is corrupted: {e}') from e
+    return flags & _STARTED != 0, request_game_message_id, game
+
+
+def _load_deal(reader: _Reader) -> Deal:
+    deal_type, owner_index, player_index, trump, flags, pants_turns, hand1, hand2, hand3, hand4, \
+        current_index, last_index = reader.unpack(_DEAL)
+    deal = DealTypes.classes[deal_type](owner_index)
+    deal.player_index = player_index
+    deal.trump = None if trump < 0 else CardSuit(trump)
+    deal.is_started = flags & _DEAL_STARTED != 0
+    deal.is_jackpot = flags & _DEAL_JACKPOT != 0
+    deal.player_hands = [hand1, hand2, hand3, hand4]
+    deal.deck.cards = [Card.from_index(x) for x in reader.read(Deck.COUNT)]
+    deal.deck.currentIndex, deal.deck.lastIndex = current_index, last_index
+    deal.team1_cards = reader.entries()
+    deal.team2_cards = reader.entries()
+    deal.cards = reader.entries()
+    deal.cards_history = [reader.entries() for _ in range(reader.read(1)[0])]
+    if isinstance(deal, PantsDeal):
+        deal.is_trump_received = flags & _DEAL_TRUMP_RECEIVED != 0
+        deal.pants_turns = pants_turns
+        deal.last_step_cards = {i: reader.cards() for i in range(4)}
+        if isinstance(deal, SinglePantsDeal):
+            deal.pant_cards = reader.entries()
+        else:
+            deal.left_pant_cards = reader.entries()
+            deal.right_pant_cards = reader.entries()
+    return deal
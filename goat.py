@@ -1,75 +1,201 @@
-import sys
+import argparse
+import functools
+import os
+import threading
 
 import telebot
 import logging
 from telebot import types
 from telebot.apihelper import ApiException
 
+import gameSnapshot
+import metrics
+from gameLog import GameLog
 from DBConnector import DBConnector
-from deals import DealTypes
+from asyncTransport import run_async
+from chatExecutor import ChatExecutor
+from shardSupervisor import run_sharded
+from webhookTransport import run_webhook
 from goatGame import GoatGame
-from models import Card, CardSuit, SUIT_STRING_TO_SUIT, CardSuitString, START_GAME_MESSAGES, GoatUser
+from goatRegistry import GoatRegistry
+from liveTable import LiveTable
+from keyboards import DEAL_KEYBOARD, REMOVE_KEYBOARD, SELECTIVE_REMOVE_KEYBOARD, START_GAME_KEYBOARD, \
+    TRUMP_KEYBOARD, HandKeyboards, get_pants_keyboard
+from messageTemplates import escape_markdown, get_mention
+from outbox import Outbox
+from playerCache import PlayerProfileCache, PrivateChatCache
+from messageCommands import CommandFilter, CommandType, classify
+from models import Card, CardSuit, GoatUser
+from goatLogging import STEP_LOGGER_NAME, LazyCards, LazyMessage, configure_logging
 
+logger = logging.getLogger('goat.bot')
+step_logger = logging.getLogger(STEP_LOGGER_NAME)
 
-def _message_to_log_str(message: types.Message):
-    if message is None:
-        return ''
-    remove_chr = '\r\n'
-    return f'Msg(from: {message.from_user.id}, ' \
-           f'reply_to: {_message_to_log_str(message.reply_to_message)}, ' \
-           f'text: {message.text.replace(remove_chr, "")})'
+# reply to a join of a player seated in another chat, also sent by the shard supervisor
+SEATED_ELSEWHERE = 'Ты уже играешь в другом чате'
+
+
+def _locked(method):
+    """Runs a Goat method holding the session lock: handlers and outbox callbacks of a chat never overlap."""
+    @functools.wraps(method)
+    def call(self, *args, **kwargs):
+        with self.lock:
+            return method(self, *args, **kwargs)
+
+    return call
+
+
+def _run_now(chat_id: int, fn, *args):
+    fn(*args)
 
 
 class Goat:
-    def __init__(self, tele_bot: telebot.TeleBot):
-        logging.debug('Goat constructor called')
-        self.db = DBConnector()
-        self.chat_id = None
+    def __init__(self, tele_bot: telebot.TeleBot, chat_id: int, db: DBConnector, outbox: Outbox,
+                 seat_registry: GoatRegistry | None = None, live_table: bool = False,
+                 private_chats: PrivateChatCache | None = None, run_in_chat=_run_now):
+        logger.debug('Goat constructor called %s', chat_id)
+        self.db = db
+        self.chat_id = chat_id
         self.is_started = False
+        # players of the started game; seat_registry routes their private messages here
+        self.seats = frozenset()
+        self.seat_registry = seat_registry
         self.request_game_message_id = -1
         self.game = None
         self.bot = tele_bot
-
+        self.outbox = outbox
+        self.profiles = PlayerProfileCache(tele_bot, chat_id, db)
+        self.hand_keyboards = HandKeyboards()
+        # in live table mode tricks, pants and turns are shown by editing one message, step prompts go to private
+        self.table = LiveTable(outbox, chat_id) if live_table else None
+        self.private_chats = private_chats if private_chats is not None else PrivateChatCache(db)
+        # outbox callbacks come on outbox threads, run_in_chat(chat_id, fn, *args) hands them to the chat's thread
+        self.run_in_chat = run_in_chat
+        self.lock = threading.RLock()
+        # set once the session is dropped, e.g. its chat moved to another shard; late callbacks are ignored
+        self.closed = False
+
+    @_locked
+    def close(self):
+        self.closed = True
+
+    @_locked
+    def evict(self):
+        # an idle game is abandoned, so it must not come back with the next message to the chat
+        logger.debug('Goat.evict(%s) called', self.chat_id)
+        self.close()
+        self.db.delete_snapshot(self.chat_id)
+
+    @_locked
     def on_message_received(self, message: types.Message):
-        logging.debug(f'Goat.on_message_received({_message_to_log_str(message)}) called')
+        if step_logger.isEnabledFor(logging.DEBUG):
+            step_logger.debug('Goat.on_message_received(%s) called', LazyMessage(message))
         if self.is_started:
-            self.bot.reply_to(message, "Тсс, играют, не мешай")
+            self.outbox.reply_to(message, "Тсс, играют, не мешай")
 
-    def start_game(self, chat_id: int, player_id: int):
-        logging.debug(f'Goat.start_game({chat_id}, {player_id}) called')
+    @_locked
+    def start_game(self, player: types.User):
+        player_id = player.id
+        logger.debug('Goat.start_game(%s, %s) called', self.chat_id, player_id)
         self.is_started = True
-        self.game = GoatGame(player_id, self.on_request_trump,
-                             self.send_current_cards_to_private_message,
-                             self.on_request_show_bribe_handler,
-                             self.on_ask_for_deal,
-                             self.on_ask_for_step,
-                             self.on_request_show_pants,
-                             self.send_jackpot,
-                             self.show_total_score,
-                             self.on_ask_for_pants_step,
-                             self.on_request_show_current_pants)
-        self.chat_id = chat_id
+        self.profiles.clear()
+        self.hand_keyboards.clear()
+        self._reset_table()
+        self.profiles.remember(player)
+        self.game = self._create_game(player_id, GameLog())
+        self._update_seats()
+        self._save_snapshot()
         self._request_for_game(player_id)
 
+    def _create_game(self, owner_id: int, log: GameLog | None = None) -> GoatGame:
+        return GoatGame(owner_id, self.on_request_trump,
+                        self.send_current_cards_to_private_message,
+                        self.on_request_show_bribe_handler,
+                        self.on_ask_for_deal,
+                        self.on_ask_for_step,
+                        self.on_request_show_pants,
+                        self.send_jackpot,
+                        self.show_total_score,
+                        self.on_ask_for_pants_step,
+                        self.on_request_show_current_pants,
+                        log)
+
+    @_locked
     def stop_game(self):
-        logging.debug('Goat.stop_game called')
+        logger.debug('Goat.stop_game called')
         self.is_started = False
         self.game = None
+        self._update_seats()
+        self.profiles.clear()
+        self.hand_keyboards.clear()
+        self._reset_table()
+        self.db.delete_snapshot(self.chat_id)
+
+    def _reset_table(self):
+        if self.table is not None:
+            self.table.reset()
+
+    def _update_seats(self):
+        self.seats = frozenset(self.game.get_player_ids()) if self.is_started and self.game is not None \
+            else frozenset()
+        if self.seat_registry is not None:
+            self.seat_registry.set_seats(self.chat_id, self.seats)
+
+    def _is_seated_player(self, message: types.Message) -> bool:
+        # before the start the engine checks report the state
+        if not self.is_started or message.from_user.id in self.seats:
+            return True
+        self.outbox.reply_to(message, 'Вы не играете в этой игре')
+        return False
+
+    def _save_snapshot(self):
+        step_logger.debug('Goat._save_snapshot(%s) called', self.chat_id)
+        if self.closed:
+            return
+        events = self.game.log.peek() if self.game is not None else b''
+        self.db.save_snapshot(self.chat_id,
+                              gameSnapshot.dump(self.is_started, self.request_game_message_id, self.game), events)
+        if len(events) > 0:
+            # only once written: after a failed write the events go with the next snapshot
+            self.game.log.discard(len(events))
+
+    @_locked
+    def resume(self) -> bool:
+        data = self.db.load_snapshot(self.chat_id)
+        if data is None:
+            return False
+        try:
+            self.is_started, self.request_game_message_id, self.game = gameSnapshot.load(data, self._create_game)
+        except gameSnapshot.SnapshotError:
+            logger.exception('Goat.resume(%s) dropped a broken snapshot', self.chat_id)
+            self.stop_game()
+            return False
+        if self.game is not None:
+            self.game.log = GameLog()
+        self._update_seats()
+        logger.debug('Goat.resume(%s) resumed, %s bytes', self.chat_id, len(data))
+        return True
 
     def _request_for_game(self, player_id: int):
-        logging.debug(f'Goat._request_for_game({player_id}) called')
-        markup = types.ReplyKeyboardMarkup()
-        for message in START_GAME_MESSAGES.keys():
-            markup.row(message)
+        logger.debug('Goat._request_for_game(%s) called', player_id)
         users = self.db.get_users(self.chat_id)
-        request_links = [f'[{x.get_full_name()}](tg://user?id={str(x.id)})' for x in users if x.id != player_id]
-        message = self.bot.send_message(self.chat_id, f'Кто в козла?\r\n\r\n{", ".join(request_links)}',
-                                        reply_markup=markup, parse_mode='MarkdownV2')
+        request_links = [get_mention(x.id, escape_markdown(x.get_full_name() or str(x.id)))
+                         for x in users if x.id != player_id]
+        self.outbox.send_message(self.chat_id, f'Кто в козла?\r\n\r\n{", ".join(request_links)}',
+                                 reply_markup=START_GAME_KEYBOARD, parse_mode='MarkdownV2',
+                                 on_sent=lambda message, game=self.game: self.run_in_chat(
+                                     self.chat_id, self._on_request_for_game_sent, message, game))
+
+    @_locked
+    def _on_request_for_game_sent(self, message: types.Message, game: GoatGame):
+        if self.closed or self.game is not game:
+            # stopped or moved away meanwhile
+            return
         self.request_game_message_id = message.id
-        pass
+        self._save_snapshot()
 
     def start(self):
-        logging.debug('Goat.start called')
+        logger.debug('Goat.start called')
         self.game.first_deal()
         pass
 
@@ -80,93 +206,106 @@ class Goat:
             cards_str.append(card.to_string())
         return "\t".join(cards_str)
 
-    @staticmethod
-    def _suit_str_to_suit(text: str) -> CardSuit:
-        if text in SUIT_STRING_TO_SUIT:
-            return SUIT_STRING_TO_SUIT[text]
-        return CardSuit.NONE
-
-    def on_trump_received(self, message: types.Message):
-        logging.debug(f'Goat.on_trump_received({_message_to_log_str(message)}) called')
+    @_locked
+    def on_trump_received(self, message: types.Message, trump: CardSuit):
+        logger.debug('Goat.on_trump_received(%s, %s) called', LazyMessage(message), trump)
+        if not self._is_seated_player(message):
+            return
         if not self.is_started or not self.game.is_wait_for_trump():
-            self.bot.reply_to(message, "Так нельзя!")
+            self.outbox.reply_to(message, "Так нельзя!")
+            return
+        if self.game.select_trump(message.from_user.id, trump):
+            self._save_snapshot()
+
+    @_locked
+    def on_card_received(self, message: types.Message, card: Card):
+        if step_logger.isEnabledFor(logging.DEBUG):
+            step_logger.debug('Goat.on_card_received(%s, %s) called', LazyMessage(message), card)
+        if not self._is_seated_player(message):
             return
-        selected_trump = self._suit_str_to_suit(message.text)
-        self.game.select_trump(message.from_user.id, selected_trump)
-        pass
-
-    def on_card_received(self, message: types.Message):
-        logging.debug(f'Goat.on_card_received({_message_to_log_str(message)}) called')
         if not self.is_started or not self.game.is_wait_for_player_card(message.from_user.id):
-            self.bot.reply_to(message, 'Так нельзя.')
+            self.outbox.reply_to(message, 'Так нельзя.')
             return
-        _, card = Card.try_parse(message.text)
         if not self.game.do_player_step(message.from_user.id, card):
-            self.bot.reply_to(message, 'Ну дождись своего хода')
-
-    def on_card_private_received(self, message: types.Message):
-        logging.debug(f'Goat.on_card_private_received({_message_to_log_str(message)}) called')
+            self._reply_card_rejected(message, card)
+            return
+        self._save_snapshot()
+        self._refresh_hand_keyboard(message.from_user.id)
+
+    @_locked
+    def on_card_private_received(self, message: types.Message, card: Card):
+        if step_logger.isEnabledFor(logging.DEBUG):
+            step_logger.debug('Goat.on_card_private_received(%s, %s) called', LazyMessage(message), card)
+        if not self._is_seated_player(message):
+            return
         if not self.is_started or not self.game.is_wait_for_player_card(message.from_user.id):
-            self.bot.reply_to(message, 'Так нельзя.')
+            self.outbox.reply_to(message, 'Так нельзя.')
             return
-        _, card = Card.try_parse(message.text)
         if not self.game.do_player_step(message.from_user.id, card):
-            self.bot.reply_to(message, 'Ну дождись своего хода')
-
-    def on_card_pair_received(self, message: types.Message):
-        logging.debug(f'Goat.on_card_pair_received({_message_to_log_str(message)}) called')
+            self._reply_card_rejected(message, card)
+            return
+        self._save_snapshot()
+        self._refresh_hand_keyboard(message.from_user.id)
+
+    @_locked
+    def on_card_pair_received(self, message: types.Message, left_card: Card, right_card: Card):
+        if step_logger.isEnabledFor(logging.DEBUG):
+            step_logger.debug('Goat.on_card_pair_received(%s, %s, %s) called', LazyMessage(message), left_card,
+                              right_card)
+        if not self._is_seated_player(message):
+            return
         if not self.is_started or not self.game.is_wait_for_player_card_pair(message.from_user.id):
-            self.bot.reply_to(message, 'Так нельзя...')
+            self.outbox.reply_to(message, 'Так нельзя...')
+            return
+        if not self.game.do_player_pants_step(message.from_user.id, left_card, right_card):
+            self.outbox.reply_to(message, 'Так нельзя!!!')
+            return
+        self._save_snapshot()
+
+    @_locked
+    def on_deal_received(self, message: types.Message, deal_name: str):
+        logger.debug('Goat.on_deal_received(%s, %s) called', LazyMessage(message), deal_name)
+        if not self._is_seated_player(message):
             return
-        cards = message.text.split(' ', 2)
-        _, card1 = Card.try_parse(cards[0])
-        _, card2 = Card.try_parse(cards[1])
-        if not self.game.do_player_pants_step(message.from_user.id, card1, card2):
-            self.bot.reply_to(message, 'Так нельзя!!!')
-
-    def on_deal_received(self, message: types.Message):
-        logging.debug(f'Goat.on_deal_received({_message_to_log_str(message)}) called')
         if not self.is_started or not self.game.is_wait_for_deal(message.from_user.id):
-            self.bot.reply_to(message, "Так нельзя")
+            self.outbox.reply_to(message, "Так нельзя")
             return
-        if not self.game.start_next_deal(message.from_user.id, message.text):
-            self.bot.reply_to(message, 'Вы не можете выбрать хваленку')
+        if not self.game.start_next_deal(message.from_user.id, deal_name):
+            self.outbox.reply_to(message, 'Вы не можете выбрать хваленку')
             return
-        # self.send_current_cards_to_private_message(message.from_user.id)
-        pass
+        self._save_snapshot()
 
     def on_request_trump(self, player_id: int):
-        logging.debug(f'Goat.on_request_trump({player_id}) called')
-        user = self.bot.get_chat_member(self.chat_id, player_id).user
-        markup = types.ReplyKeyboardMarkup()
-        markup.selective = True
-        markup.row(types.KeyboardButton(str(CardSuitString.DIAMONDS)), types.KeyboardButton(str(CardSuitString.HEARTS)))
-        markup.row(types.KeyboardButton(str(CardSuitString.SPADES)), types.KeyboardButton(str(CardSuitString.CLUBS)))
-        markup.row("Без козыря")
-        self.bot.send_message(self.chat_id, f'[{user.full_name}]'
-                                            f'(tg://user?id={str(player_id)}), выбирай козырь',
-                              reply_markup=markup, parse_mode='MarkdownV2')
+        logger.debug('Goat.on_request_trump(%s) called', player_id)
+        self.outbox.send_message(self.chat_id, f'{self.profiles.get_mention(player_id)}, выбирай козырь',
+                                 reply_markup=TRUMP_KEYBOARD, parse_mode='MarkdownV2')
         pass
 
     def on_request_show_pants(self, l_c: list[Card], t_l_c: Card, t_l_c_o: int,
                               r_c: list[Card], t_r_c: Card, t_r_c_o: int, next_id: int):
-        logging.debug(f'Goat.on_request_show_pants'
-                      f'({self._cards_to_str(l_c)}, {t_l_c.to_string()}, {t_l_c_o}, '
-                      f'{self._cards_to_str(r_c)}, {t_r_c.to_string() if t_r_c is not None else None}, '
-                      f'{t_l_c_o}, {next_id}) called')
-        left_taken_user = self.bot.get_chat_member(self.chat_id, t_l_c_o).user
-        right_taken_user = self.bot.get_chat_member(self.chat_id, t_r_c_o).user
-        next_user = left_taken_user if next_id == t_l_c_o else right_taken_user
-        self.bot.send_message(self.chat_id, f'Штаны:\r\n\r\n'
-                                            f'Слева: {self._cards_to_str(l_c)}\r\n'
-                                            f'Забрал: *{left_taken_user.full_name}* - *{t_l_c.to_string()}*\r\n\r\n'
-                                            f'Справа: {self._cards_to_str(r_c)}\r\n'
-                                            f'Забрал: *{right_taken_user.full_name}* - *{t_r_c.to_string()}*\r\n\r\n'
-                                            f'Ходит: *{next_user.full_name}*', parse_mode="MarkdownV2")
+        logger.debug('Goat.on_request_show_pants(%s, %s, %s, %s, %s, %s, %s) called', LazyCards(l_c), t_l_c, t_l_c_o,
+                     LazyCards(r_c), t_r_c, t_l_c_o, next_id)
+        left_taken_user_name = self.profiles.get_markdown_name(t_l_c_o)
+        next_user_name = self.profiles.get_markdown_name(next_id)
+        if r_c is None:
+            # single pants
+            pants_str = f'{self._cards_to_str(l_c)}\r\n' \
+                        f'Забрал: *{left_taken_user_name}* \\- *{t_l_c.to_string()}*\r\n\r\n'
+        else:
+            right_taken_user_name = self.profiles.get_markdown_name(t_r_c_o)
+            pants_str = f'Слева: {self._cards_to_str(l_c)}\r\n' \
+                        f'Забрал: *{left_taken_user_name}* \\- *{t_l_c.to_string()}*\r\n\r\n' \
+                        f'Справа: {self._cards_to_str(r_c)}\r\n' \
+                        f'Забрал: *{right_taken_user_name}* \\- *{t_r_c.to_string()}*\r\n\r\n'
+        if self.table is not None:
+            self.table.update(pants=f'Штаны:\r\n\r\n{pants_str.rstrip()}')
+            return
+        self.outbox.send_message(self.chat_id, f'Штаны:\r\n\r\n{pants_str}'
+                                               f'Ходит: *{next_user_name}*', parse_mode="MarkdownV2")
         pass
 
     def on_request_show_current_pants(self, cards: list):
-        logging.debug(f'Goat.on_request_show_current_pants({cards}) called')
+        step_logger.debug('Goat.on_request_show_current_pants(%s) called', cards)
         result = ''
         for card_obj in cards:
             if len(result) > 0:
@@ -175,301 +314,449 @@ class Goat:
                 result += card_obj[0].to_string() + " " + card_obj[1].to_string()
             elif len(card_obj) == 1:
                 result += card_obj[0].to_string()
-        self.bot.send_message(self.chat_id, f'Штаны:\r\n\r\n{result}')
+        if self.table is not None:
+            self.table.update(pants=f'Штаны:\r\n\r\n{result}')
+            return
+        self.outbox.send_message(self.chat_id, f'Штаны:\r\n\r\n{result}')
 
     def send_current_cards_to_private_message(self, player_id: int):
-        logging.debug(f'Goat.send_current_cards_to_private_message({player_id}) called')
+        logger.debug('Goat.send_current_cards_to_private_message(%s) called', player_id)
         cards = self.game.get_player_cards(player_id)
-        self.bot.send_message(player_id, f'Ваши карты: {self._cards_to_str(cards)}')
-        pass
+        # in live table mode the player moves from this keyboard, there is no prompt per turn
+        keyboard = self.hand_keyboards.get(player_id, self.game.get_player_hand(player_id)) \
+            if self.table is not None else None
+        self.outbox.send_message(player_id, f'Ваши карты: {self._cards_to_str(cards)}', reply_markup=keyboard,
+                                 on_error=lambda error: self.run_in_chat(
+                                     self.chat_id, self._on_cards_not_delivered, player_id, error))
+
+    def _reply_card_rejected(self, message: types.Message, card: Card):
+        player_id = message.from_user.id
+        if self.game.get_player_hand(player_id) & card.bit != 0:
+            self.outbox.reply_to(message, 'Ну дождись своего хода')
+            return
+        # e.g. a button of a keyboard from before a restart
+        self.outbox.reply_to(message, 'У тебя нет такой карты')
+        self.hand_keyboards.discard(player_id)
+        self._refresh_hand_keyboard(player_id)
+
+    def _refresh_hand_keyboard(self, player_id: int):
+        # in live table mode the private keyboard is the only prompt, it must not offer the cards already played;
+        # during the pants the prompt has its own keyboard and the hands are sent again when the tricks start
+        if self.table is None or self.game is None or self.game.is_in_pants():
+            return
+        hand = self.game.get_player_hand(player_id)
+        if hand == self.hand_keyboards.get_hand(player_id):
+            # the deal has just sent this hand, e.g. the next "По N" step
+            return
+        if hand != 0:
+            self.send_current_cards_to_private_message(player_id)
+            return
+        self.hand_keyboards.discard(player_id)
+        self.outbox.send_message(player_id, 'Карты кончились', reply_markup=REMOVE_KEYBOARD)
+
+    @_locked
+    def _on_cards_not_delivered(self, player_id: int, error: Exception):
+        # only this player is told, the deal goes on for everyone
+        logger.warning('Goat(%s) could not send cards to %s: %s', self.chat_id, player_id, error)
+        if self.closed:
+            return
+        self.outbox.send_message(self.chat_id, f'{self.profiles.get_mention(player_id)}, не могу прислать тебе '
+                                               f'карты, напиши мне /start в личку', parse_mode='MarkdownV2')
 
     def on_request_show_bribe_handler(self, cards: list[Card], card: Card, player_id: int):
-        logging.debug(f'Goat.on_request_show_bribe_handler'
-                      f'({self._cards_to_str(cards)}, {card.to_string()}, {player_id}) called')
-        user = self.bot.get_chat_member(self.chat_id, player_id).user
-        self.bot.send_message(self.chat_id, f'Взятка: {self._cards_to_str(cards)}\r\n'
-                                            f'Забрал: *{user.full_name}* - *{card.to_string()}*\r\n\r\n',
-                              parse_mode='MarkdownV2')
+        if step_logger.isEnabledFor(logging.DEBUG):
+            step_logger.debug('Goat.on_request_show_bribe_handler(%s, %s, %s) called', LazyCards(cards), card,
+                              player_id)
+        user_name = self.profiles.get_markdown_name(player_id)
+        if self.table is not None:
+            self.table.update(trick=f'Взятка: {self._cards_to_str(cards)}\r\n'
+                                    f'Забрал: *{user_name}* \\- *{card.to_string()}*')
+            return
+        self.outbox.send_message(self.chat_id, f'Взятка: {self._cards_to_str(cards)}\r\n'
+                                               f'Забрал: *{user_name}* \\- *{card.to_string()}*\r\n\r\n',
+                                 parse_mode='MarkdownV2')
         pass
 
     def on_ask_for_step(self, player_id: int):
-        logging.debug(f'Goat.on_ask_for_step({player_id}) called')
-        user = self.bot.get_chat_member(self.chat_id, player_id).user
-        cards = self.game.get_player_cards(player_id)
-        markup = types.ReplyKeyboardMarkup()
-        markup.selective = True
-        cards_str = []
-        for card in cards:
-            cards_str.append(card.to_string())
-        markup.add(*cards_str, row_width=4)
-        self.bot.send_message(self.chat_id, f'Сейчас ходит [{user.full_name}]'
-                                            f'(tg://user?id={str(player_id)})',
-                              reply_markup=markup, parse_mode='MarkdownV2')
+        step_logger.debug('Goat.on_ask_for_step(%s) called', player_id)
+        if self.table is not None:
+            # the lead of a trick is shown; later turns only ride along with other edits
+            turn = f'Ходит: {self.profiles.get_mention(player_id)}'
+            if self.game.is_trick_empty():
+                self.table.update(turn=turn)
+            else:
+                self.table.set(turn=turn)
+            return
+        keyboard = self.hand_keyboards.get(player_id, self.game.get_player_hand(player_id))
+        self.outbox.send_message(self.chat_id, f'Сейчас ходит {self.profiles.get_mention(player_id)}',
+                                 reply_markup=keyboard, parse_mode='MarkdownV2')
 
     def on_ask_for_pants_step(self, player_id: int):
-        logging.debug(f'Goat.on_ask_for_pants_step({player_id}) called')
-        card_pairs = self.game.get_available_pants_pairs(player_id)
-        if card_pairs is None:
-            self.bot.send_message(player_id, f'Что-то пошло не по плану')
+        logger.debug('Goat.on_ask_for_pants_step(%s) called', player_id)
+        moves_key = self.game.get_pants_moves_key(player_id)
+        if moves_key is None:
+            self.outbox.send_message(player_id, f'Что-то пошло не по плану')
             return
-        markup = types.ReplyKeyboardMarkup()
-        markup.selective = True
-        cards_str = []
-        for card_pair in card_pairs:
-            if len(card_pair) == 2:
-                cards_str.append(f'{card_pair[0].to_string()} {card_pair[1].to_string()}')
-            else:
-                cards_str.append(card_pair[0].to_string())
-        markup.add(*cards_str, row_width=4)
-        self.bot.send_message(player_id, f'Что заложить?',
-                              reply_markup=markup, parse_mode='MarkdownV2')
+        self.outbox.send_message(player_id, f'Что заложить?',
+                                 reply_markup=get_pants_keyboard(moves_key), parse_mode='MarkdownV2')
 
     def on_ask_for_deal(self, player_id: int):
-        logging.debug(f'Goat.on_ask_for_deal({player_id}) called')
-        user = self.bot.get_chat_member(self.chat_id, player_id).user
-        markup = types.ReplyKeyboardMarkup()
-        markup.selective = True
-        deals_str = self.game.get_deal_list()
-        for deal_str in deals_str:
-            markup.row(deal_str)
-        self.bot.send_message(self.chat_id, f'Хвалится [{user.full_name}]'
-                                            f'(tg://user?id={str(player_id)})',
-                              reply_markup=markup, parse_mode='MarkdownV2')
+        logger.debug('Goat.on_ask_for_deal(%s) called', player_id)
+        self.outbox.send_message(self.chat_id, f'Хвалится {self.profiles.get_mention(player_id)}',
+                                 reply_markup=DEAL_KEYBOARD, parse_mode='MarkdownV2')
 
     def send_jackpot(self, winner_id: int, looser_id: int):
-        logging.debug(f'Goat.send_jackpot({winner_id}, {looser_id}) called')
-        winner_user = self.bot.get_chat_member(self.chat_id, winner_id).user
-        looser_user = self.bot.get_chat_member(self.chat_id, looser_id).user
-        self.bot.send_message(self.chat_id, f'Четыре балла!\r\n\r\n'
-                                            f'*{winner_user.full_name}* поймал *{looser_user}*',
-                              parse_mode='MarkdownV2')
+        logger.debug('Goat.send_jackpot(%s, %s) called', winner_id, looser_id)
+        winner_user_name = self.profiles.get_markdown_name(winner_id)
+        looser_user_name = self.profiles.get_markdown_name(looser_id)
+        self.outbox.send_message(self.chat_id, f'Четыре балла!\r\n\r\n'
+                                               f'*{winner_user_name}* поймал *{looser_user_name}*',
+                                 parse_mode='MarkdownV2')
 
     def show_total_score(self, first_team: int, second_team: int):
-        logging.debug(f'Goat.show_total_score({first_team}, {second_team}) called')
-        self.bot.send_message(self.chat_id, f'Счет: *{first_team}:{second_team}*',
-                              reply_markup=types.ReplyKeyboardRemove(), parse_mode='MarkdownV2')
+        logger.debug('Goat.show_total_score(%s, %s) called', first_team, second_team)
+        if metrics.enabled:
+            # with the API call counts, gives the calls per deal of each mode
+            mode = 'live_table' if self.table is not None else 'messages'
+            metrics.registry.increment('goat_deals_total', 'mode', mode, 'Deals played')
+        if self.table is not None:
+            self.table.update(score=f'Счет: *{first_team}:{second_team}*', pants='', trick='')
+            return
+        self.outbox.send_message(self.chat_id, f'Счет: *{first_team}:{second_team}*',
+                                 reply_markup=REMOVE_KEYBOARD, parse_mode='MarkdownV2')
 
+    @_locked
     def on_player_apply_to_game_received(self, message: types.Message):
-        logging.debug(f'Goat.on_player_apply_to_game_received({_message_to_log_str(message)}) called')
-        markup = types.ReplyKeyboardRemove()
+        logger.debug('Goat.on_player_apply_to_game_received(%s) called', LazyMessage(message))
+        markup = REMOVE_KEYBOARD
+        seated_chat = self.seat_registry.get_seated_chat(message.from_user.id) \
+            if self.seat_registry is not None else None
+        if seated_chat is not None and seated_chat != self.chat_id:
+            self.outbox.reply_to(message, SEATED_ELSEWHERE, reply_markup=markup)
+            return
         if self.game.need_player_count() > 0:
-            self.game.add_player(message.from_user.id)
+            if self.game.add_player(message.from_user.id):
+                self.profiles.remember(message.from_user)
+                self._update_seats()
             if self.game.need_player_count() == 0:
-                self.bot.send_message(self.chat_id, 'Народ набрали, поїхали', reply_markup=markup)
+                self.outbox.send_message(self.chat_id, 'Народ набрали, поїхали', reply_markup=markup)
                 self.game.first_deal()
             else:
-                reply_close_menu = types.ReplyKeyboardRemove()
-                reply_close_menu.selective = True
-                self.bot.reply_to(message, 'Принял, ждем других', reply_markup=reply_close_menu)
+                self.outbox.reply_to(message, 'Принял, ждем других',
+                                     reply_markup=SELECTIVE_REMOVE_KEYBOARD)
+            self._save_snapshot()
         else:
-            self.bot.reply_to(message, 'Сорян, все места заняты', reply_markup=markup)
+            self.outbox.reply_to(message, 'Сорян, все места заняты', reply_markup=markup)
 
-    def register_user(self, chat_id: int, message: types.Message):
-        logging.debug(f'Goat.register_user({chat_id}, {_message_to_log_str(message)}) called')
-        if self.db.add_user(chat_id, GoatUser(message.from_user.id, message.from_user.first_name,
+    @_locked
+    def register_user(self, message: types.Message):
+        logger.debug('Goat.register_user(%s, %s) called', self.chat_id, LazyMessage(message))
+        if self.db.add_user(self.chat_id, GoatUser(message.from_user.id, message.from_user.first_name,
                                               message.from_user.last_name, message.from_user.username)):
-            self.bot.reply_to(message, f'Салют, {message.from_user.full_name}')
+            self.outbox.reply_to(message, f'Салют, {message.from_user.full_name}')
         else:
-            self.bot.reply_to(message, 'Брат, здоровались уже')
+            self.outbox.reply_to(message, 'Брат, здоровались уже')
         pass
 
-    def get_started_member_count(self, chat_id: int):
-        logging.debug(f'Goat.get_started_member_count({chat_id}) called')
-        return len(self.db.get_users(chat_id))
+    def get_started_member_count(self):
+        logger.debug('Goat.get_started_member_count(%s) called', self.chat_id)
+        return self.db.count_users(self.chat_id)
 
-    def check_can_send_private(self, from_user: types.User):
+    def check_can_send_private(self, from_user: types.User) -> bool:
+        """From the private chat status in the DB; only a user the bot has never talked to gets a probe message."""
+        reachable = self.private_chats.get(from_user.id)
+        if reachable is not None:
+            return reachable
+        logger.debug('Goat.check_can_send_private(%s) probing', from_user.id)
         try:
             message = self.bot.send_message(from_user.id, "Добро пожаловать в игру")
-            self.bot.delete_message(from_user.id, message.id)
-        except ApiException:
+        except ApiException as e:
+            # only a 403 says the user has no chat with the bot, other errors leave the status unknown
+            if getattr(e, 'error_code', None) == 403:
+                self.private_chats.mark_unreachable(from_user.id)
             return False
+        self.private_chats.mark_reachable(from_user.id)
+        try:
+            self.bot.delete_message(from_user.id, message.id)
+        except ApiException as e:
+            logger.warning('Goat.check_can_send_private(%s) could not delete the probe: %s', from_user.id, e)
         return True
 
 
-logging.basicConfig(stream=sys.stdout, level=logging.DEBUG)
+bot = telebot.TeleBot(os.environ.get('GOAT_TOKEN', 'TOKEN'))
 
-bot = telebot.TeleBot('TOKEN')
+db = DBConnector(os.environ.get('GOAT_DB_PATH', DBConnector.DEFAULT_PATH))
 
-goat = Goat(bot)
+private_chats = PrivateChatCache(db)
 
+outbox = Outbox(bot, private_chats=private_chats)
 
-class RespondToRequestTrump(telebot.custom_filters.SimpleCustomFilter):
-    key = 'trump_response'
+# set by main() or the shard worker: the ChatExecutor the outbox callbacks of a chat are queued on
+chat_executor = None
 
-    @staticmethod
-    def check(message: telebot.types.Message, **kwargs):
-        logging.debug(f'check trump_response({_message_to_log_str(message)}) called')
-        reply_message = message.reply_to_message
-        if reply_message is None or reply_message.from_user.is_bot is False or \
-                reply_message.from_user.username.lower() != 'goatgroupbot':
-            return False
-        return message.text.lower() in SUIT_STRING_TO_SUIT
+# an environment variable so that shard processes pick it up too
+live_table = os.environ.get('GOAT_LIVE_TABLE', '') == '1'
 
 
-class RespondToRequestCard(telebot.custom_filters.SimpleCustomFilter):
-    key = 'card_response'
+def run_in_chat(chat_id: int, fn, *args):
+    """Queues fn behind the updates of the chat, or runs it right away without an executor."""
+    if chat_executor is not None:
+        chat_executor.submit(chat_id, fn, *args)
+    else:
+        fn(*args)
 
-    @staticmethod
-    def check(message: telebot.types.Message, **kwargs):
-        logging.debug(f'check card_response({_message_to_log_str(message)}) called')
-        reply_message = message.reply_to_message
-        if reply_message is None or reply_message.from_user.is_bot is False or \
-                reply_message.from_user.username.lower() != 'goatgroupbot':
-            return False
-        text = message.text.strip()
-        if len(text) < 2 or len(text) > 3:
-            return False
-        result, _ = Card.try_parse(text)
-        return result
 
+def _create_goat(chat_id: int) -> Goat:
+    goat = Goat(bot, chat_id, db, outbox, registry, live_table, private_chats, run_in_chat)
+    goat.resume()
+    return goat
 
-class RespondToRequestCardPrivate(telebot.custom_filters.SimpleCustomFilter):
-    key = 'card_private_response'
-
-    @staticmethod
-    def check(message: telebot.types.Message, **kwargs):
-        logging.debug(f'check card_private_response({_message_to_log_str(message)}) called')
-        if message.chat.id != message.from_user.id:
-            return False
-        text = message.text.strip()
-        if len(text) < 2 or len(text) > 3:
-            return False
-        result, _ = Card.try_parse(text)
-        return result
 
+# an unloaded session keeps its snapshot and is resumed from it with the next message to its chat
+registry = GoatRegistry(_create_goat, on_evict=Goat.evict, on_unload=Goat.close)
 
-class RespondToRequestCardPair(telebot.custom_filters.SimpleCustomFilter):
-    key = 'card_pair_response'
 
-    @staticmethod
-    def check(message: telebot.types.Message, **kwargs):
-        logging.debug(f'check card_pair_response({_message_to_log_str(message)}) called')
-        if len(message.text) < 5 or len(message.text) > 7:
-            return False
-        pair = message.text.split(' ', 2)
-        if len(pair) != 2:
-            return False
-        result1, _ = Card.try_parse(pair[0].strip())
-        result2, _ = Card.try_parse(pair[1].strip())
-        return result1 and result2
+def resume_games() -> int:
+    chat_ids = db.get_snapshot_chat_ids()
+    for chat_id in chat_ids:
+        registry.get_or_create(chat_id)
+    return len(chat_ids)
 
 
-class RespondToRequestDeal(telebot.custom_filters.SimpleCustomFilter):
-    key = 'deal_response'
+def _get_player_session(message: types.Message) -> Goat | None:
+    if message.chat.type == 'private':
+        return registry.find_by_player(message.from_user.id)
+    return registry.get(message.chat.id)
 
-    @staticmethod
-    def check(message: telebot.types.Message, **kwargs):
-        logging.debug(f'check deal_response({_message_to_log_str(message)}) called')
-        reply_message = message.reply_to_message
-        if reply_message is None or reply_message.from_user.is_bot is False or \
-                reply_message.from_user.username.lower() != 'goatgroupbot':
-            return False
-        return DealTypes().is_deal(message.text)
 
+def _remember_private_chat(message: types.Message):
+    # whoever writes to the bot in private can be written to
+    if message.chat.type == 'private':
+        private_chats.mark_reachable(message.from_user.id)
 
-class RespondToRequestPlayers(telebot.custom_filters.SimpleCustomFilter):
-    key = 'play_response'
 
-    @staticmethod
-    def check(message: telebot.types.Message, **kwargs):
-        logging.debug(f'check play_response({_message_to_log_str(message)}) called')
-        reply_message = message.reply_to_message
-        if reply_message is None or reply_message.from_user.is_bot is False or \
-                reply_message.from_user.username.lower() != 'goatgroupbot':
-            return False
-        return message.text.lower() in [x.lower() for x in START_GAME_MESSAGES.keys()]
+def get_message_chat_key(message: types.Message) -> int:
+    if message.chat.type == 'private':
+        chat_id = registry.get_seated_chat(message.from_user.id)
+        if chat_id is not None:
+            return chat_id
+    return message.chat.id
 
 
 @bot.message_handler(commands=['start'])
 def start(message: types.Message):
-    logging.debug(f'start {_message_to_log_str(message)} called')
-    goat.register_user(message.chat.id, message)
-    pass
+    logger.debug('start %s called', LazyMessage(message))
+    _remember_private_chat(message)
+    if message.chat.type == 'private':
+        # nothing is played in a private chat, it needs no session; being reachable is all that /start changes
+        outbox.reply_to(message, f'Салют, {message.from_user.full_name}')
+        return
+    registry.get_or_create(message.chat.id).register_user(message)
 
 
 @bot.message_handler(commands=['deal'])
 def deal(message: types.Message):
-    logging.debug(f'deal {_message_to_log_str(message)} called')
+    logger.debug('deal %s called', LazyMessage(message))
     if message.chat.type != 'group' and message.chat.type != 'supergroup':
-        bot.reply_to(message, 'Бот работает только в группах')
+        outbox.reply_to(message, 'Бот работает только в группах')
         return
     if bot.get_chat_member_count(message.chat.id) < 4:
-        bot.reply_to(message, 'Для игры нужно минимум 4 человека')
+        outbox.reply_to(message, 'Для игры нужно минимум 4 человека')
         return
-    start_count = goat.get_started_member_count(message.chat.id)
+    goat = registry.get_or_create(message.chat.id)
+    start_count = goat.get_started_member_count()
     if start_count < 4:
-        bot.reply_to(message, f'Не хватает {4 - start_count} игроков для начала, '
+        outbox.reply_to(message, f'Не хватает {4 - start_count} игроков для начала, '
                               f'толкни чтобы написали /start')
         return
     if goat.is_started:
-        bot.reply_to(message, 'Игра уже запущена')
+        outbox.reply_to(message, 'Игра уже запущена')
         return
-    goat.start_game(message.chat.id, message.from_user.id)
+    goat.start_game(message.from_user)
 
 
 @bot.message_handler(commands=['stop'])
 def stop(message: types.Message):
-    logging.debug(f'stop {_message_to_log_str(message)} called')
-    if not goat.is_started:
-        bot.reply_to(message, 'Игра не запущена')
+    logger.debug('stop %s called', LazyMessage(message))
+    goat = registry.get(message.chat.id)
+    if goat is None or not goat.is_started:
+        outbox.reply_to(message, 'Игра не запущена')
         return
     goat.stop_game()
-    bot.reply_to(message, 'Игра остановлена')
+    outbox.reply_to(message, 'Игра остановлена')
 
 
-@bot.message_handler(play_response=True)
+@bot.message_handler(command=CommandType.JOIN)
 def on_apply_to_game_received(message: types.Message):
-    logging.debug(f'on_apply_to_game_received {_message_to_log_str(message)} called')
-    if message.reply_to_message.id == goat.request_game_message_id:
+    logger.debug('on_apply_to_game_received %s called', LazyMessage(message))
+    goat = registry.get(message.chat.id)
+    if goat is not None and message.reply_to_message.id == goat.request_game_message_id:
         if goat.check_can_send_private(message.from_user):
             goat.on_player_apply_to_game_received(message)
         else:
-            bot.reply_to(message, "Вы не можете играть пока не начнете диалог со мной, написав мне /start в личку")
+            outbox.reply_to(message, "Вы не можете играть пока не начнете диалог со мной, написав мне /start в личку")
     else:
-        bot.reply_to(message, "Нужно начать игру, напиши /deal")
+        outbox.reply_to(message, "Нужно начать игру, напиши /deal")
 
 
-@bot.message_handler(trump_response=True)
+@bot.message_handler(command=CommandType.TRUMP)
 def on_trump_received(message: types.Message):
-    logging.debug(f'on_trump_received {_message_to_log_str(message)} called')
-    goat.on_trump_received(message)
+    logger.debug('on_trump_received %s called', LazyMessage(message))
+    goat = registry.get(message.chat.id)
+    if goat is None:
+        outbox.reply_to(message, 'Игра не запущена')
+        return
+    goat.on_trump_received(message, classify(message).trump)
 
 
-@bot.message_handler(card_response=True)
+@bot.message_handler(command=CommandType.CARD)
 def on_card_received(message: types.Message):
-    logging.debug(f'on_card_received {_message_to_log_str(message)} called')
-    goat.on_card_received(message)
+    if step_logger.isEnabledFor(logging.DEBUG):
+        step_logger.debug('on_card_received %s called', LazyMessage(message))
+    goat = registry.get(message.chat.id)
+    if goat is None:
+        outbox.reply_to(message, 'Игра не запущена')
+        return
+    goat.on_card_received(message, classify(message).card)
 
 
-@bot.message_handler(card_private_response=True)
-def on_card_received(message: types.Message):
-    logging.debug(f'on_card_private_received {_message_to_log_str(message)} called')
-    goat.on_card_private_received(message)
+@bot.message_handler(command=CommandType.PRIVATE_CARD)
+def on_card_private_received(message: types.Message):
+    if step_logger.isEnabledFor(logging.DEBUG):
+        step_logger.debug('on_card_private_received %s called', LazyMessage(message))
+    _remember_private_chat(message)
+    goat = registry.find_by_player(message.from_user.id)
+    if goat is None:
+        outbox.reply_to(message, 'Вы сейчас не играете')
+        return
+    goat.on_card_private_received(message, classify(message).card)
 
 
-@bot.message_handler(card_pair_response=True)
+@bot.message_handler(command=CommandType.CARD_PAIR)
 def on_card_pair_received(message: types.Message):
-    logging.debug(f'on_card_pair_received {_message_to_log_str(message)} called')
-    goat.on_card_pair_received(message)
+    if step_logger.isEnabledFor(logging.DEBUG):
+        step_logger.debug('on_card_pair_received %s called', LazyMessage(message))
+    _remember_private_chat(message)
+    goat = _get_player_session(message)
+    if goat is None:
+        outbox.reply_to(message, 'Вы сейчас не играете')
+        return
+    goat.on_card_pair_received(message, *classify(message).cards)
 
 
-@bot.message_handler(deal_response=True)
+@bot.message_handler(command=CommandType.DEAL)
 def on_deal_received(message: types.Message):
-    logging.debug(f'on_deal_received {_message_to_log_str(message)} called')
-    goat.on_deal_received(message)
+    logger.debug('on_deal_received %s called', LazyMessage(message))
+    goat = registry.get(message.chat.id)
+    if goat is None:
+        outbox.reply_to(message, 'Игра не запущена')
+        return
+    goat.on_deal_received(message, classify(message).deal_name)
 
 
 @bot.message_handler()
 def on_message_received(message: types.Message):
-    logging.debug(f'on_message_received {_message_to_log_str(message)} called')
-    goat.on_message_received(message)
-
+    if step_logger.isEnabledFor(logging.DEBUG):
+        step_logger.debug('on_message_received %s called', LazyMessage(message))
+    _remember_private_chat(message)
+    goat = registry.get(message.chat.id)
+    if goat is not None:
+        goat.on_message_received(message)
+
+
+bot.add_custom_filter(CommandFilter())
+
+
+def _set_bot(tele_bot):
+    global bot
+    if metrics.enabled and not isinstance(tele_bot, metrics.InstrumentedBot):
+        tele_bot = metrics.InstrumentedBot(tele_bot)
+    bot = tele_bot
+    outbox.bot = tele_bot
+
+
+def _set_async_bot(tele_bot):
+    # sessions keep the bot they are created with, so in async mode games are resumed once the bridge is set
+    _set_bot(tele_bot)
+    logger.info('Resumed %s games', resume_games())
+
+
+def _set_chat_executor(executor: ChatExecutor):
+    global chat_executor
+    chat_executor = executor
+
+
+def _enable_live_table():
+    global live_table
+    live_table = True
+    os.environ['GOAT_LIVE_TABLE'] = '1'
+
+
+def _enable_metrics(port: int):
+    metrics.enable(port)
+    metrics.instrument_handlers(bot.message_handlers)
+    metrics.instrument_methods(db, metrics.DB_METHODS, 'goat_db_seconds', 'SQLite call latency')
+    metrics.instrument_methods(GoatGame, metrics.ENGINE_METHODS, 'goat_engine_seconds',
+                               'GoatGame action latency, handlers included')
+    _set_bot(bot)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='GoatGroupBot')
+    parser.add_argument('--mode', choices=['polling', 'async', 'webhook', 'sharded'],
+                        default=os.environ.get('GOAT_MODE', 'polling'))
+    parser.add_argument('--workers', type=int, default=16,
+                        help='chat worker threads in async and webhook modes, per process in sharded mode')
+    parser.add_argument('--shards', type=int, default=os.environ.get('GOAT_SHARDS', str(os.cpu_count())),
+                        help='worker processes in sharded mode')
+    parser.add_argument('--webhook-url', default=os.environ.get('GOAT_WEBHOOK_URL'),
+                        help='public URL registered with Telegram in webhook mode')
+    parser.add_argument('--webhook-host', default=os.environ.get('GOAT_WEBHOOK_HOST', '0.0.0.0'))
+    parser.add_argument('--webhook-port', type=int, default=os.environ.get('GOAT_WEBHOOK_PORT', '8080'))
+    parser.add_argument('--max-pending', type=int, default=1000,
+                        help='updates queued in webhook mode before Telegram is asked to retry')
+    parser.add_argument('--live-table', action='store_true', default=live_table,
+                        help='edit one table message per game instead of posting every trick, GOAT_LIVE_TABLE=1')
+    parser.add_argument('--metrics-port', type=int, default=os.environ.get('GOAT_METRICS_PORT'),
+                        help='serve /metrics on localhost; metrics are off without it')
+    args = parser.parse_args()
+    if args.live_table:
+        _enable_live_table()
+    configure_logging()
+    logger.info('Starting in %s mode', args.mode)
+    if args.mode == 'sharded':
+        # games are hosted by the shard processes, this one only polls and routes
+        if args.metrics_port is not None:
+            logger.warning('--metrics-port is not supported in sharded mode, metrics are off')
+        try:
+            run_sharded(bot, db.get_snapshot_chat_ids(), args.shards, args.workers)
+        finally:
+            db.close()
+        return
+    # the TeleBot itself, `bot` becomes an InstrumentedBot when metrics are on
+    tele_bot = bot
+    if args.metrics_port is not None:
+        _enable_metrics(args.metrics_port)
+    # handlers run on it in async and webhook modes; in polling mode only the outbox callbacks do
+    executor = ChatExecutor(args.workers, args.max_pending if args.mode == 'webhook' else None)
+    _set_chat_executor(executor)
+    if args.mode != 'async':
+        logger.info('Resumed %s games', resume_games())
+    outbox.start()
+    try:
+        if args.mode == 'async':
+            run_async(bot.token, bot.message_handlers, list(bot.custom_filters.values()), _set_async_bot,
+                      get_message_chat_key, args.workers, executor, outbox.stop)
+        elif args.mode == 'webhook':
+            run_webhook(tele_bot, get_message_chat_key, args.webhook_url, args.webhook_host, args.webhook_port,
+                        os.environ.get('GOAT_WEBHOOK_SECRET'), args.workers, args.max_pending, executor)
+        else:
+            bot.infinity_polling()
+    finally:
+        outbox.stop()
+        executor.shutdown()
+        db.close()
 
-bot.add_custom_filter(RespondToRequestTrump())
-bot.add_custom_filter(RespondToRequestPlayers())
-bot.add_custom_filter(RespondToRequestCard())
-bot.add_custom_filter(RespondToRequestCardPrivate())
-bot.add_custom_filter(RespondToRequestDeal())
-bot.add_custom_filter(RespondToRequestCardPair())
 
-bot.infinity_polling()
+if __name__ == '__main__':
+    main()
@@ -1,13 +1,17 @@
 from deals import AllCardsDeal, DealTypes, Deal, DealType
 from models import Card, CardSuit, StepResult
 import logging
+from goatLogging import STEP_LOGGER_NAME
+
+logger = logging.getLogger('goat.game')
+step_logger = logging.getLogger(STEP_LOGGER_NAME)
 
 
 class GoatGame:
     def __init__(self, owner_id, request_trump_handler, request_send_current_cards_to_pm_handler,
                  request_show_bribe_handler, request_ask_for_deal_handler, request_ask_for_step_handler,
                  request_show_pants_handler, request_show_jackpot_handler, request_show_total_score_handler,
-                 request_ask_for_pants_step_handler, request_show_current_pants_handler):
+                 request_ask_for_pants_step_handler, request_show_current_pants_handler, log=None):
         self.request_trump_handler = request_trump_handler
         self.request_send_current_cards_to_pm_handler = request_send_current_cards_to_pm_handler
         self.request_show_pants_handler = request_show_pants_handler
@@ -25,25 +29,30 @@ class GoatGame:
         self.player4_id = -1
         self.first_team_total_score = 0
         self.second_team_total_score = 0
+        # gameLog.GameLog collecting the accepted actions, if any
+        self.log = log
+        if log is not None:
+            log.game_started(owner_id)
 
     def add_player(self, player: int) -> bool:
         if self.player1_id == player or self.player2_id == player or \
                 self.player3_id == player or self.player4_id == player:
             return False
-        logging.debug(f'GoatGame.add_player({player}) called')
+        logger.debug('GoatGame.add_player(%s) called', player)
         if self.player2_id < 0:
             self.player2_id = player
-            return True
         elif self.player3_id < 0:
             self.player3_id = player
-            return True
         elif self.player4_id < 0:
             self.player4_id = player
-            return True
-        return False
+        else:
+            return False
+        if self.log is not None:
+            self.log.player_added(player)
+        return True
 
     def need_player_count(self) -> int:
-        logging.debug('GoatGame.need_player_count called')
+        step_logger.debug('GoatGame.need_player_count called')
         count = 3
         if self.player2_id > 0:
             count -= 1
@@ -54,22 +63,29 @@ class GoatGame:
         return count
 
     def first_deal(self):
-        logging.debug('GoatGame.first_deal called')
+        logger.debug('GoatGame.first_deal called')
         if self.need_player_count() != 0:
             return
-        self.deal = AllCardsDeal(0)
-        self._apply_deal_handlers(self.deal)
-        self.deal.process_deal()
+        self.start_deal(AllCardsDeal(0))
 
     def get_player_cards(self, player_id: int) -> list[Card]:
         if self.need_player_count() != 0:
             raise NotImplementedError()
         return self.deal.get_player_cards(self.get_player_index_by_id(player_id))
 
+    def get_player_hand(self, player_id: int) -> int:
+        return self.deal.get_player_hand(self.get_player_index_by_id(player_id))
+
     def get_player_index_by_id(self, player_id: int) -> int:
         players = {self.player1_id: 0, self.player2_id: 1, self.player3_id: 2, self.player4_id: 3}
         return players.get(player_id)
 
+    def has_player(self, player_id: int) -> bool:
+        return player_id > 0 and self.get_player_index_by_id(player_id) is not None
+
+    def get_player_ids(self) -> list[int]:
+        return [x for x in (self.player1_id, self.player2_id, self.player3_id, self.player4_id) if x >= 0]
+
     def get_player_id_by_index(self, player_id: int) -> int:
         players = {0: self.player1_id, 1: self.player2_id, 2: self.player3_id, 3: self.player4_id}
         return players.get(player_id)
@@ -80,6 +96,8 @@ class GoatGame:
     def select_trump(self, player_id: int, trump: CardSuit) -> bool:
         if self.get_owner() != player_id:
             return False
+        if self.log is not None:
+            self.log.trump_selected(self.deal.owner_index, trump)
         self.deal.set_trump(trump)
         return True
 
@@ -87,11 +105,21 @@ class GoatGame:
         return self.deal.is_wait_for_trump()
 
     def do_player_step(self, player_id: int, card: Card) -> True:  # TODO request should be from deals?
-        logging.debug(f'GoatGame.do_player_step({player_id}, {card.to_string()}) called')
+        step_logger.debug('GoatGame.do_player_step(%s, %s) called', player_id, card)
         player_index = self.get_player_index_by_id(player_id)
-        if self.deal.player_index != player_index:
+        if self.deal.player_index != player_index or card is None:
             return False
+        # logged up front: handlers may fail after the deal has already changed
+        mark = self.log.card_played(player_index, card) if self.log is not None else -1
+        if self.deal.is_in_pants():
+            if not self.deal.set_pant_card(player_index, [card]):
+                self._rollback_log(mark)
+                return False
+            return True
         step_result = self.deal.do_player_step(player_index, card)
+        if step_result is StepResult.ERROR:
+            self._rollback_log(mark)
+            return False
         if step_result is StepResult.JACKPOT:
             self._on_jackpot(self.deal.get_jackpot_winner_team())
             self._complete_current_deal()
@@ -101,17 +129,27 @@ class GoatGame:
         return True
 
     def do_player_pants_step(self, player_id: int, left_card: Card, right_card: Card) -> bool:
-        logging.debug(f'GoatGame.do_player_pants_step'
-                      f'({player_id}, {left_card.to_string()}, {right_card.to_string()}) called')
+        step_logger.debug('GoatGame.do_player_pants_step(%s, %s, %s) called', player_id, left_card, right_card)
         if self.deal.get_deal_type() != DealType.PANTS:
             return False
         player_index = self.get_player_index_by_id(player_id)
-        if self.deal.player_index != player_index:
+        if self.deal.player_index != player_index or left_card is None or right_card is None:
+            return False
+        mark = self.log.pants_played(player_index, left_card, right_card) if self.log is not None else -1
+        if not self.deal.set_pant_card(player_index, [left_card, right_card]):
+            self._rollback_log(mark)
             return False
-        return self.deal.set_pant_card(player_index, left_card, right_card)
+        return True
+
+    def _rollback_log(self, mark: int):
+        if self.log is not None:
+            self.log.rollback(mark)
+
+    def is_wait_for_player_card_pair(self, player_id: int) -> bool:
+        return self.deal.is_in_pants() and self.is_wait_for_player_card(player_id)
 
     def _complete_current_deal(self):
-        logging.debug('GoatGame._complete_current_deal called')
+        logger.debug('GoatGame._complete_current_deal called')
         self.request_show_total_score_handler(self.first_team_total_score, self.second_team_total_score)
         current_owner_index = self.deal.owner_index + 1
         if current_owner_index > 3:
@@ -119,10 +157,16 @@ class GoatGame:
         self.request_ask_for_deal_handler(self.get_player_id_by_index(current_owner_index))
 
     def is_wait_for_player_card(self, player_id: int):
-        logging.debug(f'GoatGame.is_wait_for_player_card({player_id}) called')
+        step_logger.debug('GoatGame.is_wait_for_player_card(%s) called', player_id)
         player_index = self.get_player_index_by_id(player_id)
         return self.deal.player_index == player_index
 
+    def is_trick_empty(self) -> bool:
+        return len(self.deal.cards) == 0
+
+    def is_in_pants(self) -> bool:
+        return self.deal.is_in_pants()
+
     def get_table_data(self) -> (list[Card], Card, int, int):
         cards, top, top_owner = self.deal.get_table_data()
         return cards, top, self.get_player_id_by_index(top_owner), self.get_player_id_by_index(self.deal.player_index)
@@ -149,7 +193,7 @@ class GoatGame:
         return self.get_player_id_by_index(next_owner_index)
 
     def start_next_deal(self, player_id: int, deal_name: str) -> bool:
-        logging.debug(f'GoatGame.start_next_deal({player_id}, {deal_name}) called')
+        logger.debug('GoatGame.start_next_deal(%s, %s) called', player_id, deal_name)
         if not self.deal.is_completed() or self.get_next_deal_owner() != player_id:
             return False
         if not DealTypes().is_deal(deal_name):
@@ -157,10 +201,21 @@ class GoatGame:
         deal = DealTypes.get_deal(deal_name, self.get_player_index_by_id(player_id))
         if deal is None:
             return False
+        self.start_deal(deal)
+        return True
+
+    def resume_deal(self, deal: Deal):
+        logger.debug('GoatGame.resume_deal(%s) called', type(deal).__name__)
         self._apply_deal_handlers(deal)
         self.deal = deal
+
+    def start_deal(self, deal: Deal):
+        logger.debug('GoatGame.start_deal(%s) called', type(deal).__name__)
+        self._apply_deal_handlers(deal)
+        self.deal = deal
+        if self.log is not None:
+            self.log.deal_started(deal)
         self.deal.process_deal()
-        return True
 
     def _apply_deal_handlers(self, deal: Deal):
         deal.request_trump_handler = lambda x: self.request_trump_handler(self.get_player_id_by_index(x))
@@ -186,7 +241,7 @@ class GoatGame:
         return self.first_team_total_score, self.second_team_total_score
 
     def _on_complete_deal(self):
-        logging.debug('GoatGame._on_complete_deal called')
+        logger.debug('GoatGame._on_complete_deal called')
         first_team_score = self.deal.get_team_score(0)
         second_team_score = self.deal.get_team_score(1)
         if first_team_score > second_team_score:
@@ -195,7 +250,7 @@ class GoatGame:
             self.second_team_total_score += 4 if first_team_score < 30 else 2
 
     def _on_jackpot(self, winner_team_index: int):
-        logging.debug(f'GoatGame._on_jackpot({winner_team_index}) called')
+        logger.debug('GoatGame._on_jackpot(%s) called', winner_team_index)
         if winner_team_index == 0:
             self.first_team_total_score += 4
         else:
@@ -205,6 +260,11 @@ class GoatGame:
     def get_deal_list() -> list[str]:
         return DealTypes.names
 
+    def get_pants_moves_key(self, player_id: int) -> tuple | None:
+        if self.deal.get_deal_type() != DealType.PANTS:
+            return None
+        return self.deal.get_pants_moves_key(self.get_player_index_by_id(player_id))
+
     def get_available_pants_pairs(self, player_id: int) -> list | None:
         if self.deal.get_deal_type() != DealType.PANTS:
             return None
@@ -0,0 +1,77 @@
+import logging
+import os
+import random
+import sys
+
+from models import cards_from_mask
+
+LOG_FORMAT = '%(asctime)s %(levelname)s %(name)s: %(message)s'
+STEP_LOGGER_NAME = 'goat.step'
+
+
+class LazyCards:
+    """Cards, a hand bitmask or trick entries ({'card': ..., 'owner': ...}) rendered only when a record is emitted."""
+    __slots__ = ('cards',)
+
+    def __init__(self, cards):
+        self.cards = cards
+
+    def __str__(self):
+        if self.cards is None:
+            return 'None'
+        if isinstance(self.cards, int):
+            return ' '.join(str(x) for x in cards_from_mask(self.cards))
+        return ' '.join(f'[{x["card"]} {x["owner"]}]' if isinstance(x, dict) else str(x) for x in self.cards)
+
+
+class LazyMessage:
+    __slots__ = ('message',)
+
+    def __init__(self, message):
+        self.message = message
+
+    def __str__(self):
+        return message_to_log_str(self.message)
+
+
+def message_to_log_str(message) -> str:
+    if message is None:
+        return ''
+    remove_chr = '\r\n'
+    return f'Msg(from: {message.from_user.id}, ' \
+           f'reply_to: {message_to_log_str(message.reply_to_message)}, ' \
+           f'text: {message.text.replace(remove_chr, "") if message.text is not None else None})'
+
+
+class SamplingFilter(logging.Filter):
+    """Lets through every record above DEBUG and roughly `rate` of the DEBUG ones."""
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+        # its own generator, so sampling does not shift a seeded module level random
+        self._random = random.Random()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno > logging.DEBUG or self._random.random() < self.rate
+
+
+def configure_logging(level: str | None = None, step_sample_rate: float | None = None,
+                      production: bool | None = None):
+    if production is None:
+        production = os.environ.get('GOAT_LOG_PRODUCTION', '0').lower() in ('1', 'true', 'yes')
+    if level is None:
+        level = os.environ.get('GOAT_LOG_LEVEL', 'WARNING' if production else 'INFO')
+    if step_sample_rate is None:
+        step_sample_rate = float(os.environ.get('GOAT_LOG_STEP_SAMPLE', '1.0'))
+    logging.basicConfig(stream=sys.stdout, level=level.upper(), format=LOG_FORMAT, force=True)
+    step_logger = logging.getLogger(STEP_LOGGER_NAME)
+    for log_filter in [x for x in step_logger.filters if isinstance(x, SamplingFilter)]:
+        step_logger.removeFilter(log_filter)
+    if production:
+        # Per-card events are dropped by the level check before any record or argument is built.
+        step_logger.setLevel(logging.WARNING)
+    else:
+        step_logger.setLevel(logging.NOTSET)
+        if step_sample_rate < 1:
+            step_logger.addFilter(SamplingFilter(step_sample_rate))
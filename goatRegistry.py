@@ -0,0 +1,145 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger('goat.registry')
+
+
+class GoatRegistry:
+    FINISHED_SESSION_TTL = 15 * 60
+    ACTIVE_SESSION_TTL = 24 * 60 * 60
+    MAX_SESSIONS = 10000
+
+    def __init__(self, session_factory, finished_session_ttl: float = FINISHED_SESSION_TTL,
+                 active_session_ttl: float = ACTIVE_SESSION_TTL, clock=time.monotonic, on_evict=None,
+                 max_sessions: int = MAX_SESSIONS, on_unload=None):
+        logger.debug('GoatRegistry constructor called')
+        self._session_factory = session_factory
+        # called with each evicted session outside the registry lock, e.g. to drop its snapshot
+        self._on_evict = on_evict
+        # past max_sessions the least recently used sessions are unloaded: on_unload is called with each of them
+        # outside the lock, their seats are kept and session_factory brings them back with the next message
+        self._max_sessions = max_sessions
+        self._on_unload = on_unload
+        self._finished_session_ttl = finished_session_ttl
+        self._active_session_ttl = active_session_ttl
+        self._clock = clock
+        # chat_id -> [session, last_activity], least recently used first
+        self._sessions = OrderedDict()
+        # user_id -> chat_id of the started game the user is seated in, and chat_id -> its seated user ids
+        self._seats = {}
+        self._chat_seats = {}
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get(self, chat_id: int):
+        with self._lock:
+            entry = self._sessions.get(chat_id)
+            if entry is None:
+                return None
+            self._touch(chat_id, entry)
+            return entry[0]
+
+    def get_or_create(self, chat_id: int):
+        """Returns the session of chat_id; idle sessions are only evicted here, when a new one is created."""
+        with self._lock:
+            entry = self._sessions.get(chat_id)
+            if entry is not None:
+                self._touch(chat_id, entry)
+                return entry[0]
+            expired = self._take_idle()
+            unloaded = self._take_least_used()
+            logger.debug('GoatRegistry.get_or_create(%s) new session', chat_id)
+            session = self._session_factory(chat_id)
+            self._sessions[chat_id] = [session, self._clock()]
+        self._evicted(expired)
+        self._unloaded(unloaded)
+        return session
+
+    def find_by_player(self, user_id: int):
+        with self._lock:
+            chat_id = self._seats.get(user_id)
+            if chat_id is None:
+                return None
+            entry = self._sessions.get(chat_id)
+            if entry is not None:
+                self._touch(chat_id, entry)
+                return entry[0]
+        # the game was unloaded for room
+        return self.get_or_create(chat_id)
+
+    def get_seated_chat(self, user_id: int) -> int | None:
+        with self._lock:
+            return self._seats.get(user_id)
+
+    def set_seats(self, chat_id: int, user_ids):
+        """Replaces the players seated in the game of chat_id; sessions call it on start, join and stop."""
+        with self._lock:
+            self._drop_seats(chat_id)
+            user_ids = frozenset(user_ids)
+            if len(user_ids) == 0:
+                return
+            self._chat_seats[chat_id] = user_ids
+            for user_id in user_ids:
+                self._seats[user_id] = chat_id
+
+    def _drop_seats(self, chat_id: int):
+        for user_id in self._chat_seats.pop(chat_id, ()):
+            if self._seats.get(user_id) == chat_id:
+                del self._seats[user_id]
+
+    def remove(self, chat_id: int):
+        with self._lock:
+            entry = self._sessions.pop(chat_id, None)
+            self._drop_seats(chat_id)
+        return entry[0] if entry is not None else None
+
+    def evict_idle(self) -> int:
+        with self._lock:
+            expired = self._take_idle()
+        self._evicted(expired)
+        return len(expired)
+
+    def _take_idle(self) -> list:
+        now = self._clock()
+        expired = []
+        for chat_id, (session, last_activity) in self._sessions.items():
+            idle = now - last_activity
+            if idle < self._finished_session_ttl:
+                break
+            if session.is_started and idle < self._active_session_ttl:
+                continue
+            expired.append(chat_id)
+        for chat_id in expired:
+            self._drop_seats(chat_id)
+        return [self._sessions.pop(chat_id)[0] for chat_id in expired]
+
+    def _take_least_used(self) -> list:
+        unloaded = []
+        while len(self._sessions) >= self._max_sessions:
+            _, (session, _) = self._sessions.popitem(last=False)
+            unloaded.append(session)
+        return unloaded
+
+    def _unloaded(self, sessions: list):
+        if len(sessions) == 0:
+            return
+        logger.info('GoatRegistry unloaded %s sessions over %s', len(sessions), self._max_sessions)
+        if self._on_unload is not None:
+            for session in sessions:
+                self._on_unload(session)
+
+    def _evicted(self, sessions: list):
+        if len(sessions) == 0:
+            return
+        logger.debug('GoatRegistry evicted %s sessions', len(sessions))
+        if self._on_evict is not None:
+            for session in sessions:
+                self._on_evict(session)
+
+    def _touch(self, chat_id: int, entry: list):
+        entry[1] = self._clock()
+        self._sessions.move_to_end(chat_id)
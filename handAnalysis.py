@@ -0,0 +1,189 @@
+import argparse
+import logging
+import os
+import random
+import time
+from multiprocessing import Pool
+
+from deals import AllCardsDeal, Deal, DealTypes
+from models import Card, CardSuit, Deck, cards_from_mask
+from simulation import DEAL_KEYS, RandomPolicy, Simulation
+
+logger = logging.getLogger('goat.analysis')
+
+CHUNK_SIZE = 500
+
+
+class TrumpPolicy:
+    """Picks the given trump for the analysed hand and leaves every other decision to `policy`."""
+
+    def __init__(self, policy, trump: CardSuit):
+        self.policy = policy
+        self.trump = trump
+
+    def choose_trump(self, game, player_id: int) -> CardSuit:
+        return self.trump
+
+    def choose_card(self, game, player_id: int) -> Card:
+        return self.policy.choose_card(game, player_id)
+
+    def choose_pants(self, game, player_id: int) -> tuple:
+        return self.policy.choose_pants(game, player_id)
+
+
+class TrumpStats:
+    __slots__ = ('trump', 'deals', 'score', 'points', 'wins', 'jackpots')
+
+    def __init__(self, trump: CardSuit):
+        self.trump = trump
+        self.deals = 0
+        # card points taken by the owner's team
+        self.score = 0
+        # game points of the owner's team minus the opponents'
+        self.points = 0
+        self.wins = 0
+        self.jackpots = 0
+
+    def add(self, other):
+        self.deals += other.deals
+        self.score += other.score
+        self.points += other.points
+        self.wins += other.wins
+        self.jackpots += other.jackpots
+
+    def get_expected_score(self) -> float:
+        return self.score / self.deals
+
+    def get_expected_points(self) -> float:
+        return self.points / self.deals
+
+    def get_win_probability(self) -> float:
+        return self.wins / self.deals
+
+    def get_jackpot_probability(self) -> float:
+        return self.jackpots / self.deals
+
+
+def _no_op(*args):
+    pass
+
+
+def get_owner_deck_positions(deal_name: str) -> list[int]:
+    """Deck positions a deal of this type hands to its owner (player 0) before the trump is chosen."""
+    deal = DealTypes.get_deal(deal_name, 0)
+    deal.request_trump_handler = _no_op
+    deal.request_send_current_cards_to_pm_handler = _no_op
+    deal.deck.cards = Deck().cards
+    deal.process_deal()
+    return sorted(deal.deck.cards.index(card) for card in cards_from_mask(deal.get_player_hand(0)))
+
+
+def _stack_deck(deal: Deal, hand: list[Card], positions: list[int], rng: random.Random):
+    hand_bits = 0
+    for card in hand:
+        hand_bits |= card.bit
+    # a fresh deck, the one of the deal was shuffled with the module level generator
+    deck = Deck()
+    deck.shuffle(rng)
+    rest = [card for card in deck.cards if card.bit & hand_bits == 0]
+    rest.reverse()
+    cards = []
+    hand_cards = iter(hand)
+    for i in range(Deck.COUNT):
+        cards.append(next(hand_cards) if i in positions else rest.pop())
+    deal.deck.cards = cards
+
+
+def _chunk_seed(seed: int, trump: CardSuit, chunk: int) -> str:
+    # str seeds are hashed with sha512, so they give the same stream in every process
+    return f'{seed}:{int(trump)}:{chunk}'
+
+
+def simulate_chunk(deal_name: str, hand: list[Card], trump: CardSuit, deals: int, chunk_seed: str) -> TrumpStats:
+    rng = random.Random(chunk_seed)
+    positions = set(get_owner_deck_positions(deal_name))
+    simulation = Simulation(TrumpPolicy(RandomPolicy(rng.random()), trump))
+    stats = TrumpStats(trump)
+    for _ in range(deals):
+        deal = DealTypes.get_deal(deal_name, 0)
+        _stack_deck(deal, hand, positions, rng)
+        first_before, second_before = simulation.game.get_score() if simulation.game is not None else (0, 0)
+        simulation.play_deal(deal)
+        first, second = simulation.game.get_score()
+        stats.deals += 1
+        stats.score += deal.get_team_score(0)
+        stats.points += (first - first_before) - (second - second_before)
+        stats.wins += 1 if first > first_before else 0
+        stats.jackpots += 1 if deal.is_jackpot else 0
+    return stats
+
+
+def _simulate_chunk(args: tuple) -> TrumpStats:
+    return simulate_chunk(*args)
+
+
+def analyze_hand(deal_name: str, hand: list[Card], deals: int = 20000, trumps: list[CardSuit] | None = None,
+                 seed: int = 0, workers: int | None = None, chunk_size: int = CHUNK_SIZE) -> dict:
+    """Monte Carlo estimate of how the owner's team does with `hand` for every trump, as {trump: TrumpStats}.
+
+    The result depends on `seed` and `chunk_size` only, not on the number of workers."""
+    positions = get_owner_deck_positions(deal_name)
+    if len(hand) != len(positions) or len(set(hand)) != len(hand):
+        raise ValueError(f'{deal_name} needs {len(positions)} different cards, got {len(hand)}')
+    if deal_name == DealTypes.names[0] and not any(card.equals(AllCardsDeal.DEFAULT_TRUMP_CARD) for card in hand):
+        raise ValueError(f'{deal_name} is started by the holder of {AllCardsDeal.DEFAULT_TRUMP_CARD}')
+    trumps = trumps or list(CardSuit)
+    tasks = []
+    for trump in trumps:
+        for chunk, start in enumerate(range(0, deals, chunk_size)):
+            tasks.append((deal_name, hand, trump, min(chunk_size, deals - start), _chunk_seed(seed, trump, chunk)))
+    result = {trump: TrumpStats(trump) for trump in trumps}
+    logger.info('analyze_hand(%s) %s chunks on %s workers', deal_name, len(tasks), workers or os.cpu_count())
+    if workers == 1:
+        for stats in map(_simulate_chunk, tasks):
+            result[stats.trump].add(stats)
+        return result
+    with Pool(workers) as pool:
+        for stats in pool.imap_unordered(_simulate_chunk, tasks):
+            result[stats.trump].add(stats)
+    return result
+
+
+def _parse_hand(texts: list[str]) -> list[Card]:
+    hand = []
+    for text in texts:
+        result, card = Card.try_parse(text)
+        if not result:
+            raise argparse.ArgumentTypeError(f'not a card: {text}')
+        hand.append(card)
+    return hand
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Expected result of a hand for every trump choice')
+    parser.add_argument('deal_type', choices=DEAL_KEYS.keys())
+    parser.add_argument('cards', nargs='+', help='owner cards before the trump is chosen, e.g. Т♦ 10♦')
+    parser.add_argument('-n', '--deals', type=int, default=20000, help='simulated deals per trump')
+    parser.add_argument('--workers', type=int, help='processes, all cores by default')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    try:
+        hand = _parse_hand(args.cards)
+    except argparse.ArgumentTypeError as e:
+        parser.error(str(e))
+    start = time.perf_counter()
+    try:
+        result = analyze_hand(DEAL_KEYS[args.deal_type], hand, args.deals, seed=args.seed, workers=args.workers)
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - start
+    print(f'{"trump":<10} {"score":>8} {"points":>8} {"win":>8} {"jackpot":>8}')
+    for trump, stats in sorted(result.items(), key=lambda x: -x[1].get_expected_points()):
+        print(f'{trump.name:<10} {stats.get_expected_score():>8.2f} {stats.get_expected_points():>8.3f} '
+              f'{stats.get_win_probability():>8.3f} {stats.get_jackpot_probability():>8.4f}')
+    total = sum(stats.deals for stats in result.values())
+    print(f'{total} deals in {elapsed:.2f}s, {total / elapsed:.0f} deals/s')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+import functools
+import json
+
+from telebot import types
+
+from deals import DealTypes, PantsDeal
+from models import Card, CardSuitString, START_GAME_MESSAGES, cards_from_mask
+
+PANTS_KEYBOARD_CACHE_SIZE = 4096
+HAND_ROW_WIDTH = 4
+
+# Keyboards are sent already serialized: telebot passes a str reply_markup through as it is
+
+
+def _build_trump_keyboard() -> str:
+    # one answer per prompt: hidden once pressed, nothing else removes it in live table mode
+    markup = types.ReplyKeyboardMarkup(one_time_keyboard=True)
+    markup.selective = True
+    markup.row(types.KeyboardButton(CardSuitString.DIAMONDS.value), types.KeyboardButton(CardSuitString.HEARTS.value))
+    markup.row(types.KeyboardButton(CardSuitString.SPADES.value), types.KeyboardButton(CardSuitString.CLUBS.value))
+    markup.row("Без козыря")
+    return markup.to_json()
+
+
+def _build_deal_keyboard() -> str:
+    markup = types.ReplyKeyboardMarkup(one_time_keyboard=True)
+    markup.selective = True
+    for deal_name in DealTypes.names:
+        markup.row(deal_name)
+    return markup.to_json()
+
+
+def _build_start_game_keyboard() -> str:
+    markup = types.ReplyKeyboardMarkup()
+    for message in START_GAME_MESSAGES.keys():
+        markup.row(message)
+    return markup.to_json()
+
+
+TRUMP_KEYBOARD = _build_trump_keyboard()
+DEAL_KEYBOARD = _build_deal_keyboard()
+START_GAME_KEYBOARD = _build_start_game_keyboard()
+REMOVE_KEYBOARD = types.ReplyKeyboardRemove().to_json()
+SELECTIVE_REMOVE_KEYBOARD = types.ReplyKeyboardRemove(selective=True).to_json()
+
+# card -> its button as ReplyKeyboardMarkup.to_json writes it
+_CARD_BUTTONS = {card: json.dumps({'text': card.text}) for card in Card.get_all()}
+
+
+def _serialize_buttons(buttons: list[str], row_width: int) -> str:
+    rows = ', '.join(f'[{", ".join(buttons[i:i + row_width])}]' for i in range(0, len(buttons), row_width))
+    return f'{{"keyboard": [{rows}], "selective": true}}'
+
+
+def _get_move_text(cards: tuple) -> str:
+    return cards[0].text if len(cards) == 1 else f'{cards[0].text} {cards[1].text}'
+
+
+@functools.lru_cache(maxsize=PANTS_KEYBOARD_CACHE_SIZE)
+def get_pants_keyboard(moves_key: tuple) -> str:
+    """The pants prompt for a deal's moves key, built once per hand."""
+    buttons = [{'text': _get_move_text(cards)} for cards in PantsDeal.iter_pants_moves(moves_key)]
+    rows = [buttons[i:i + HAND_ROW_WIDTH] for i in range(0, len(buttons), HAND_ROW_WIDTH)]
+    return json.dumps({'keyboard': rows, 'selective': True})
+
+
+class HandKeyboards:
+    """Hand keyboards of one game's players. A hand that only lost cards since the last one keeps its buttons."""
+
+    def __init__(self):
+        # player_id -> (hand mask, [(card bit, button)], keyboard)
+        self._hands = {}
+
+    def get(self, player_id: int, hand: int) -> str:
+        previous = self._hands.get(player_id)
+        if previous is not None and previous[0] == hand:
+            return previous[2]
+        if previous is not None and hand & ~previous[0] == 0:
+            buttons = [x for x in previous[1] if x[0] & hand != 0]
+        else:
+            buttons = [(card.bit, _CARD_BUTTONS[card]) for card in cards_from_mask(hand)]
+        keyboard = _serialize_buttons([x[1] for x in buttons], HAND_ROW_WIDTH)
+        self._hands[player_id] = (hand, buttons, keyboard)
+        return keyboard
+
+    def get_hand(self, player_id: int) -> int | None:
+        """The hand mask of the last keyboard built for the player."""
+        previous = self._hands.get(player_id)
+        return previous[0] if previous is not None else None
+
+    def discard(self, player_id: int):
+        self._hands.pop(player_id, None)
+
+    def clear(self):
+        self._hands.clear()
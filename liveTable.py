@@ -0,0 +1,92 @@
+import logging
+import threading
+import time
+
+logger = logging.getLogger('goat.table')
+
+
+class LiveTable:
+    """One message per game showing the score, the pants, the last trick and whose turn it is.
+
+    It is sent once and then edited in place through the outbox. Changes that come within DEBOUNCE seconds
+    of each other go out as a single edit; lines changed with set() only ride along with other changes."""
+    DEBOUNCE = 1.0
+    LINES = ('score', 'pants', 'trick', 'turn')
+
+    def __init__(self, outbox, chat_id: int, debounce: float = DEBOUNCE, clock=time.monotonic):
+        self.outbox = outbox
+        self.chat_id = chat_id
+        self.debounce = debounce
+        self._clock = clock
+        self._flushed_at = float('-inf')
+        self.message_id = None
+        self._lines = dict.fromkeys(self.LINES, '')
+        # text of the last send or edit, there is nothing to edit while the table shows it
+        self._shown = None
+        self._sending = False
+        # bumped by reset, callbacks of an older table message are ignored
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def reset(self):
+        """Starts a new table message with the next update."""
+        with self._lock:
+            self.message_id = None
+            self._lines = dict.fromkeys(self.LINES, '')
+            self._shown = None
+            self._sending = False
+            self._generation += 1
+
+    def update(self, **lines):
+        with self._lock:
+            self._lines.update(lines)
+            self._flush()
+
+    def set(self, **lines):
+        """Changes lines without an edit of their own: they join an edit still waiting out its debounce, or the
+        next update."""
+        with self._lock:
+            self._lines.update(lines)
+            if self._clock() - self._flushed_at < self.debounce:
+                self._flush()
+
+    def render(self) -> str:
+        return '\r\n\r\n'.join(self._lines[x] for x in self.LINES if self._lines[x])
+
+    def _flush(self):
+        text = self.render()
+        if text == self._shown or len(text) == 0:
+            return
+        self._flushed_at = self._clock()
+        generation = self._generation
+        on_error = lambda error: self._on_error(error, generation)
+        if self.message_id is None:
+            # the edits wait for the message id, _on_sent flushes what changed meanwhile
+            if not self._sending:
+                self._sending = True
+                self._shown = text
+                self.outbox.send_message(self.chat_id, text, parse_mode='MarkdownV2', mergeable=False,
+                                         on_sent=lambda message: self._on_sent(message, generation),
+                                         on_error=on_error)
+            return
+        self._shown = text
+        self.outbox.edit_message_text(self.chat_id, self.message_id, text, parse_mode='MarkdownV2',
+                                      delay=self.debounce, on_error=on_error)
+
+    def _on_sent(self, message, generation: int):
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._sending = False
+            self.message_id = message.message_id
+            self._flush()
+
+    def _on_error(self, error: Exception, generation: int):
+        # e.g. the message was deleted: the next update sends a new one
+        logger.warning('LiveTable(%s) update failed: %s', self.chat_id, error)
+        with self._lock:
+            if generation != self._generation:
+                return
+            self._sending = False
+            self.message_id = None
+            self._shown = None
@@ -0,0 +1,104 @@
+from enum import Enum
+
+import telebot
+
+from deals import DealTypes
+from models import Card, CardSuit, SUIT_STRING_TO_SUIT, START_GAME_MESSAGES
+
+BOT_USERNAME = 'goatgroupbot'
+
+
+class CommandType(Enum):
+    JOIN = 1
+    TRUMP = 2
+    CARD = 3
+    PRIVATE_CARD = 4
+    CARD_PAIR = 5
+    DEAL = 6
+
+
+class Command:
+    """A message parsed into what the player asked for; only the field of its type is set."""
+    __slots__ = ('type', 'card', 'cards', 'trump', 'deal_name')
+
+    def __init__(self, command_type: CommandType, card: Card | None = None, cards: tuple | None = None,
+                 trump: CardSuit | None = None, deal_name: str | None = None):
+        self.type = command_type
+        self.card = card
+        self.cards = cards
+        self.trump = trump
+        self.deal_name = deal_name
+
+    def __repr__(self):
+        values = [x for x in (self.card, self.cards, self.trump, self.deal_name) if x is not None]
+        return f'Command({self.type.name}{"".join(f", {x}" for x in values)})'
+
+
+# Texts that only count as answers to the bot: lower case text -> command. They never overlap with card texts.
+_REPLY_COMMANDS = {}
+for _text in START_GAME_MESSAGES.keys():
+    _REPLY_COMMANDS[_text.lower()] = Command(CommandType.JOIN)
+for _text, _suit in SUIT_STRING_TO_SUIT.items():
+    _REPLY_COMMANDS[_text.lower()] = Command(CommandType.TRUMP, trump=_suit)
+for _name in DealTypes.names:
+    _REPLY_COMMANDS[_name.lower()] = Command(CommandType.DEAL, deal_name=_name)
+
+# card text -> command, the cards are interned so every text gets one shared instance
+_CARD_COMMANDS = {text: Command(CommandType.CARD, card=card) for text, card in Card._by_text.items()}
+_PRIVATE_CARD_COMMANDS = {text: Command(CommandType.PRIVATE_CARD, card=card) for text, card in Card._by_text.items()}
+
+# longest card pair text, "10♦ 10♥"
+_MAX_PAIR_LENGTH = 7
+
+_UNSET = object()
+
+
+def _is_reply_to_bot(message: telebot.types.Message) -> bool:
+    reply_message = message.reply_to_message
+    if reply_message is None or not reply_message.from_user.is_bot:
+        return False
+    username = reply_message.from_user.username
+    return username is not None and username.lower() == BOT_USERNAME
+
+
+def _parse(message: telebot.types.Message) -> Command | None:
+    text = message.text
+    if not text:
+        return None
+    if message.chat.id == message.from_user.id:
+        command = _PRIVATE_CARD_COMMANDS.get(text.strip())
+        if command is not None:
+            return command
+    elif _is_reply_to_bot(message):
+        command = _REPLY_COMMANDS.get(text.lower())
+        if command is None:
+            command = _CARD_COMMANDS.get(text.strip())
+        if command is not None:
+            return command
+    if len(text) <= _MAX_PAIR_LENGTH:
+        pair = text.split(' ')
+        if len(pair) == 2:
+            left_card = Card._by_text.get(pair[0])
+            right_card = Card._by_text.get(pair[1])
+            if left_card is not None and right_card is not None:
+                return Command(CommandType.CARD_PAIR, cards=(left_card, right_card))
+    return None
+
+
+def classify(message: telebot.types.Message) -> Command | None:
+    """Parses a text message once; the result is kept on the message for every later filter and handler."""
+    command = getattr(message, 'goat_command', _UNSET)
+    if command is _UNSET:
+        command = _parse(message)
+        message.goat_command = command
+    return command
+
+
+class CommandFilter(telebot.custom_filters.AdvancedCustomFilter):
+    """message_handler(command=CommandType.CARD) matches messages classified as that command."""
+    key = 'command'
+
+    @staticmethod
+    def check(message: telebot.types.Message, command_type: CommandType):
+        command = classify(message)
+        return command is not None and command.type is command_type
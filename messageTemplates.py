@@ -0,0 +1,11 @@
+# characters MarkdownV2 reserves outside of entities, the backslash first
+_MARKDOWN_ESCAPES = str.maketrans({x: f'\\{x}' for x in '\\_*[]()~`>#+-=|{}.!'})
+
+
+def escape_markdown(text: str) -> str:
+    """Makes arbitrary text, such as a user name, literal in a MarkdownV2 message."""
+    return text.translate(_MARKDOWN_ESCAPES)
+
+
+def get_mention(user_id: int, markdown_name: str) -> str:
+    return f'[{markdown_name}](tg://user?id={user_id})'
@@ -0,0 +1,231 @@
+import bisect
+import functools
+import logging
+import signal
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+logger = logging.getLogger('goat.metrics')
+
+# upper bounds in seconds, the last bucket is +Inf
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# TeleBot methods that call the Telegram API; everything else on the bot is passed through untimed
+TELEGRAM_API_METHODS = frozenset([
+    'send_message', 'reply_to', 'edit_message_text', 'edit_message_reply_markup', 'delete_message',
+    'get_chat_member', 'get_chat_member_count', 'get_chat', 'get_me', 'get_updates', 'set_webhook',
+    'delete_webhook', 'answer_callback_query'])
+
+DB_METHODS = ('get_users', 'count_users', 'add_user', 'save_snapshot', 'load_snapshot', 'load_events',
+              'get_snapshot_chat_ids', 'delete_snapshot', 'get_private_chat', 'set_private_chat')
+
+ENGINE_METHODS = ('do_player_step', 'do_player_pants_step', 'select_trump', 'start_next_deal')
+
+
+class Histogram:
+    __slots__ = ('bounds', 'counts', 'total', 'count', '_lock')
+
+    def __init__(self, bounds: tuple = LATENCY_BUCKETS):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)
+        self.total = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[index] += 1
+            self.total += value
+            self.count += 1
+
+    def get_quantile(self, quantile: float) -> float:
+        """Interpolated within the bucket holding the quantile; the largest bound for the +Inf bucket."""
+        with self._lock:
+            counts = self.counts[:]
+            count = self.count
+        if count == 0:
+            return 0.0
+        rank = quantile * count
+        seen = 0
+        lower = 0.0
+        for bound, bucket_count in zip(self.bounds, counts):
+            if seen + bucket_count >= rank:
+                return lower + (bound - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+            lower = bound
+        return self.bounds[-1]
+
+    def get_mean(self) -> float:
+        return self.total / self.count if self.count > 0 else 0.0
+
+
+class MetricsRegistry:
+    """Latency histograms and error counters by metric name and one label value."""
+
+    def __init__(self):
+        # name -> (label name, help, {label value: Histogram})
+        self._histograms = {}
+        # name -> (label name, help, {label value: count})
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def get_histogram(self, name: str, label: str, value: str, text: str = '') -> Histogram:
+        family = self._histograms.get(name)
+        histogram = family[2].get(value) if family is not None else None
+        if histogram is not None:
+            return histogram
+        with self._lock:
+            family = self._histograms.setdefault(name, (label, text, {}))
+            return family[2].setdefault(value, Histogram())
+
+    def increment(self, name: str, label: str, value: str, text: str = ''):
+        with self._lock:
+            counters = self._counters.setdefault(name, (label, text, {}))[2]
+            counters[value] = counters.get(value, 0) + 1
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            histograms = [(name, label, text, list(values.items()))
+                          for name, (label, text, values) in sorted(self._histograms.items())]
+            counters = [(name, label, text, list(values.items()))
+                        for name, (label, text, values) in sorted(self._counters.items())]
+        for name, label, text, values in histograms:
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} histogram')
+            for value, histogram in sorted(values):
+                with histogram._lock:
+                    counts = histogram.counts[:]
+                    total, count = histogram.total, histogram.count
+                cumulative = 0
+                for bound, bucket_count in zip(histogram.bounds + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append(f'{name}_bucket{{{label}="{value}",le="{le}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{label}="{value}"}} {total}')
+                lines.append(f'{name}_count{{{label}="{value}"}} {count}')
+        for name, label, text, values in counters:
+            lines.append(f'# HELP {name} {text}')
+            lines.append(f'# TYPE {name} counter')
+            for value, count in sorted(values):
+                lines.append(f'{name}{{{label}="{value}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> str:
+        """One line per histogram: calls, mean, p50 and p99 in milliseconds."""
+        lines = [f'{"metric":<48} {"calls":>8} {"mean":>9} {"p50":>9} {"p99":>9}']
+        with self._lock:
+            rows = [(f'{name}{{{value}}}', histogram) for name, (_, _, values) in sorted(self._histograms.items())
+                    for value, histogram in sorted(values.items())]
+            counters = [(f'{name}{{{value}}}', count) for name, (_, _, values) in sorted(self._counters.items())
+                        for value, count in sorted(values.items())]
+        for key, histogram in rows:
+            if histogram.count == 0:
+                continue
+            lines.append(f'{key:<48} {histogram.count:>8} {histogram.get_mean() * 1000:>8.2f}ms '
+                         f'{histogram.get_quantile(0.5) * 1000:>7.1f}ms {histogram.get_quantile(0.99) * 1000:>7.1f}ms')
+        for key, count in counters:
+            lines.append(f'{key:<48} {count:>8}')
+        return '\n'.join(lines)
+
+
+registry = MetricsRegistry()
+# set by enable(); nothing is wrapped or timed before that
+enabled = False
+
+
+def timed(function, name: str, label: str, value: str, text: str = '', errors: str | None = None):
+    """Wraps function to observe its duration, and count its exceptions in `errors` if given."""
+    histogram = registry.get_histogram(name, label, value, text)
+
+    @functools.wraps(function)
+    def call(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        except Exception:
+            if errors is not None:
+                registry.increment(errors, label, value, 'Exceptions raised')
+            raise
+        finally:
+            histogram.observe(time.perf_counter() - start)
+
+    return call
+
+
+def instrument_methods(target, names, name: str, text: str = ''):
+    """Replaces the methods of a class or an instance with timed ones, labelled by method name."""
+    for method_name in names:
+        setattr(target, method_name, timed(getattr(target, method_name), name, 'method', method_name, text))
+
+
+def instrument_handlers(message_handlers: list[dict]):
+    for handler in message_handlers:
+        function = handler['function']
+        handler['function'] = timed(function, 'goat_handler_seconds', 'handler', function.__name__,
+                                    'Message handler latency', 'goat_handler_errors_total')
+
+
+class InstrumentedBot:
+    """TeleBot facade timing the Telegram API calls by method name."""
+
+    def __init__(self, tele_bot):
+        self._bot = tele_bot
+        self._methods = {}
+
+    def __getattr__(self, name):
+        attribute = getattr(self._bot, name)
+        if name not in TELEGRAM_API_METHODS:
+            return attribute
+        method = self._methods.get(name)
+        if method is None:
+            method = self._methods[name] = timed(attribute, 'goat_telegram_api_seconds', 'method', name,
+                                                 'Telegram API call latency', 'goat_telegram_api_errors_total')
+        return method
+
+
+class _MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == '/metrics':
+            body = registry.render().encode()
+            content_type = 'text/plain; version=0.0.4'
+        elif self.path == '/summary':
+            body = (registry.summary() + '\n').encode()
+            content_type = 'text/plain'
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug('metrics %s', format % args)
+
+
+def start_server(port: int, host: str = '127.0.0.1') -> ThreadingHTTPServer:
+    server = ThreadingHTTPServer((host, port), _MetricsRequestHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='goat-metrics', daemon=True).start()
+    logger.info('Metrics on http://%s:%s/metrics', host, server.server_address[1])
+    return server
+
+
+def dump():
+    logger.warning('Metrics:\n%s', registry.summary())
+
+
+def enable(port: int | None = None):
+    """Turns timing on; SIGUSR1 dumps a summary to the log, `port` also serves /metrics and /summary."""
+    global enabled
+    enabled = True
+    if hasattr(signal, 'SIGUSR1') and threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGUSR1, lambda signum, frame: dump())
+    if port is not None:
+        return start_server(port)
+    return None
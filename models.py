@@ -23,14 +23,15 @@ class CardSuit(IntEnum):
 
 
 class CardSuitString(Enum):
-    DIAMONDS = '\U00002666',
-    HEARTS = '\U00002665',
-    SPADES = '\U00002660',
+    DIAMONDS = '\U00002666'
+    HEARTS = '\U00002665'
+    SPADES = '\U00002660'
     CLUBS = '\U00002663'
 
 
-SUIT_STRING_TO_SUIT = {str(CardSuitString.DIAMONDS): CardSuit.DIAMONDS, str(CardSuitString.HEARTS): CardSuit.HEARTS,
-                       str(CardSuitString.SPADES): CardSuit.SPADES, str(CardSuitString.CLUBS): CardSuit.SPADES,
+# lower case trump button text -> suit
+SUIT_STRING_TO_SUIT = {CardSuitString.DIAMONDS.value: CardSuit.DIAMONDS, CardSuitString.HEARTS.value: CardSuit.HEARTS,
+                       CardSuitString.SPADES.value: CardSuit.SPADES, CardSuitString.CLUBS.value: CardSuit.CLUBS,
                        'без козыря': CardSuit.NONE, 'бескозырка': CardSuit.NONE}
 
 START_GAME_MESSAGES = {'Погнали': True, 'Пас': False}
@@ -45,6 +46,11 @@ class StepResult(Enum):
 
 
 class Card:
+    """One of the 36 interned cards: Card(kind, suit) always returns the same instance."""
+    __slots__ = ('kind', 'suit', 'index', 'bit', 'value', 'text', 'default_trump', '_trump_by_suit')
+
+    COUNT = 36
+
     _cardValues = {CardKind.ACE: 11, CardKind.KING: 4, CardKind.QUEEN: 3, CardKind.JACK: 2, CardKind.TEN: 10,
                    CardKind.NINE: 0, CardKind.EIGHT: 0, CardKind.SEVEN: 0, CardKind.SIX: 0}
 
@@ -59,103 +65,181 @@ class Card:
     _cardStrSuit = {"\U00002666": CardSuit.DIAMONDS, "\U00002663": CardSuit.CLUBS,
                     "\U00002660": CardSuit.SPADES, "\U00002665": CardSuit.HEARTS}
 
-    def __init__(self, kind: CardKind, suit: CardSuit):
-        self.kind = kind
-        self.suit = suit
+    # (kind, suit) -> Card, card index -> Card, card text -> Card
+    _interned = {}
+    _by_index = []
+    _by_text = {}
+
+    def __new__(cls, kind: CardKind, suit: CardSuit):
+        return cls._interned[(kind, suit)]
+
+    @classmethod
+    def _intern(cls, kind: CardKind, suit: CardSuit):
+        card = object.__new__(cls)
+        card.kind = kind
+        card.suit = suit
+        card.index = (suit - 1) * len(CardKind) + kind - 1
+        card.bit = 1 << card.index
+        card.value = cls._cardValues.get(kind)
+        card.text = f"{cls._cardKindStr.get(kind)}{cls._cardSuitStr.get(suit)}"
+        card.default_trump = (kind == CardKind.SIX and suit == CardSuit.CLUBS) or \
+            kind == CardKind.QUEEN or kind == CardKind.JACK
+        card._trump_by_suit = tuple(card.default_trump or suit == trump for trump in CardSuit)
+        cls._interned[(kind, suit)] = card
+        cls._by_index.append(card)
+        kind_str = cls._cardKindStr.get(kind)
+        cls._by_text[card.text] = card
+        cls._by_text[kind_str.lower() + cls._cardSuitStr.get(suit)] = card
+
+    @staticmethod
+    def from_index(index: int):
+        return Card._by_index[index]
+
+    @staticmethod
+    def get_all() -> list:
+        return Card._by_index
+
+    def __reduce__(self):
+        return Card, (self.kind, self.suit)
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     def is_trump(self, trump_suit: CardSuit):
-        if trump_suit is CardSuit.NONE:
-            return self.is_default_trump()
-        return self.suit == trump_suit or self.is_default_trump()
+        # CardSuit.NONE (and a trump that is not chosen yet) leaves only the default trumps
+        return self._trump_by_suit[trump_suit or 0]
 
     def get_value(self):
-        return self._cardValues.get(self.kind)
+        return self.value
 
     def equals(self, card) -> bool:
-        if card.suit == self.suit and card.kind == self.kind:
-            return True
-        return False
+        return self is card
 
     def is_default_trump(self) -> bool:
-        if self.kind == CardKind.SIX and self.suit == CardSuit.CLUBS:
-            return True
-        return self.kind == CardKind.QUEEN or self.kind == CardKind.JACK
+        return self.default_trump
 
     def is_greater_by_kind(self, card):
         if self.kind == CardKind.SIX and self.suit == CardSuit.CLUBS:
             return True
         if card.kind == CardKind.SIX and card.suit == CardSuit.CLUBS:
             return False
-        return self.get_value() > card.get_value()
+        return self.value > card.value
 
     def greater_than(self, card, trump_suit: CardSuit) -> bool:
-        if self.equals(card):
+        return _GREATER_TABLE[trump_suit or 0][self.index * Card.COUNT + card.index] == 1
+
+    def less_than(self, card, trump_suit: CardSuit) -> bool:
+        if self is card:
+            return False
+        return _GREATER_TABLE[trump_suit or 0][self.index * Card.COUNT + card.index] == 0
+
+    def _greater_than_rules(self, card, trump_suit: CardSuit) -> bool:
+        if self is card:
             return False
         if trump_suit is CardSuit.NONE:
             return self._greater_than_no_trump(card)
-        if (self.is_default_trump() or self.suit == trump_suit) and \
-                (card.is_default_trump() or card.suit == trump_suit):
+        if (self.default_trump or self.suit == trump_suit) and \
+                (card.default_trump or card.suit == trump_suit):
             return self.is_greater_by_kind(card)
-        if not self.is_default_trump() and self.suit != trump_suit and \
-                not card.is_default_trump() and card.suit != trump_suit:
+        if not self.default_trump and self.suit != trump_suit and \
+                not card.default_trump and card.suit != trump_suit:
             return self.is_greater_by_kind(card)
-        if (self.is_default_trump() or self.suit == trump_suit) and \
-                not card.is_default_trump() and card.suit != trump_suit:
+        if (self.default_trump or self.suit == trump_suit) and \
+                not card.default_trump and card.suit != trump_suit:
             return True
-        if not self.is_default_trump() and self.suit != trump_suit and \
-                (card.is_default_trump() or card.suit == trump_suit):
+        if not self.default_trump and self.suit != trump_suit and \
+                (card.default_trump or card.suit == trump_suit):
             return False
         return True
 
     def _greater_than_no_trump(self, card):
-        if (self.is_default_trump() and card.is_default_trump()) or (
-                not self.is_default_trump() and not card.is_default_trump()):
+        if self.default_trump == card.default_trump:
             return self.is_greater_by_kind(card)
-        return self.is_default_trump() and not card.is_default_trump()
-
-    def less_than(self, card, trump_suit: CardSuit) -> bool:
-        if self.equals(card):
-            return False
-        return not self.greater_than(card, trump_suit)
+        return self.default_trump
 
     def to_string(self):
-        return f"{self._cardKindStr.get(self.kind)}{self._cardSuitStr.get(self.suit)}"
+        return self.text
+
+    def __str__(self):
+        return self.text
+
+    def __repr__(self):
+        return f'Card({self.text})'
 
     @staticmethod
     def try_parse(text: str) -> (bool, object):
-        if len(text) > 3 or len(text) < 2:
+        card = Card._by_text.get(text)
+        if card is None:
             return False, None
-        try:
-            suit = Card._cardStrSuit.get(text[-1])
-        finally:
-            pass
-        try:
-            kind = Card._cardStrKind.get(text[0:-1].upper())
-        finally:
-            pass
-        if kind is not None and suit is not None:
-            return True, Card(kind, suit)
-        return False, None
+        return True, card
+
+
+for _suit in CardSuit:
+    if _suit is not CardSuit.NONE:
+        for _kind in sorted(CardKind):
+            Card._intern(_kind, _suit)
+
+# trump suit -> 36x36 row-major table of Card._greater_than_rules(a, b) for every pair of cards
+_GREATER_TABLE = tuple(bytes(a._greater_than_rules(b, _trump) for a in Card.get_all() for b in Card.get_all())
+                       for _trump in CardSuit)
+
+
+# Hands are bitsets over Card.index: bit i is set when the hand holds Card.from_index(i)
+SUIT_MASKS = tuple(sum(card.bit for card in Card.get_all() if card.suit == _suit) for _suit in CardSuit)
+DEFAULT_TRUMP_MASK = sum(card.bit for card in Card.get_all() if card.default_trump)
+TRUMP_MASKS = tuple(DEFAULT_TRUMP_MASK | SUIT_MASKS[_suit] for _suit in CardSuit)
+KIND_MASKS = {_kind: sum(card.bit for card in Card.get_all() if card.kind == _kind) for _kind in CardKind}
+
+
+def cards_from_mask(mask: int) -> list[Card]:
+    result = []
+    while mask:
+        low_bit = mask & -mask
+        result.append(Card._by_index[low_bit.bit_length() - 1])
+        mask ^= low_bit
+    return result
+
+
+def mask_from_cards(cards) -> int:
+    mask = 0
+    for card in cards:
+        mask |= card.bit
+    return mask
+
+
+def get_trump_mask(trump_suit: CardSuit | None) -> int:
+    return TRUMP_MASKS[trump_suit or 0]
+
+
+def get_trick_winner(cards: list[Card], trump_suit: CardSuit) -> int:
+    """Index in `cards` of the card taking the trick; the first card wins unless another beats it."""
+    table = _GREATER_TABLE[trump_suit or 0]
+    top_index = 0
+    top_offset = cards[0].index * Card.COUNT
+    for i in range(1, len(cards)):
+        card = cards[i]
+        if card is not cards[top_index] and table[top_offset + card.index] == 0:
+            top_index = i
+            top_offset = card.index * Card.COUNT
+    return top_index
 
 
 class Deck:
     COUNT = 32
 
     def __init__(self):
-        self.cards = []
         self.currentIndex = 0
         self.lastIndex = self.COUNT - 1
-        for i in range(1, 5):
-            for j in range(1, 10):
-                if j == 2:
-                    continue
-                self.cards.append(Card(CardKind(j), CardSuit(i)))
+        self.cards = [card for card in Card.get_all() if card.kind != CardKind.SEVEN]
 
     def reset(self):
         self.currentIndex = 0
 
-    def shuffle(self):
-        random.shuffle(self.cards)
+    def shuffle(self, rng: random.Random | None = None):
+        (rng or random).shuffle(self.cards)
 
     def get_next(self, skip: bool = True):
         if self.currentIndex == self.COUNT:
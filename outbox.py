@@ -0,0 +1,296 @@
+import heapq
+import itertools
+import logging
+import threading
+import time
+from collections import deque
+
+import requests
+from telebot.apihelper import ApiTelegramException
+
+logger = logging.getLogger('goat.outbox')
+
+MAX_MESSAGE_LENGTH = 4096
+
+
+class _TokenBucket:
+    __slots__ = ('rate', 'capacity', 'tokens', 'updated_at')
+
+    def __init__(self, rate: float, capacity: float, now: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = now
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def delay(self, now: float) -> float:
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self, now: float):
+        self._refill(now)
+        self.tokens -= 1
+
+    def pause(self, until: float):
+        """No tokens before `until`, e.g. the retry_after of a 429."""
+        self.tokens = min(self.tokens, 0.0)
+        self.updated_at = max(self.updated_at, until)
+
+
+class OutboundMessage:
+    __slots__ = ('chat_id', 'text', 'parse_mode', 'reply_markup', 'reply_to_message_id', 'callbacks',
+                 'error_callbacks', 'attempts', 'edit_message_id', 'mergeable')
+
+    def __init__(self, chat_id: int, text: str, parse_mode: str | None = None, reply_markup=None,
+                 reply_to_message_id: int | None = None, on_sent=None, on_error=None,
+                 edit_message_id: int | None = None, mergeable: bool = True):
+        self.chat_id = chat_id
+        self.text = text
+        self.parse_mode = parse_mode
+        self.reply_markup = reply_markup
+        self.reply_to_message_id = reply_to_message_id
+        self.callbacks = [on_sent] if on_sent is not None else []
+        self.error_callbacks = [on_error] if on_error is not None else []
+        self.attempts = 0
+        # set for an edit of a message sent before
+        self.edit_message_id = edit_message_id
+        self.mergeable = mergeable and edit_message_id is None
+
+    def can_merge(self, message) -> bool:
+        return self.mergeable and message.mergeable and self.reply_markup is None \
+            and self.reply_to_message_id is None and message.reply_to_message_id is None \
+            and self.parse_mode == message.parse_mode and len(self.text) + len(message.text) + 4 <= MAX_MESSAGE_LENGTH
+
+    def merge(self, message):
+        self.text = f'{self.text}\r\n\r\n{message.text}'
+        self.reply_markup = message.reply_markup
+        self.callbacks.extend(message.callbacks)
+        self.error_callbacks.extend(message.error_callbacks)
+
+
+class Outbox:
+    """Queues outgoing messages, merging consecutive ones per chat and keeping to Telegram rate limits.
+
+    `workers` threads send to different chats at once, e.g. the hands of a new deal; a chat's messages are still
+    sent one at a time in order. `private_chats`, a playerCache.PrivateChatCache, learns from every private send
+    whether the user can be messaged."""
+
+    GLOBAL_RATE = 30
+    PRIVATE_CHAT_RATE = 1
+    PRIVATE_CHAT_BURST = 3
+    GROUP_CHAT_RATE = 20 / 60
+    GROUP_CHAT_BURST = 20
+    MAX_ATTEMPTS = 5
+    BACKOFF = 0.5
+    MAX_BACKOFF = 30
+    MAX_IDLE_BUCKETS = 10000
+    WORKERS = 4
+
+    def __init__(self, tele_bot, clock=time.monotonic, workers: int = WORKERS, private_chats=None):
+        logger.debug('Outbox constructor called')
+        self.bot = tele_bot
+        self.private_chats = private_chats
+        self._clock = clock
+        self._condition = threading.Condition()
+        self._global_bucket = _TokenBucket(self.GLOBAL_RATE, self.GLOBAL_RATE, clock())
+        self._chat_buckets = {}
+        # chat_id -> deque[OutboundMessage] waiting to be sent
+        self._queues = {}
+        # (ready_at, seq, chat_id) for chats with queued messages that are not being sent right now
+        self._ready = []
+        self._scheduled = set()
+        self._seq = itertools.count()
+        self.workers = workers
+        self._threads = []
+        self._running = False
+
+    def start(self):
+        logger.debug('Outbox.start called')
+        with self._condition:
+            if self._running:
+                return
+            self._running = True
+        self._threads = [threading.Thread(target=self._run, name=f'goat-outbox-{i}', daemon=True)
+                         for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    def stop(self, timeout: float = 10.0):
+        logger.debug('Outbox.stop called')
+        deadline = self._clock() + timeout
+        with self._condition:
+            while (len(self._queues) > 0 or len(self._scheduled) > 0) and self._clock() < deadline:
+                self._condition.wait(min(0.1, max(0.0, deadline - self._clock())))
+            self._running = False
+            self._condition.notify_all()
+        for thread in self._threads:
+            thread.join(timeout)
+
+    def send_message(self, chat_id: int, text: str, parse_mode: str | None = None, reply_markup=None,
+                     reply_to_message_id: int | None = None, on_sent=None, on_error=None, mergeable: bool = True):
+        """mergeable=False keeps the message apart, e.g. one that will be edited later."""
+        self._enqueue(OutboundMessage(chat_id, text, parse_mode, reply_markup, reply_to_message_id,
+                                      on_sent, on_error, mergeable=mergeable))
+
+    def edit_message_text(self, chat_id: int, message_id: int, text: str, parse_mode: str | None = None,
+                          delay: float = 0.0, on_sent=None, on_error=None):
+        """Queues an edit; a newer edit of the same message replaces one still queued, and `delay` holds the
+        chat back that long to let more edits in."""
+        with self._condition:
+            queue = self._queues.get(chat_id)
+            if queue is not None:
+                for message in queue:
+                    if message.edit_message_id == message_id:
+                        message.text = text
+                        message.parse_mode = parse_mode
+                        if on_sent is not None:
+                            message.callbacks.append(on_sent)
+                        if on_error is not None:
+                            message.error_callbacks.append(on_error)
+                        return
+        self._enqueue(OutboundMessage(chat_id, text, parse_mode, on_sent=on_sent, on_error=on_error,
+                                      edit_message_id=message_id), delay)
+
+    def reply_to(self, message, text: str, **kwargs):
+        self.send_message(message.chat.id, text, reply_to_message_id=message.message_id, **kwargs)
+
+    def pending_count(self) -> int:
+        with self._condition:
+            return sum(len(queue) for queue in self._queues.values())
+
+    def _enqueue(self, message: OutboundMessage, delay: float = 0.0):
+        with self._condition:
+            queue = self._queues.get(message.chat_id)
+            if queue is None:
+                queue = self._queues[message.chat_id] = deque()
+            queue.append(message)
+            if message.chat_id not in self._scheduled:
+                self._schedule(message.chat_id, self._clock() + delay)
+                self._condition.notify()
+
+    def _get_chat_bucket(self, chat_id: int, now: float) -> _TokenBucket:
+        bucket = self._chat_buckets.get(chat_id)
+        if bucket is None:
+            if chat_id > 0:
+                bucket = _TokenBucket(self.PRIVATE_CHAT_RATE, self.PRIVATE_CHAT_BURST, now)
+            else:
+                bucket = _TokenBucket(self.GROUP_CHAT_RATE, self.GROUP_CHAT_BURST, now)
+            self._chat_buckets[chat_id] = bucket
+        return bucket
+
+    def _schedule(self, chat_id: int, ready_at: float):
+        now = self._clock()
+        ready_at = max(ready_at, now + self._get_chat_bucket(chat_id, now).delay(now))
+        heapq.heappush(self._ready, (ready_at, next(self._seq), chat_id))
+        self._scheduled.add(chat_id)
+
+    def _take_batch(self, chat_id: int) -> OutboundMessage:
+        queue = self._queues[chat_id]
+        message = queue.popleft()
+        while len(queue) > 0 and message.can_merge(queue[0]):
+            message.merge(queue.popleft())
+        return message
+
+    def _next_batch(self) -> OutboundMessage | None:
+        with self._condition:
+            while self._running:
+                if len(self._ready) == 0:
+                    self._condition.wait()
+                    continue
+                now = self._clock()
+                ready_at, _, chat_id = self._ready[0]
+                wait = max(ready_at - now, self._global_bucket.delay(now))
+                if wait > 0:
+                    self._condition.wait(wait)
+                    continue
+                heapq.heappop(self._ready)
+                self._global_bucket.consume(now)
+                self._get_chat_bucket(chat_id, now).consume(now)
+                return self._take_batch(chat_id)
+        return None
+
+    def _run(self):
+        while True:
+            message = self._next_batch()
+            if message is None:
+                return
+            retry_at = self._send(message)
+            with self._condition:
+                queue = self._queues[message.chat_id]
+                if retry_at is not None:
+                    queue.appendleft(message)
+                if len(queue) > 0:
+                    self._schedule(message.chat_id, retry_at if retry_at is not None else self._clock())
+                else:
+                    del self._queues[message.chat_id]
+                    self._scheduled.discard(message.chat_id)
+                    if len(self._chat_buckets) > self.MAX_IDLE_BUCKETS:
+                        self._prune_buckets()
+                self._condition.notify_all()
+
+    def _prune_buckets(self):
+        now = self._clock()
+        idle = [chat_id for chat_id, bucket in self._chat_buckets.items()
+                if chat_id not in self._scheduled and bucket.delay(now) == 0 and bucket.tokens >= bucket.capacity]
+        for chat_id in idle:
+            del self._chat_buckets[chat_id]
+
+    def _send(self, message: OutboundMessage) -> float | None:
+        message.attempts += 1
+        try:
+            if message.edit_message_id is not None:
+                sent = self.bot.edit_message_text(message.text, message.chat_id, message.edit_message_id,
+                                                  parse_mode=message.parse_mode)
+            else:
+                sent = self.bot.send_message(message.chat_id, message.text, parse_mode=message.parse_mode,
+                                             reply_markup=message.reply_markup,
+                                             reply_to_message_id=message.reply_to_message_id)
+        except (ApiTelegramException, requests.RequestException) as e:
+            error_code = getattr(e, 'error_code', None)
+            can_retry = message.attempts < self.MAX_ATTEMPTS
+            if error_code == 429 and can_retry:
+                retry_after = e.result_json.get('parameters', {}).get('retry_after', 1)
+                logger.warning('Outbox rate limited in chat %s, retry after %ss', message.chat_id, retry_after)
+                retry_at = self._clock() + retry_after
+                with self._condition:
+                    # the limit is not only this chat's: every chat waits it out
+                    self._global_bucket.pause(retry_at)
+                return retry_at
+            # no error code: the request did not get an answer
+            if (error_code is None or error_code >= 500) and can_retry:
+                backoff = min(self.MAX_BACKOFF, self.BACKOFF * 2 ** (message.attempts - 1))
+                logger.warning('Outbox send to %s failed: %s, retry in %ss', message.chat_id, e, backoff)
+                return self._clock() + backoff
+            logger.error('Outbox send to %s failed: %s', message.chat_id, e)
+            self._fail(message, e)
+            return None
+        except Exception as e:
+            # e.g. a bad argument, sending it again would not help
+            logger.exception('Outbox send to %s failed', message.chat_id)
+            self._fail(message, e)
+            return None
+        if self._is_private_send(message):
+            self._run_callback(self.private_chats.mark_reachable, message.chat_id)
+        for callback in message.callbacks:
+            self._run_callback(callback, sent)
+        return None
+
+    def _fail(self, message: OutboundMessage, error: Exception):
+        if getattr(error, 'error_code', None) == 403 and self._is_private_send(message):
+            # blocked by the user, or never started a chat with the bot
+            self._run_callback(self.private_chats.mark_unreachable, message.chat_id)
+        for callback in message.error_callbacks:
+            self._run_callback(callback, error)
+
+    def _is_private_send(self, message: OutboundMessage) -> bool:
+        return self.private_chats is not None and message.chat_id > 0 and message.edit_message_id is None
+
+    @staticmethod
+    def _run_callback(callback, argument):
+        try:
+            callback(argument)
+        except Exception:
+            logger.exception('Outbox callback failed')
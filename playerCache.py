@@ -0,0 +1,114 @@
+import logging
+import threading
+import time
+
+from telebot import types
+from telebot.apihelper import ApiException
+
+from DBConnector import DBConnector
+from messageTemplates import escape_markdown, get_mention
+
+logger = logging.getLogger('goat.profiles')
+
+
+class PlayerProfileCache:
+    TTL = 60 * 60
+
+    def __init__(self, tele_bot, chat_id: int, db: DBConnector, ttl: float = TTL, clock=time.monotonic):
+        self.bot = tele_bot
+        self.chat_id = chat_id
+        self.db = db
+        self.ttl = ttl
+        self._clock = clock
+        # player_id -> [full_name, updated_at]
+        self._profiles = {}
+        # player_id -> (full_name, escaped name, mention), redone when the name changes
+        self._markdown = {}
+
+    def remember(self, user: types.User):
+        logger.debug('PlayerProfileCache.remember(%s) called', user.id)
+        self._profiles[user.id] = [user.full_name, self._clock()]
+
+    def clear(self):
+        self._profiles.clear()
+        self._markdown.clear()
+
+    def get_full_name(self, player_id: int) -> str:
+        profile = self._profiles.get(player_id)
+        if profile is not None and self._clock() - profile[1] < self.ttl:
+            return profile[0]
+        logger.debug('PlayerProfileCache.get_full_name(%s) refreshing', player_id)
+        try:
+            user = self.bot.get_chat_member(self.chat_id, player_id).user
+        except ApiException as e:
+            logger.warning('PlayerProfileCache.get_full_name(%s) failed: %s', player_id, e)
+            if profile is not None:
+                return profile[0]
+            return self._get_stored_name(player_id)
+        self.remember(user)
+        return user.full_name
+
+    def _get_markdown(self, player_id: int) -> tuple:
+        full_name = self.get_full_name(player_id)
+        markdown = self._markdown.get(player_id)
+        if markdown is None or markdown[0] != full_name:
+            name = escape_markdown(full_name)
+            markdown = self._markdown[player_id] = (full_name, name, get_mention(player_id, name))
+        return markdown
+
+    def get_markdown_name(self, player_id: int) -> str:
+        return self._get_markdown(player_id)[1]
+
+    def get_mention(self, player_id: int) -> str:
+        return self._get_markdown(player_id)[2]
+
+    def _get_stored_name(self, player_id: int) -> str:
+        for user in self.db.get_users(self.chat_id):
+            if user.id == player_id:
+                return user.get_full_name()
+        return str(player_id)
+
+
+class PrivateChatCache:
+    """Whether the bot can message a user in private, so that a join is decided without a probe message.
+
+    Users are marked reachable when they write to the bot in private or a private send goes through, and
+    unreachable on a 403. Only reachable users are kept in memory: another process may mark a user reachable
+    meanwhile, so the rest are read from the DB again. With cache_reachable off, e.g. in shard workers where another
+    process may also mark a user unreachable, every call reads the DB."""
+
+    def __init__(self, db: DBConnector, cache_reachable: bool = True):
+        self.db = db
+        self.cache_reachable = cache_reachable
+        self._reachable = set()
+        self._lock = threading.Lock()
+
+    def get(self, user_id: int) -> bool | None:
+        """None when the bot has never talked to the user in private."""
+        if not self.cache_reachable:
+            return self.db.get_private_chat(user_id)
+        if user_id in self._reachable:
+            return True
+        reachable = self.db.get_private_chat(user_id)
+        if reachable:
+            with self._lock:
+                self._reachable.add(user_id)
+        return reachable
+
+    def mark_reachable(self, user_id: int):
+        if not self.cache_reachable:
+            # a read is cheaper than a write, and most private messages come from users already marked
+            if not self.db.get_private_chat(user_id):
+                self.db.set_private_chat(user_id, True)
+            return
+        if user_id in self._reachable:
+            return
+        self.db.set_private_chat(user_id, True)
+        with self._lock:
+            self._reachable.add(user_id)
+
+    def mark_unreachable(self, user_id: int):
+        logger.info('PrivateChatCache.mark_unreachable(%s) called', user_id)
+        with self._lock:
+            self._reachable.discard(user_id)
+        self.db.set_private_chat(user_id, False)
@@ -0,0 +1,413 @@
+import bisect
+import hashlib
+import logging
+import multiprocessing
+import queue
+import threading
+import time
+
+from telebot import types
+
+from messageCommands import CommandType, classify
+
+logger = logging.getLogger('goat.shards')
+
+# ring points per worker, enough to keep the share of each of a few dozen workers within a few percent
+RING_REPLICAS = 128
+MONITOR_INTERVAL = 1.0
+
+
+def _ring_hash(text: str) -> int:
+    # stable across processes, unlike hash()
+    return int.from_bytes(hashlib.blake2b(text.encode(), digest_size=8).digest(), 'little')
+
+
+class HashRing:
+    """Consistent hashing of chat ids to worker ids: adding or removing a worker moves only its share of chats."""
+
+    def __init__(self, nodes=(), replicas: int = RING_REPLICAS):
+        self.replicas = replicas
+        self._points = []
+        self._nodes = []
+        for node in nodes:
+            self.add_node(node)
+
+    def __len__(self):
+        return len(set(self._nodes))
+
+    def add_node(self, node: int):
+        for i in range(self.replicas):
+            point = _ring_hash(f'{node}:{i}')
+            index = bisect.bisect(self._points, point)
+            self._points.insert(index, point)
+            self._nodes.insert(index, node)
+
+    def remove_node(self, node: int):
+        kept = [(point, x) for point, x in zip(self._points, self._nodes) if x != node]
+        self._points = [point for point, _ in kept]
+        self._nodes = [x for _, x in kept]
+
+    def get_node(self, key: int) -> int | None:
+        if len(self._points) == 0:
+            return None
+        index = bisect.bisect(self._points, _ring_hash(str(key)))
+        return self._nodes[index % len(self._nodes)]
+
+
+def _get_seats(registry, chat_id: int) -> frozenset:
+    session = registry.get(chat_id)
+    if session is None or not session.is_started or session.game is None:
+        return frozenset()
+    return frozenset(session.game.get_player_ids())
+
+
+def _is_join(message: dict) -> bool:
+    # a join is a reply in a group, other messages are not parsed here
+    if message['chat']['type'] == 'private' or 'reply_to_message' not in message:
+        return False
+    command = classify(types.Message.de_json(message))
+    return command is not None and command.type is CommandType.JOIN
+
+
+def _worker_main(shard_id: int, inbox, events, max_workers: int, api_url: str | None):
+    """Hosts the Goat sessions of one shard; commands come from the supervisor in routing order."""
+    from telebot import apihelper, types
+
+    import goat
+    from chatExecutor import ChatExecutor
+    from keyboards import REMOVE_KEYBOARD
+
+    goat.configure_logging()
+    if api_url is not None:
+        apihelper.API_URL = api_url
+    goat.bot.threaded = False
+    # other shards mark users unreachable too, so the per-process cache could answer from stale state
+    goat.private_chats.cache_reachable = False
+    goat.outbox.start()
+    executor = ChatExecutor(max_workers)
+    # outbox callbacks are queued behind the chat's updates, and so behind its release
+    goat._set_chat_executor(executor)
+    seats = {}
+
+    def report_seats(chat_id: int):
+        current = _get_seats(goat.registry, chat_id)
+        if seats.get(chat_id, frozenset()) != current:
+            seats[chat_id] = current
+            events.put(('seats', shard_id, chat_id, current))
+
+    def handle(chat_id: int, data: dict):
+        goat.bot.process_new_messages([types.Message.de_json(data)])
+        report_seats(chat_id)
+
+    def join(chat_id: int, data: dict):
+        handle(chat_id, data)
+        # after the seats, so that the supervisor knows the outcome when it lifts the reservation
+        events.put(('joined', shard_id, chat_id, data['from']['id']))
+
+    def reject_join(chat_id: int, data: dict):
+        goat.outbox.reply_to(types.Message.de_json(data), goat.SEATED_ELSEWHERE, reply_markup=REMOVE_KEYBOARD)
+
+    def acquire(chat_id: int):
+        # resumes the chat from its snapshot, if there is one
+        goat.registry.get_or_create(chat_id)
+        report_seats(chat_id)
+
+    def release(chat_id: int):
+        # every move is already in the snapshot, dropping the session is enough; its late callbacks must not
+        # overwrite the snapshot the new owner resumes from
+        session = goat.registry.remove(chat_id)
+        if session is not None:
+            session.close()
+        seats.pop(chat_id, None)
+        events.put(('released', shard_id, chat_id, None))
+
+    actions = {'acquire': acquire, 'release': release}
+    message_actions = {'update': handle, 'join': join, 'reject_join': reject_join}
+    logger.info('Shard %s started', shard_id)
+    try:
+        while True:
+            item = inbox.get()
+            if item is None:
+                break
+            action, chat_id, data = item
+            if action in message_actions:
+                executor.submit(chat_id, message_actions[action], chat_id, data)
+            else:
+                executor.submit(chat_id, actions[action], chat_id)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown()
+        goat.outbox.stop()
+        goat.db.close()
+        logger.info('Shard %s stopped', shard_id)
+
+
+class _Worker:
+    __slots__ = ('shard_id', 'process', 'inbox')
+
+    def __init__(self, shard_id: int, process, inbox):
+        self.shard_id = shard_id
+        self.process = process
+        self.inbox = inbox
+
+
+class ShardSupervisor:
+    """Routes updates to worker processes by consistent hash of the chat; each worker runs its own Goat sessions.
+
+    Private messages of a seated player are routed by the chat of the game, from the seats the workers report.
+    When the ring changes, a moving chat is released by its old worker before the new one resumes it from the
+    snapshot; its updates in between are held back and then passed on in order.
+
+    Seats are reported by the workers after the fact, so a join is checked here before it is passed on: the user is
+    reserved for the chat until its worker has handled the join, and a join to any other chat meanwhile is refused.
+
+    add_worker and remove_worker are for code that runs the supervisor itself; `goat.py --mode sharded` keeps the
+    --shards workers it starts with and only replaces the ones that die."""
+
+    def __init__(self, worker_count: int, chat_ids=(), max_workers: int = 16, api_url: str | None = None):
+        logger.debug('ShardSupervisor constructor called %s', worker_count)
+        self._context = multiprocessing.get_context('spawn')
+        self._events = self._context.Queue()
+        self._max_workers = max_workers
+        self._api_url = api_url
+        self._ring = HashRing()
+        self._workers = {}
+        # chat_id -> shard id hosting it
+        self._placement = {}
+        # chat_id -> (new shard id, held back (action, message) items) while the old shard releases it
+        self._moving = {}
+        # chat_id -> frozenset of seated user ids, user_id -> chat_id
+        self._chat_seats = {}
+        self._seats = {}
+        # user_id -> chat_id of a join passed on but not handled yet
+        self._joining = {}
+        self._lock = threading.RLock()
+        self._running = True
+        self._next_shard_id = 0
+        for _ in range(worker_count):
+            shard_id = self._new_shard_id()
+            self._start_worker(shard_id)
+            self._ring.add_node(shard_id)
+        for chat_id in chat_ids:
+            self._place(chat_id)
+        self._event_thread = threading.Thread(target=self._read_events, name='goat-shard-events', daemon=True)
+        self._event_thread.start()
+        self._monitor_thread = threading.Thread(target=self._monitor, name='goat-shard-monitor', daemon=True)
+        self._monitor_thread.start()
+
+    def _new_shard_id(self) -> int:
+        shard_id = self._next_shard_id
+        self._next_shard_id += 1
+        return shard_id
+
+    def _start_worker(self, shard_id: int):
+        inbox = self._context.Queue()
+        process = self._context.Process(target=_worker_main, name=f'goat-shard-{shard_id}',
+                                        args=(shard_id, inbox, self._events, self._max_workers, self._api_url),
+                                        daemon=True)
+        process.start()
+        self._workers[shard_id] = _Worker(shard_id, process, inbox)
+
+    def _send(self, shard_id: int, action: str, chat_id: int, data=None):
+        self._workers[shard_id].inbox.put((action, chat_id, data))
+
+    def _place(self, chat_id: int) -> int:
+        shard_id = self._ring.get_node(chat_id)
+        self._placement[chat_id] = shard_id
+        self._send(shard_id, 'acquire', chat_id)
+        return shard_id
+
+    def get_chat_key(self, message: dict) -> int:
+        chat_id = message['chat']['id']
+        if message['chat']['type'] == 'private':
+            with self._lock:
+                return self._seats.get(message['from']['id'], chat_id)
+        return chat_id
+
+    def get_shard(self, chat_id: int) -> int | None:
+        with self._lock:
+            return self._placement.get(chat_id)
+
+    def route(self, message: dict):
+        chat_id = self.get_chat_key(message)
+        with self._lock:
+            if chat_id == message['from']['id']:
+                # a private chat of a player who is not seated keeps no state, no need to place it
+                self._send(self._ring.get_node(chat_id), 'update', chat_id, message)
+                return
+            action = 'update'
+            if _is_join(message):
+                action = self._check_join(message['from']['id'], chat_id)
+            moving = self._moving.get(chat_id)
+            if moving is not None:
+                moving[1].append((action, message))
+                return
+            shard_id = self._placement.get(chat_id)
+            if shard_id is None:
+                shard_id = self._place(chat_id)
+            self._send(shard_id, action, chat_id, message)
+
+    def _check_join(self, user_id: int, chat_id: int) -> str:
+        seated_chat = self._seats.get(user_id)
+        if seated_chat is None:
+            seated_chat = self._joining.get(user_id)
+        if seated_chat is not None and seated_chat != chat_id:
+            logger.debug('ShardSupervisor._check_join(%s, %s) seated in %s', user_id, chat_id, seated_chat)
+            return 'reject_join'
+        self._joining[user_id] = chat_id
+        return 'join'
+
+    def add_worker(self) -> int:
+        with self._lock:
+            shard_id = self._new_shard_id()
+            self._start_worker(shard_id)
+            self._ring.add_node(shard_id)
+            self._rebalance()
+        logger.info('ShardSupervisor.add_worker started shard %s', shard_id)
+        return shard_id
+
+    def remove_worker(self, shard_id: int):
+        with self._lock:
+            self._ring.remove_node(shard_id)
+            self._rebalance()
+            worker = self._workers.pop(shard_id)
+        # after the releases queued by _rebalance
+        worker.inbox.put(None)
+        worker.process.join()
+        logger.info('ShardSupervisor.remove_worker stopped shard %s', shard_id)
+
+    def restart_worker(self, shard_id: int):
+        """Replaces a worker that died or hangs; its chats are resumed from their snapshots."""
+        with self._lock:
+            worker = self._workers[shard_id]
+            if worker.process.is_alive():
+                worker.process.terminate()
+            worker.process.join()
+            lost = 0
+            try:
+                while True:
+                    worker.inbox.get_nowait()
+                    lost += 1
+            except queue.Empty:
+                pass
+            if lost > 0:
+                logger.warning('ShardSupervisor.restart_worker(%s) dropped %s queued items', shard_id, lost)
+            self._start_worker(shard_id)
+            for chat_id, placed in self._placement.items():
+                # a moving chat is acquired by its new owner below, not by the shard it was leaving
+                if placed == shard_id and chat_id not in self._moving:
+                    self._send(shard_id, 'acquire', chat_id)
+            for chat_id in [x for x in self._moving.keys() if self._placement[x] == shard_id]:
+                # the release will never be answered, the snapshot is all there is
+                self._on_released(chat_id)
+            # the joins were dropped with the queue
+            for user_id in [x for x, chat_id in self._joining.items()
+                            if self._placement.get(chat_id) == shard_id and chat_id not in self._moving]:
+                del self._joining[user_id]
+        logger.info('ShardSupervisor.restart_worker restarted shard %s', shard_id)
+
+    def _rebalance(self):
+        for chat_id, shard_id in self._placement.items():
+            if chat_id in self._moving:
+                continue
+            target = self._ring.get_node(chat_id)
+            if target != shard_id:
+                self._moving[chat_id] = (target, [])
+                self._send(shard_id, 'release', chat_id)
+        logger.debug('ShardSupervisor._rebalance moving %s chats', len(self._moving))
+
+    def _on_released(self, chat_id: int):
+        target, held = self._moving.pop(chat_id)
+        # the ring may have changed again while the chat was moving
+        target = self._ring.get_node(chat_id)
+        self._placement[chat_id] = target
+        self._send(target, 'acquire', chat_id)
+        for action, message in held:
+            self._send(target, action, chat_id, message)
+
+    def _on_seats(self, chat_id: int, seats: frozenset):
+        for user_id in self._chat_seats.get(chat_id, frozenset()) - seats:
+            if self._seats.get(user_id) == chat_id:
+                del self._seats[user_id]
+        for user_id in seats:
+            self._seats[user_id] = chat_id
+        if len(seats) > 0:
+            self._chat_seats[chat_id] = seats
+        else:
+            self._chat_seats.pop(chat_id, None)
+
+    def _read_events(self):
+        while self._running:
+            try:
+                event, shard_id, chat_id, data = self._events.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            except (EOFError, OSError):
+                return
+            self._on_event(event, chat_id, data)
+
+    def _on_event(self, event: str, chat_id: int, data):
+        with self._lock:
+            if event == 'seats':
+                self._on_seats(chat_id, data)
+            elif event == 'joined':
+                if self._joining.get(data) == chat_id:
+                    del self._joining[data]
+            elif event == 'released' and chat_id in self._moving:
+                self._on_released(chat_id)
+
+    def _monitor(self):
+        while self._running:
+            time.sleep(MONITOR_INTERVAL)
+            with self._lock:
+                dead = [shard_id for shard_id, worker in self._workers.items()
+                        if self._running and not worker.process.is_alive()]
+            for shard_id in dead:
+                logger.error('ShardSupervisor shard %s exited with %s, restarting', shard_id,
+                             self._workers[shard_id].process.exitcode)
+                self.restart_worker(shard_id)
+
+    def get_worker_ids(self) -> list[int]:
+        with self._lock:
+            return sorted(self._workers.keys())
+
+    def get_seated_chat(self, user_id: int) -> int | None:
+        with self._lock:
+            return self._seats.get(user_id)
+
+    def stop(self, timeout: float = 10.0):
+        logger.debug('ShardSupervisor.stop called')
+        self._running = False
+        with self._lock:
+            workers = list(self._workers.values())
+        for worker in workers:
+            worker.inbox.put(None)
+        for worker in workers:
+            worker.process.join(timeout)
+            if worker.process.is_alive():
+                worker.process.terminate()
+
+
+def run_sharded(tele_bot, chat_ids, worker_count: int, max_workers: int = 16, api_url: str | None = None,
+                polling_timeout: int = 20):
+    """Long polls Telegram in this process and hands every message to its shard until interrupted."""
+    supervisor = ShardSupervisor(worker_count, chat_ids, max_workers, api_url)
+    offset = None
+    try:
+        while True:
+            try:
+                updates = tele_bot.get_updates(offset=offset, timeout=polling_timeout,
+                                               long_polling_timeout=polling_timeout)
+            except Exception as e:
+                logger.warning('run_sharded get_updates failed: %s', e)
+                time.sleep(1)
+                continue
+            for update in updates:
+                offset = update.update_id + 1
+                if update.message is not None:
+                    supervisor.route(update.message.json)
+    except KeyboardInterrupt:
+        logger.info('Sharded polling stopped')
+    finally:
+        supervisor.stop()
@@ -0,0 +1,197 @@
+import argparse
+import logging
+import random
+import time
+from collections import deque
+from itertools import cycle
+
+from deals import Deal, DealTypes
+from goatGame import GoatGame
+from goatLogging import configure_logging
+from models import Card, CardSuit
+
+logger = logging.getLogger('goat.simulation')
+
+PLAYER_IDS = (1, 2, 3, 4)
+GAME_SCORE = 12
+DEAL_KEYS = {'all': DealTypes.names[0], 'two': DealTypes.names[1], 'three': DealTypes.names[2],
+             'four': DealTypes.names[3], 'single-pants': DealTypes.names[4], 'double-pants': DealTypes.names[5]}
+
+
+class RandomPolicy:
+    def __init__(self, seed: int | None = None):
+        self.random = random.Random(seed)
+
+    def choose_trump(self, game: GoatGame, player_id: int) -> CardSuit:
+        return self.random.choice(list(CardSuit))
+
+    def choose_card(self, game: GoatGame, player_id: int) -> Card:
+        return self.random.choice(game.get_player_cards(player_id))
+
+    def choose_pants(self, game: GoatGame, player_id: int) -> tuple:
+        return self.random.choice(game.get_available_pants_pairs(player_id))
+
+
+class FirstCardPolicy:
+    """Deterministic: the suit the player holds most of as trump, then always the first card offered."""
+
+    def choose_trump(self, game: GoatGame, player_id: int) -> CardSuit:
+        cards = game.get_player_cards(player_id)
+        return max(list(CardSuit)[1:], key=lambda suit: sum(1 for card in cards if card.suit == suit))
+
+    def choose_card(self, game: GoatGame, player_id: int) -> Card:
+        return game.get_player_cards(player_id)[0]
+
+    def choose_pants(self, game: GoatGame, player_id: int) -> tuple:
+        return game.get_available_pants_pairs(player_id)[0]
+
+
+POLICIES = {'random': RandomPolicy, 'first': lambda seed=None: FirstCardPolicy()}
+
+
+class SimulationStats:
+    def __init__(self):
+        self.games = 0
+        self.deals = {}
+        self.steps = 0
+        self.jackpots = 0
+        self.elapsed = 0.0
+
+    def get_deal_count(self) -> int:
+        return sum(self.deals.values())
+
+    def get_deals_per_second(self) -> float:
+        return self.get_deal_count() / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class Simulation:
+    """Plays GoatGame without Telegram: prompts from the game handlers are queued and answered by a policy."""
+
+    def __init__(self, policy, deal_names: list[str] | None = None, game_score: int = GAME_SCORE,
+                 record: bool = False, log=None):
+        self.policy = policy
+        # gameLog.GameLog shared by all games of the run, if any
+        self.log = log
+        self._deal_names = cycle(deal_names or DealTypes.names)
+        self.game_score = game_score
+        self.record = record
+        # (event, args) for everything the game showed, filled when record is set
+        self.events = []
+        # (prompt, player_id) waiting for a policy decision
+        self._prompts = deque()
+        self.game = None
+        self.stats = SimulationStats()
+
+    def _new_game(self, first_deal: bool = True):
+        logger.debug('Simulation._new_game called')
+        self.stats.games += 1
+        self._prompts.clear()
+        self.game = self.create_game(PLAYER_IDS[0], self.log)
+        for player_id in PLAYER_IDS[1:]:
+            self.game.add_player(player_id)
+        if first_deal:
+            self.game.first_deal()
+
+    def create_game(self, owner_id: int, log=None) -> GoatGame:
+        return GoatGame(owner_id,
+                        lambda player_id: self._prompts.append(('trump', player_id)),
+                        lambda player_id: self._on_event('cards', player_id),
+                        lambda cards, card, player_id: self._on_event('bribe', cards, card, player_id),
+                        lambda player_id: self._prompts.append(('deal', player_id)),
+                        lambda player_id: self._prompts.append(('step', player_id)),
+                        lambda *args: self._on_event('pants', *args),
+                        self._on_jackpot,
+                        lambda first, second: self._on_event('score', first, second),
+                        lambda player_id: self._prompts.append(('pants_step', player_id)),
+                        lambda cards: self._on_event('current_pants', cards),
+                        log)
+
+    def _on_event(self, event: str, *args):
+        if self.record:
+            self.events.append((event, args))
+
+    def _on_jackpot(self, winner_id: int, looser_id: int):
+        self.stats.jackpots += 1
+        self._on_event('jackpot', winner_id, looser_id)
+
+    def _play_deal(self, deal_name: str | None):
+        if deal_name is not None:
+            player_id = self.game.get_next_deal_owner()
+            if not self.game.start_next_deal(player_id, deal_name):
+                raise RuntimeError(f'deal {deal_name} was not started by {player_id}')
+        self._answer_prompts()
+
+    def play_deal(self, deal: Deal):
+        """Plays a prepared deal, e.g. one with a stacked deck, in the current game."""
+        if self.game is None:
+            self._new_game(first_deal=False)
+        self._prompts.clear()
+        self.game.start_deal(deal)
+        self._answer_prompts()
+
+    def _answer_prompts(self):
+        """Answers prompts until the game asks for the next deal."""
+        game = self.game
+        policy = self.policy
+        prompts = self._prompts
+        deal_key = type(game.deal).__name__
+        while len(prompts) > 0:
+            prompt, player_id = prompts.popleft()
+            if prompt == 'deal':
+                break
+            if prompt == 'step':
+                card = policy.choose_card(game, player_id)
+                done = game.do_player_step(player_id, card)
+                self.stats.steps += 1
+            elif prompt == 'pants_step':
+                cards = policy.choose_pants(game, player_id)
+                if len(cards) == 1:
+                    done = game.do_player_step(player_id, cards[0])
+                else:
+                    done = game.do_player_pants_step(player_id, cards[0], cards[1])
+            else:
+                done = game.select_trump(player_id, policy.choose_trump(game, player_id))
+            if not done:
+                raise RuntimeError(f'{deal_key}: {prompt} of {player_id} was rejected')
+        else:
+            raise RuntimeError(f'{deal_key} stopped without asking for the next deal')
+        self.stats.deals[deal_key] = self.stats.deals.get(deal_key, 0) + 1
+
+    def run(self, deal_count: int) -> SimulationStats:
+        logger.info('Simulation.run(%s) called', deal_count)
+        start = time.perf_counter()
+        for _ in range(deal_count):
+            if self.game is None or max(self.game.get_score()) >= self.game_score:
+                self._new_game()
+                self._play_deal(None)
+            else:
+                self._play_deal(next(self._deal_names))
+        self.stats.elapsed += time.perf_counter() - start
+        return self.stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Plays goat deals without Telegram')
+    parser.add_argument('-n', '--deals', type=int, default=10000)
+    parser.add_argument('--policy', choices=POLICIES.keys(), default='random')
+    parser.add_argument('--deal-type', action='append', choices=DEAL_KEYS.keys(), dest='deal_types',
+                        help='deal types to cycle through after the first deal of a game, all by default')
+    parser.add_argument('--game-score', type=int, default=GAME_SCORE)
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--log-level', default='WARNING')
+    args = parser.parse_args()
+    configure_logging(args.log_level)
+    if args.seed is not None:
+        # decks are shuffled with the module level generator
+        random.seed(args.seed)
+    deal_names = [DEAL_KEYS[key] for key in args.deal_types] if args.deal_types else None
+    simulation = Simulation(POLICIES[args.policy](args.seed), deal_names, args.game_score)
+    stats = simulation.run(args.deals)
+    for deal_key, count in sorted(stats.deals.items()):
+        print(f'{deal_key:<20} {count:>10}')
+    print(f'{stats.get_deal_count()} deals in {stats.games} games, {stats.steps} card steps, '
+          f'{stats.jackpots} jackpots, {stats.elapsed:.2f}s, {stats.get_deals_per_second():.0f} deals/s')
+
+
+if __name__ == '__main__':
+    main()
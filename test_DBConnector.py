@@ -0,0 +1,132 @@
+import os
+import sqlite3
+import tempfile
+import unittest
+
+from DBConnector import DBConnector
+from models import GoatUser
+
+
+class DBTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.directory.name, 'test.db')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def get_tables(self) -> set:
+        with sqlite3.connect(self.db_path) as connection:
+            return {name for name, in connection.execute("SELECT `name` FROM `sqlite_master` WHERE `type`='table'")}
+
+
+class MigrationTest(DBTestCase):
+    def test_database_of_the_first_release(self):
+        # the schema goat.db shipped with, no user_version and the same user twice in a chat
+        with sqlite3.connect(self.db_path) as connection:
+            connection.execute(DBConnector.MIGRATIONS[0][0])
+            connection.executemany('INSERT INTO `users`(`chat_id`, `user_id`, `first_name`) VALUES(?, ?, ?)',
+                                   [(-1, 1, 'first'), (-1, 2, 'b'), (-1, 1, 'again'), (-2, 1, 'c')])
+        connection.close()
+        with DBConnector(self.db_path) as db:
+            self.assertEqual(db.get_schema_version(), len(DBConnector.MIGRATIONS))
+            self.assertEqual([(x.id, x.first_name) for x in db.get_users(-1)], [(1, 'first'), (2, 'b')])
+            self.assertEqual(db.count_users(-2), 1)
+            self.assertFalse(db.add_user(-1, GoatUser(1, 'first', None, None)))
+            self.assertTrue(db.add_user(-2, GoatUser(2, 'd', None, None)))
+            db.save_snapshot(-1, b'snapshot', b'events')
+            db.set_private_chat(1, True)
+        self.assertEqual(self.get_tables(), {'users', 'sqlite_sequence', 'game_snapshots', 'game_events',
+                                             'private_chats'})
+
+    def test_each_version_is_migrated_to_the_last(self):
+        for version in range(len(DBConnector.MIGRATIONS) + 1):
+            with self.subTest(version=version):
+                if os.path.exists(self.db_path):
+                    os.remove(self.db_path)
+                with sqlite3.connect(self.db_path) as connection:
+                    for statements in DBConnector.MIGRATIONS[:version]:
+                        for statement in statements:
+                            connection.execute(statement)
+                    connection.execute(f'PRAGMA user_version={version}')
+                connection.close()
+                with DBConnector(self.db_path) as db:
+                    self.assertEqual(db.get_schema_version(), len(DBConnector.MIGRATIONS))
+                # a second connect finds nothing to do
+                with DBConnector(self.db_path) as db:
+                    self.assertEqual(db.get_schema_version(), len(DBConnector.MIGRATIONS))
+
+    def test_failed_migration_is_rolled_back(self):
+        migrations = DBConnector.MIGRATIONS + [['CREATE TABLE `extra` (`id` INTEGER)', 'NOT SQL']]
+
+        class BrokenConnector(DBConnector):
+            MIGRATIONS = migrations
+
+        with BrokenConnector(self.db_path) as db:
+            with self.assertRaises(sqlite3.OperationalError):
+                db.get_schema_version()
+        with DBConnector(self.db_path) as db:
+            self.assertEqual(db.get_schema_version(), len(DBConnector.MIGRATIONS))
+        self.assertNotIn('extra', self.get_tables())
+
+
+class RosterCacheTest(DBTestCase):
+    def setUp(self):
+        super().setUp()
+        self.db = DBConnector(self.db_path, roster_cache_size=2)
+        for user_id in (1, 2):
+            self.db.add_user(-1, GoatUser(user_id, f'user{user_id}', None, None))
+
+    def tearDown(self):
+        self.db.close()
+        super().tearDown()
+
+    def delete_behind_the_cache(self, chat_id: int, user_id: int):
+        with sqlite3.connect(self.db_path) as connection:
+            connection.execute('DELETE FROM `users` WHERE `chat_id`=? AND `user_id`=?', (chat_id, user_id))
+        connection.close()
+
+    def user_ids(self, chat_id: int) -> list[int]:
+        return [x.id for x in self.db.get_users(chat_id)]
+
+    def test_roster_is_read_once(self):
+        self.assertEqual(self.user_ids(-1), [1, 2])
+        self.delete_behind_the_cache(-1, 2)
+        self.assertEqual(self.user_ids(-1), [1, 2])
+        self.assertEqual(self.db.count_users(-1), 2)
+        self.db.invalidate_roster(-1)
+        self.assertEqual(self.user_ids(-1), [1])
+
+    def test_returned_roster_is_a_copy(self):
+        self.db.get_users(-1).clear()
+        self.assertEqual(self.user_ids(-1), [1, 2])
+
+    def test_add_user_replaces_the_cached_roster(self):
+        self.assertEqual(self.user_ids(-1), [1, 2])
+        self.assertTrue(self.db.add_user(-1, GoatUser(3, 'user3', None, None)))
+        self.assertEqual(self.user_ids(-1), [1, 2, 3])
+        self.assertEqual(self.db.count_users(-1), 3)
+        self.assertFalse(self.db.add_user(-1, GoatUser(3, 'user3', None, None)))
+        self.assertEqual(self.db.count_users(-1), 3)
+
+    def test_roster_read_before_a_write_is_not_cached(self):
+        cache_roster = self.db._cache_roster
+
+        def write_first(*args):
+            # another thread adds a user after the read, before it is cached
+            self.db._cache_roster = cache_roster
+            self.db.add_user(-1, GoatUser(3, 'user3', None, None))
+            cache_roster(*args)
+
+        self.db._cache_roster = write_first
+        self.assertEqual(self.user_ids(-1), [1, 2])
+        self.assertEqual(self.user_ids(-1), [1, 2, 3])
+
+    def test_least_recently_used_rosters_are_dropped(self):
+        for chat_id in (-1, -2, -1, -3):
+            self.db.get_users(chat_id)
+        self.assertEqual(list(self.db._rosters.keys()), [-1, -3])
+
+
+if __name__ == '__main__':
+    unittest.main()
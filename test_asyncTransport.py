@@ -0,0 +1,46 @@
+import asyncio
+import threading
+import unittest
+
+from asyncTransport import AsyncBotBridge, BridgeClosedError
+
+
+class _AsyncBot:
+    token = '1:test'
+
+    async def send_message(self, chat_id: int, text: str):
+        return chat_id, text, threading.current_thread().name
+
+
+class AsyncBotBridgeTest(unittest.TestCase):
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name='loop')
+        self.thread.start()
+        self.bridge = AsyncBotBridge(_AsyncBot(), self.loop)
+
+    def tearDown(self):
+        if not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+            self.thread.join()
+            self.loop.close()
+
+    def test_calls_run_on_the_loop(self):
+        self.assertEqual(self.bridge.send_message(5, 'hi'), (5, 'hi', 'loop'))
+        self.assertEqual(self.bridge.token, '1:test')
+
+    def test_calls_after_close_raise(self):
+        self.bridge.close()
+        with self.assertRaises(BridgeClosedError):
+            self.bridge.send_message(5, 'hi')
+
+    def test_calls_after_the_loop_closed_raise(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        with self.assertRaises(BridgeClosedError):
+            self.bridge.send_message(5, 'hi')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,239 @@
+import copy
+import random
+import unittest
+from collections import deque
+
+from deals import AllCardsDeal, Deal, DealTypes, DoublePantsDeal, NumDeal, PantsDeal, SinglePantsDeal
+from models import Card, CardSuit, Deck, get_trick_winner
+
+SEEDS = range(40)
+
+
+def _team(player_index: int) -> int:
+    return player_index % 2
+
+
+class DealDriver:
+    """Plays one deal with seeded random choices and records what the deal asked and showed."""
+
+    def __init__(self, deal: Deal, seed: int):
+        self.deal = deal
+        self.rng = random.Random(seed)
+        deal.deck = Deck()
+        deal.deck.shuffle(self.rng)
+        self.prompts = deque()
+        self.trump_prompts = []
+        self.pants_prompts = []
+        # (cards left in the deck before the step, card counts of the hands after it)
+        self.distributions = []
+        self.shown_pants = None
+        deal.request_trump_handler = lambda x: self.prompts.append(('trump', x))
+        deal.request_ask_for_step_handler = lambda x: self.prompts.append(('step', x))
+        deal.request_send_current_cards_to_pm_handler = lambda x: None
+        deal.request_show_bribe_handler = lambda cards, card, x: None
+        deal.request_show_jackpot_handler = lambda winner, looser: None
+        if isinstance(deal, PantsDeal):
+            deal.request_ask_for_pants_step_handler = lambda x: self.prompts.append(('pants', x))
+            deal.request_show_current_pants_handler = lambda cards: None
+            deal.request_show_pants_handler = self._on_show_pants
+        if isinstance(deal, NumDeal):
+            process_deal_step = deal.process_deal_step
+
+            def recorded_step():
+                rest = deal.deck.get_rest_cards()
+                process_deal_step()
+                self.distributions.append((rest, [deal.get_player_card_count(i) for i in range(4)]))
+
+            deal.process_deal_step = recorded_step
+
+    def _on_show_pants(self, *args):
+        self.shown_pants = args
+
+    def count_cards(self) -> int:
+        deal = self.deal
+        count = sum(deal.get_player_card_count(i) for i in range(4)) + len(deal.cards) \
+            + len(deal.team1_cards) + len(deal.team2_cards) + deal.deck.get_rest_cards()
+        if isinstance(deal, SinglePantsDeal) and deal.is_in_pants():
+            count += len(deal.pant_cards)
+        if isinstance(deal, DoublePantsDeal) and deal.is_in_pants():
+            count += len(deal.left_pant_cards) + len(deal.right_pant_cards)
+        return count
+
+    def play(self, test: unittest.TestCase):
+        deal = self.deal
+        deal.process_deal()
+        while len(self.prompts) > 0:
+            prompt, player_index = self.prompts.popleft()
+            test.assertEqual(self.count_cards(), Deck.COUNT)
+            if prompt == 'trump':
+                self.trump_prompts.append(player_index)
+                deal.set_trump(self.rng.choice(list(CardSuit)))
+            elif prompt == 'pants':
+                self.pants_prompts.append(player_index)
+                test.assertEqual(deal.player_index, player_index)
+                test.assertLessEqual(deal.get_player_card_count(player_index), PantsDeal.HAND_LIMIT)
+                moves = deal.get_cards_for_pants(player_index)
+                test.assertGreater(len(moves), 0)
+                move = self.rng.choice(moves)
+                test.assertTrue(deal.set_pant_card(player_index, move if isinstance(move, tuple) else (move,)))
+            else:
+                test.assertEqual(deal.player_index, player_index)
+                card = self.rng.choice(deal.get_player_cards(player_index))
+                if len(deal.cards) == 0 and isinstance(deal, NumDeal):
+                    test.assertEqual(player_index, deal.owner_index)
+                deal.do_player_step(player_index, card)
+        test.assertTrue(deal.is_completed())
+        if not deal.is_jackpot:
+            taken = [x['card'] for x in deal.team1_cards + deal.team2_cards]
+            test.assertEqual(len(taken), Deck.COUNT)
+            test.assertEqual(set(taken), set(Deck().cards))
+            test.assertEqual(deal.deck.get_rest_cards(), 0)
+
+
+class AllCardsDealTest(unittest.TestCase):
+    def test_deals(self):
+        for seed in SEEDS:
+            with self.subTest(seed=seed):
+                driver = DealDriver(AllCardsDeal(seed % 4), seed)
+                deal = driver.deal
+                deal.process_deal = self._checked(deal, deal.process_deal)
+                driver.play(self)
+                owner = deal.owner_index
+                self.assertEqual(driver.trump_prompts, [owner])
+
+    def _checked(self, deal: AllCardsDeal, process_deal):
+        def call():
+            process_deal()
+            self.assertEqual([deal.get_player_card_count(i) for i in range(4)], [8] * 4)
+            self.assertTrue(deal.has_player_card(deal.owner_index, AllCardsDeal.DEFAULT_TRUMP_CARD))
+            self.assertEqual(deal.player_index, deal.owner_index)
+        return call
+
+
+class NumDealTest(unittest.TestCase):
+    def test_deals(self):
+        for deal_class, count in ((DealTypes.classes[1], 2), (DealTypes.classes[2], 3), (DealTypes.classes[3], 4)):
+            for seed in SEEDS:
+                with self.subTest(deal=deal_class.__name__, seed=seed):
+                    driver = DealDriver(deal_class(seed % 4), seed)
+                    driver.play(self)
+                    deal = driver.deal
+                    self.assertEqual(driver.trump_prompts, [deal.owner_index])
+                    self.assertGreater(len(driver.distributions), 0)
+                    for rest, counts in driver.distributions:
+                        self.assertEqual(counts, [min(count, rest // 4)] * 4)
+                    if not deal.is_jackpot:
+                        self.assertEqual(sum(counts[0] for _, counts in driver.distributions), Deck.COUNT // 4)
+
+    def test_last_step_of_three_deal_gets_the_rest(self):
+        driver = DealDriver(DealTypes.classes[2](0), 1)
+        driver.deal._check_for_jackpot = lambda: False
+        driver.play(self)
+        self.assertEqual([counts[0] for _, counts in driver.distributions], [3, 3, 2])
+        self.assertEqual([rest for rest, _ in driver.distributions], [32, 20, 8])
+
+
+class PantsDealTest(unittest.TestCase):
+    def _play(self, deal_class, seed: int) -> DealDriver:
+        owner = seed % 4
+        driver = DealDriver(deal_class(owner), seed)
+        driver.play(self)
+        deal = driver.deal
+        self.assertEqual(driver.trump_prompts, [owner])
+        self.assertEqual(driver.pants_prompts, [(owner + i) % 4 for i in range(4)])
+        self.assertIsNotNone(driver.shown_pants)
+        return driver
+
+    def _assert_pile(self, deal: PantsDeal, pile: list, order: list) -> int:
+        self.assertEqual([x['owner'] for x in pile], order)
+        top_owner = pile[get_trick_winner([x['card'] for x in pile], deal.trump)]['owner']
+        team_cards = deal.team1_cards if _team(top_owner) == 0 else deal.team2_cards
+        other_cards = deal.team2_cards if _team(top_owner) == 0 else deal.team1_cards
+        for entry in pile:
+            self.assertIn(entry, team_cards)
+            self.assertNotIn(entry, other_cards)
+        return top_owner
+
+    def test_single_pants(self):
+        for seed in SEEDS:
+            with self.subTest(seed=seed):
+                driver = self._play(SinglePantsDeal, seed)
+                deal = driver.deal
+                order = driver.pants_prompts
+                top_owner = self._assert_pile(deal, deal.pant_cards, order)
+                cards, top_card, shown_owner, _, _, _, first_player = driver.shown_pants
+                self.assertEqual(shown_owner, top_owner)
+                self.assertEqual(cards, [x['card'] for x in deal.pant_cards])
+                expected_first = top_owner if _team(top_owner) != _team(deal.owner_index) else deal.owner_index
+                self.assertEqual(first_player, expected_first)
+
+    def test_double_pants(self):
+        for seed in SEEDS:
+            with self.subTest(seed=seed):
+                driver = self._play(DoublePantsDeal, seed)
+                deal = driver.deal
+                order = driver.pants_prompts
+                left_owner = self._assert_pile(deal, deal.left_pant_cards, order)
+                right_owner = self._assert_pile(deal, deal.right_pant_cards, order)
+                _, _, shown_left, _, _, shown_right, first_player = driver.shown_pants
+                self.assertEqual((shown_left, shown_right), (left_owner, right_owner))
+                owner_team = _team(deal.owner_index)
+                if _team(left_owner) != owner_team and _team(right_owner) != owner_team:
+                    expected_first = (deal.owner_index + 1) % 4
+                elif _team(left_owner) != owner_team:
+                    expected_first = left_owner
+                elif _team(right_owner) != owner_team:
+                    expected_first = right_owner
+                else:
+                    expected_first = deal.owner_index
+                self.assertEqual(first_player, expected_first)
+
+    def test_hands_after_pants(self):
+        for deal_class, size in ((SinglePantsDeal, 7), (DoublePantsDeal, 6)):
+            for seed in SEEDS:
+                with self.subTest(deal=deal_class.__name__, seed=seed):
+                    deal = deal_class(seed % 4)
+                    driver = DealDriver(deal, seed)
+                    start_tricks = deal._start_tricks
+
+                    def checked_start_tricks():
+                        start_tricks()
+                        self.assertEqual(deal.deck.get_rest_cards(), 0)
+                        self.assertEqual([deal.get_player_card_count(i) for i in range(4)], [size] * 4)
+
+                    deal._start_tricks = checked_start_tricks
+                    driver.play(self)
+
+    def test_pants_card_must_come_from_the_pants_cards(self):
+        deal = SinglePantsDeal(0)
+        driver = DealDriver(deal, 3)
+        deal.process_deal()
+        driver.prompts.clear()
+        deal.set_trump(CardSuit.HEARTS)
+        pants_mask = deal._get_pants_mask(0)
+        others = [card for card in Card.get_all() if pants_mask & card.bit == 0]
+        self.assertFalse(deal.set_pant_card(0, (others[0],)))
+        self.assertFalse(deal.set_pant_card(1, (deal.get_cards_for_pants(0)[0],)))
+        self.assertTrue(deal.set_pant_card(0, (deal.get_cards_for_pants(0)[0],)))
+        self.assertEqual(deal.player_index, 1)
+
+    def test_mirrored_pairs_are_accepted(self):
+        for seed in range(10):
+            with self.subTest(seed=seed):
+                deal = DoublePantsDeal(seed % 4)
+                driver = DealDriver(deal, seed)
+                deal.process_deal()
+                driver.prompts.clear()
+                deal.set_trump(CardSuit.SPADES)
+                while deal.is_in_pants():
+                    player_index = deal.player_index
+                    moves = deal.get_cards_for_pants(player_index)
+                    self.assertEqual(set(moves), {(right, left) for left, right in moves})
+                    left, right = moves[0]
+                    self.assertFalse(deal.set_pant_card(player_index, (left, left)))
+                    self.assertTrue(copy.deepcopy(deal).set_pant_card(player_index, (right, left)))
+                    self.assertTrue(deal.set_pant_card(player_index, (left, right)))
+
+
+if __name__ == '__main__':
+    unittest.main()
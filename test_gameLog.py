@@ -0,0 +1,141 @@
+import random
+import unittest
+
+import gameLog
+from gameLog import GameLog, ReplayError, iter_events, replay
+from deals import DealTypes
+from goatGame import GoatGame
+from models import Card, CardSuit, Deck
+from simulation import RandomPolicy, Simulation
+from test_gameSnapshot import game_state
+
+SEEDS = range(10)
+
+
+class RejectingPolicy(RandomPolicy):
+    """Plays at random, trying a move the game must refuse before every real one; a refused move must leave no
+    event behind."""
+
+    def __init__(self, test: unittest.TestCase, log: GameLog, seed: int):
+        super().__init__(seed)
+        self.test = test
+        self.log = log
+        self.rejected = 0
+
+    def _assert_rejected(self, move, *args):
+        size = len(self.log)
+        self.test.assertFalse(move(*args))
+        self.test.assertEqual(len(self.log), size)
+        self.rejected += 1
+
+    def choose_trump(self, game: GoatGame, player_id: int) -> CardSuit:
+        other_id = game.get_player_id_by_index((game.deal.owner_index + 1) % 4)
+        self._assert_rejected(game.select_trump, other_id, CardSuit.HEARTS)
+        return super().choose_trump(game, player_id)
+
+    def choose_card(self, game: GoatGame, player_id: int) -> Card:
+        hand = game.get_player_cards(player_id)
+        self._assert_rejected(game.do_player_step, player_id, next(x for x in Deck().cards if x not in hand))
+        return super().choose_card(game, player_id)
+
+    def choose_pants(self, game: GoatGame, player_id: int) -> tuple:
+        move = super().choose_pants(game, player_id)
+        if len(move) == 2:
+            self._assert_rejected(game.do_player_pants_step, player_id, move[0], move[0])
+        else:
+            pants = game.get_available_pants_pairs(player_id)
+            other = next(x for x in Deck().cards if (x,) not in pants)
+            self._assert_rejected(game.do_player_step, player_id, other)
+        return move
+
+
+class ReplayTest(unittest.TestCase):
+    def test_replay_matches_every_deal(self):
+        for seed in SEEDS:
+            with self.subTest(seed=seed):
+                # decks are shuffled with the module level generator
+                random.seed(seed)
+                log = GameLog()
+                policy = RejectingPolicy(self, log, seed)
+                simulation = Simulation(policy, game_score=100, log=log)
+                events = 0
+                for _ in range(12):
+                    simulation.run(1)
+                    game, count = replay(log.peek())
+                    self.assertGreater(count, events)
+                    events = count
+                    self.assertEqual(game_state(game), game_state(simulation.game))
+                self.assertGreater(policy.rejected, 0)
+
+    def test_last_game_of_the_log_is_replayed(self):
+        random.seed(1)
+        log = GameLog()
+        simulation = Simulation(RandomPolicy(1), log=log)
+        simulation.run(60)
+        self.assertGreater(simulation.stats.games, 1)
+        game, _ = replay(log.peek())
+        self.assertEqual(game_state(game), game_state(simulation.game))
+
+    def test_replay_until(self):
+        random.seed(2)
+        log = GameLog()
+        Simulation(RandomPolicy(2), log=log).run(1)
+        data = log.peek()
+        _, total = replay(data)
+        for until in range(total + 1):
+            game, count = replay(data, until=until)
+            self.assertEqual(count, until)
+            self.assertEqual(game is None, until == 0)
+
+
+class EventEncodingTest(unittest.TestCase):
+    def test_events_decode_to_what_was_logged(self):
+        deal = DealTypes.classes[4](3)
+        deal.deck.shuffle(random.Random(0))
+        cards = Card.get_all()
+        log = GameLog()
+        log.game_started(-2 ** 40)
+        log.player_added(2 ** 62)
+        log.deal_started(deal)
+        mark = log.card_played(3, cards[31])
+        log.rollback(mark)
+        log.trump_selected(3, CardSuit.SPADES)
+        log.card_played(3, cards[31])
+        log.pants_played(1, cards[0], cards[17])
+        self.assertEqual(list(iter_events(log.peek())), [
+            (gameLog.GAME_STARTED, (-2 ** 40,)),
+            (gameLog.PLAYER_ADDED, (2 ** 62,)),
+            (gameLog.DEAL_STARTED, (4, 3, bytes(card.index for card in deal.deck.cards))),
+            (gameLog.TRUMP_SELECTED, (3, int(CardSuit.SPADES))),
+            (gameLog.CARD_PLAYED, (3, 31)),
+            (gameLog.PANTS_PLAYED, (1, 0, 17)),
+        ])
+        for event, values in iter_events(log.peek()):
+            self.assertIsInstance(gameLog.describe(event, values), str)
+
+    def test_discard_keeps_later_events(self):
+        log = GameLog()
+        log.game_started(1)
+        written = log.peek()
+        log.player_added(2)
+        log.discard(len(written))
+        self.assertEqual(list(iter_events(log.peek())), [(gameLog.PLAYER_ADDED, (2,))])
+
+    def test_broken_logs_are_refused(self):
+        log = GameLog()
+        log.game_started(1)
+        log.player_added(2)
+        data = log.peek()
+        with self.assertRaises(ReplayError):
+            list(iter_events(data[:-1]))
+        with self.assertRaises(ReplayError):
+            list(iter_events(b'\xff'))
+        with self.assertRaises(ReplayError):
+            replay(data[9:])
+        # the same player twice is refused by the game
+        with self.assertRaises(ReplayError):
+            replay(data + data[9:])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+import random
+import unittest
+
+import gameSnapshot
+from deals import DoublePantsDeal, PantsDeal, SinglePantsDeal
+from gameLog import create_silent_game
+from goatGame import GoatGame
+from models import CardSuit
+from simulation import RandomPolicy, Simulation
+
+SEEDS = range(10)
+DEALS_PER_GAME = 12
+
+
+def game_state(game: GoatGame) -> tuple:
+    """Everything a snapshot has to keep, read from the objects rather than from a dump."""
+    state = (game.player1_id, game.player2_id, game.player3_id, game.player4_id,
+             game.first_team_total_score, game.second_team_total_score)
+    deal = game.deal
+    if deal is None:
+        return state
+    state += (type(deal), deal.owner_index, deal.player_index, deal.trump, deal.is_started, deal.is_jackpot,
+              list(deal.player_hands), list(deal.deck.cards), deal.deck.currentIndex, deal.deck.lastIndex,
+              deal.team1_cards, deal.team2_cards, deal.cards, deal.cards_history)
+    if isinstance(deal, PantsDeal):
+        state += (deal.is_trump_received, deal.pants_turns, deal.last_step_cards)
+    if isinstance(deal, SinglePantsDeal):
+        state += (deal.pant_cards,)
+    if isinstance(deal, DoublePantsDeal):
+        state += (deal.left_pant_cards, deal.right_pant_cards)
+    return state
+
+
+class CheckedPolicy(RandomPolicy):
+    """Checks a snapshot round trip of the game before every move."""
+
+    def __init__(self, test: 'SnapshotRoundTripTest', seed: int):
+        super().__init__(seed)
+        self.test = test
+
+    def choose_trump(self, game: GoatGame, player_id: int) -> CardSuit:
+        self.test.assert_round_trip(game)
+        return super().choose_trump(game, player_id)
+
+    def choose_card(self, game: GoatGame, player_id: int):
+        self.test.assert_round_trip(game)
+        return super().choose_card(game, player_id)
+
+    def choose_pants(self, game: GoatGame, player_id: int) -> tuple:
+        self.test.assert_round_trip(game)
+        return super().choose_pants(game, player_id)
+
+
+class SnapshotRoundTripTest(unittest.TestCase):
+    def setUp(self):
+        self.checked = 0
+
+    def assert_round_trip(self, game: GoatGame, is_started: bool = True, request_game_message_id: int = 42):
+        data = gameSnapshot.dump(is_started, request_game_message_id, game)
+        loaded_started, loaded_message_id, loaded = gameSnapshot.load(data, create_silent_game)
+        self.assertEqual((loaded_started, loaded_message_id), (is_started, request_game_message_id))
+        self.assertEqual(game_state(loaded), game_state(game))
+        self.assertEqual(gameSnapshot.dump(is_started, request_game_message_id, loaded), data)
+        self.checked += 1
+        return loaded
+
+    def test_every_move_of_seeded_games(self):
+        for seed in SEEDS:
+            with self.subTest(seed=seed):
+                # decks are shuffled with the module level generator
+                random.seed(seed)
+                simulation = Simulation(CheckedPolicy(self, seed), game_score=100)
+                for _ in range(DEALS_PER_GAME):
+                    simulation.run(1)
+                    # between deals, the last one completed
+                    self.assert_round_trip(simulation.game)
+        self.assertGreater(self.checked, len(SEEDS) * DEALS_PER_GAME * 8)
+
+    def test_sessions_without_a_game(self):
+        for is_started in (False, True):
+            data = gameSnapshot.dump(is_started, -1, None)
+            self.assertEqual(gameSnapshot.load(data, create_silent_game), (is_started, -1, None))
+
+    def test_game_waiting_for_players(self):
+        game = create_silent_game(1)
+        game.add_player(2)
+        loaded = self.assert_round_trip(game, request_game_message_id=7)
+        self.assertEqual(loaded.need_player_count(), 2)
+
+    def test_broken_snapshots_are_refused(self):
+        random.seed(0)
+        simulation = Simulation(RandomPolicy(0))
+        simulation.run(1)
+        data = gameSnapshot.dump(True, 1, simulation.game)
+        for size in range(len(data)):
+            with self.assertRaises(gameSnapshot.SnapshotError):
+                gameSnapshot.load(data[:size], create_silent_game)
+        with self.assertRaises(gameSnapshot.SnapshotError):
+            gameSnapshot.load(data + b'\0', create_silent_game)
+        with self.assertRaises(gameSnapshot.SnapshotError):
+            gameSnapshot.load(bytes([gameSnapshot.VERSION + 1]) + data[1:], create_silent_game)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,224 @@
+import json
+import os
+import random
+import sqlite3
+import tempfile
+import unittest
+from itertools import count
+
+from telebot import types
+
+import gameSnapshot
+from DBConnector import DBConnector
+from gameLog import GameLog, replay
+from keyboards import REMOVE_KEYBOARD
+from models import CardSuit
+from simulation import PLAYER_IDS
+
+# goat.py builds its bot and opens its database on import
+_directory = tempfile.TemporaryDirectory()
+os.environ.setdefault('GOAT_DB_PATH', os.path.join(_directory.name, 'goat.db'))
+os.environ.setdefault('GOAT_TOKEN', '1:test')
+import goat  # noqa: E402
+from goat import Goat  # noqa: E402
+
+CHAT_ID = -100
+
+
+class RecordingOutbox:
+    """Outbox.send_message and friends without a bot: calls are kept in order, nothing is delivered and no
+    callback runs."""
+
+    def __init__(self):
+        self.sent = []
+        self.edits = []
+
+    def send_message(self, chat_id: int, text: str, parse_mode: str | None = None, reply_markup=None,
+                     reply_to_message_id: int | None = None, on_sent=None, on_error=None, mergeable: bool = True):
+        self.sent.append((chat_id, text, reply_markup))
+
+    def edit_message_text(self, chat_id: int, message_id: int, text: str, parse_mode: str | None = None,
+                          delay: float = 0.0, on_sent=None, on_error=None):
+        self.edits.append((chat_id, message_id, text))
+
+    def reply_to(self, message: types.Message, text: str, **kwargs):
+        self.send_message(message.chat.id, text, reply_to_message_id=message.message_id, **kwargs)
+
+    def private_sends(self, user_id: int) -> list:
+        return [x for x in self.sent if x[0] == user_id]
+
+
+_message_ids = count(1)
+
+
+def make_message(chat_id: int, user_id: int, text: str) -> types.Message:
+    return types.Message.de_json({'message_id': next(_message_ids), 'date': 0, 'text': text,
+                                  'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'},
+                                  'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}})
+
+
+def keyboard_texts(reply_markup: str) -> set:
+    return {button['text'] for row in json.loads(reply_markup)['keyboard'] for button in row}
+
+
+class GoatTestCase(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.db = DBConnector(os.path.join(self.directory.name, 'test.db'))
+        self.outbox = RecordingOutbox()
+
+    def tearDown(self):
+        self.db.close()
+        self.directory.cleanup()
+
+    def create_session(self, live_table: bool = False) -> Goat:
+        session = Goat(None, CHAT_ID, self.db, self.outbox, live_table=live_table)
+        # there is no bot to ask for the names
+        for player_id in PLAYER_IDS:
+            session.profiles.remember(types.User(player_id, False, f'user{player_id}'))
+        return session
+
+    def start_session(self, live_table: bool = False) -> Goat:
+        """A session with four seated players, as after the joins."""
+        session = self.create_session(live_table)
+        session.is_started = True
+        session.game = session._create_game(PLAYER_IDS[0], GameLog())
+        for player_id in PLAYER_IDS[1:]:
+            session.game.add_player(player_id)
+        session._update_seats()
+        return session
+
+
+class LiveTableHandTest(GoatTestCase):
+    def _assert_keyboards_match_hands(self, session: Goat):
+        for player_id in PLAYER_IDS:
+            hand = {card.text for card in session.game.get_player_cards(player_id)}
+            sends = [x for x in self.outbox.private_sends(player_id) if x[2] is not None]
+            self.assertGreater(len(sends), 0)
+            if len(hand) == 0:
+                self.assertEqual(sends[-1][2], REMOVE_KEYBOARD)
+            else:
+                self.assertEqual(keyboard_texts(sends[-1][2]), hand, f'keyboard of {player_id}')
+
+    def _play_deal(self, session: Goat, rng: random.Random):
+        game = session.game
+        deal = game.deal
+        while not deal.is_completed():
+            if deal.is_wait_for_trump():
+                game.select_trump(game.get_owner(), CardSuit.HEARTS)
+                self._assert_keyboards_match_hands(session)
+                continue
+            player_id = game.get_player_id_by_index(deal.player_index)
+            card = rng.choice(game.get_player_cards(player_id))
+            sent_before = len(self.outbox.private_sends(player_id))
+            session.on_card_private_received(make_message(player_id, player_id, card.text), card)
+            # one message with the new keyboard, none when the deal has just sent the next hand
+            self.assertLessEqual(len(self.outbox.private_sends(player_id)) - sent_before, 1)
+            if not deal.is_jackpot:
+                self._assert_keyboards_match_hands(session)
+
+    def test_keyboard_follows_the_hand(self):
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                self.outbox.sent.clear()
+                session = self.start_session(live_table=True)
+                rng = random.Random(seed)
+                session.game.first_deal()
+                self._play_deal(session, rng)
+                owner = session.game.get_next_deal_owner()
+                self.assertTrue(session.game.start_next_deal(owner, 'По 3'))
+                self._play_deal(session, rng)
+
+    def test_card_not_in_hand_is_not_mistaken_for_a_turn(self):
+        session = self.start_session(live_table=True)
+        game = session.game
+        game.first_deal()
+        game.select_trump(game.get_owner(), CardSuit.HEARTS)
+        player_id = game.get_owner()
+        # e.g. a button of an older keyboard
+        card = game.get_player_cards(game.get_player_id_by_index((game.deal.owner_index + 1) % 4))[0]
+        self.outbox.sent.clear()
+        session.on_card_private_received(make_message(player_id, player_id, card.text), card)
+        texts = [x[1] for x in self.outbox.private_sends(player_id)]
+        self.assertEqual(texts[0], 'У тебя нет такой карты')
+        self.assertEqual(keyboard_texts(self.outbox.private_sends(player_id)[-1][2]),
+                         {x.text for x in game.get_player_cards(player_id)})
+
+    def test_messages_mode_sends_no_hand_per_play(self):
+        session = self.start_session()
+        game = session.game
+        game.first_deal()
+        game.select_trump(game.get_owner(), CardSuit.HEARTS)
+        player_id = game.get_owner()
+        sent_before = len(self.outbox.private_sends(player_id))
+        card = game.get_player_cards(player_id)[0]
+        session.on_card_received(make_message(CHAT_ID, player_id, card.text), card)
+        self.assertEqual(len(self.outbox.private_sends(player_id)), sent_before)
+
+
+class SnapshotTest(GoatTestCase):
+    def _play_cards(self, session: Goat, rng: random.Random, count: int):
+        game = session.game
+        for _ in range(count):
+            player_id = game.get_player_id_by_index(game.deal.player_index)
+            card = rng.choice(game.get_player_cards(player_id))
+            session.on_card_received(make_message(CHAT_ID, player_id, card.text), card)
+
+    def _start_deal(self, session: Goat):
+        session.game.first_deal()
+        session.game.select_trump(session.game.get_owner(), CardSuit.HEARTS)
+
+    def test_resumed_session_continues_the_game(self):
+        for seed in range(5):
+            with self.subTest(seed=seed):
+                session = self.start_session()
+                self._start_deal(session)
+                self._play_cards(session, random.Random(seed), 13)
+                resumed = self.create_session()
+                self.assertTrue(resumed.resume())
+                self.assertTrue(resumed.is_started)
+                self.assertEqual(resumed.seats, session.seats)
+                self.assertEqual(gameSnapshot.dump(True, -1, resumed.game), gameSnapshot.dump(True, -1, session.game))
+                # both sessions take the same cards to the end of the deal
+                for target in (session, resumed):
+                    rng = random.Random(seed + 100)
+                    self._play_cards(target, rng, 32 - 13)
+                    self.assertTrue(target.game.deal.is_completed())
+                self.assertEqual(resumed.game.get_score(), session.game.get_score())
+
+    def test_broken_snapshot_is_dropped(self):
+        self.db.save_snapshot(CHAT_ID, b'\x01broken')
+        with self.assertLogs('goat.bot', 'ERROR'):
+            self.assertFalse(self.create_session().resume())
+        self.assertIsNone(self.db.load_snapshot(CHAT_ID))
+
+    def test_events_survive_a_failed_write(self):
+        session = self.start_session()
+        self._start_deal(session)
+        save_snapshot = self.db.save_snapshot
+
+        def locked(*args):
+            raise sqlite3.OperationalError('database is locked')
+
+        self.db.save_snapshot = locked
+        with self.assertRaises(sqlite3.OperationalError):
+            self._play_cards(session, random.Random(0), 1)
+        self.assertGreater(len(session.game.log), 0)
+        self.db.save_snapshot = save_snapshot
+        self._play_cards(session, random.Random(1), 1)
+        self.assertEqual(len(session.game.log), 0)
+        game, _ = replay(self.db.load_events(CHAT_ID))
+        self.assertEqual(gameSnapshot.dump(True, -1, game), gameSnapshot.dump(True, -1, session.game))
+
+
+class PrivateStartTest(unittest.TestCase):
+    def test_private_start_creates_no_session(self):
+        sessions = len(goat.registry)
+        goat.start(make_message(7, 7, '/start'))
+        self.assertEqual(len(goat.registry), sessions)
+        self.assertIsNone(goat.registry.get(7))
+        self.assertTrue(goat.private_chats.get(7))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,161 @@
+import threading
+import unittest
+
+from goatRegistry import GoatRegistry
+
+TTL = GoatRegistry.FINISHED_SESSION_TTL
+
+
+class FakeSession:
+    def __init__(self, chat_id: int):
+        self.chat_id = chat_id
+        self.is_started = False
+
+
+class RegistryTestCase(unittest.TestCase):
+    def setUp(self):
+        self.now = 1000.0
+        self.created = []
+        self.evicted = []
+        self.unloaded = []
+
+    def create_registry(self, **kwargs) -> GoatRegistry:
+        self.registry = GoatRegistry(self._create, clock=lambda: self.now, on_evict=self.evicted.append,
+                                     on_unload=self.unloaded.append, **kwargs)
+        return self.registry
+
+    def _create(self, chat_id: int) -> FakeSession:
+        session = FakeSession(chat_id)
+        self.created.append(chat_id)
+        return session
+
+
+class ExpiryTest(RegistryTestCase):
+    def test_finished_and_started_sessions_expire_after_their_ttl(self):
+        registry = self.create_registry()
+        finished = registry.get_or_create(-1)
+        started = registry.get_or_create(-2)
+        started.is_started = True
+        self.now += TTL - 1
+        self.assertEqual(registry.evict_idle(), 0)
+        self.now += 1
+        self.assertEqual(registry.evict_idle(), 1)
+        self.assertEqual(self.evicted, [finished])
+        self.assertIsNone(registry.get(-1))
+        self.now += GoatRegistry.ACTIVE_SESSION_TTL - TTL - 1
+        self.assertEqual(registry.evict_idle(), 0)
+        self.now += 1
+        self.assertEqual(registry.evict_idle(), 1)
+        self.assertEqual(self.evicted, [finished, started])
+        self.assertEqual(len(registry), 0)
+
+    def test_activity_keeps_a_session(self):
+        registry = self.create_registry()
+        session = registry.get_or_create(-1)
+        for _ in range(3):
+            self.now += TTL - 1
+            self.assertIs(registry.get(-1), session)
+        self.assertEqual(registry.evict_idle(), 0)
+
+    def test_new_session_evicts_idle_ones(self):
+        registry = self.create_registry()
+        registry.get_or_create(-1)
+        self.now += TTL
+        registry.get_or_create(-2)
+        self.assertEqual([x.chat_id for x in self.evicted], [-1])
+        self.assertEqual(len(registry), 1)
+
+    def _is_lock_free(self) -> bool:
+        # the lock is reentrant, so it is tried from another thread
+        acquired = []
+
+        def try_lock():
+            acquired.append(self.registry._lock.acquire(timeout=1))
+            if acquired[0]:
+                self.registry._lock.release()
+
+        thread = threading.Thread(target=try_lock)
+        thread.start()
+        thread.join()
+        return acquired[0]
+
+    def test_callbacks_run_outside_the_lock(self):
+        free = []
+        self.registry = GoatRegistry(self._create, clock=lambda: self.now,
+                                     on_evict=lambda x: free.append(self._is_lock_free()),
+                                     on_unload=lambda x: free.append(self._is_lock_free()), max_sessions=2)
+        self.registry.get_or_create(-1)
+        self.registry.get_or_create(-2)
+        # -1 is unloaded for room
+        self.registry.get_or_create(-3)
+        self.now += TTL
+        self.registry.evict_idle()
+        self.assertEqual(free, [True, True, True])
+
+
+class SizeBoundTest(RegistryTestCase):
+    def test_least_recently_used_sessions_are_unloaded(self):
+        registry = self.create_registry(max_sessions=3)
+        first, second, third = (registry.get_or_create(x) for x in (-1, -2, -3))
+        registry.get(-1)
+        registry.get_or_create(-4)
+        self.assertEqual(self.unloaded, [second])
+        registry.get_or_create(-5)
+        self.assertEqual(self.unloaded, [second, third])
+        self.assertEqual(len(registry), 3)
+        self.assertIs(registry.get(-1), first)
+        self.assertEqual(self.evicted, [])
+
+    def test_unloaded_game_is_loaded_again_for_its_players(self):
+        registry = self.create_registry(max_sessions=2)
+        registry.get_or_create(-1).is_started = True
+        registry.set_seats(-1, [1, 2, 3, 4])
+        registry.get_or_create(-2)
+        registry.get_or_create(-3)
+        self.assertEqual([x.chat_id for x in self.unloaded], [-1])
+        self.assertEqual(registry.get_seated_chat(1), -1)
+        session = registry.find_by_player(1)
+        self.assertEqual(session.chat_id, -1)
+        self.assertEqual(self.created, [-1, -2, -3, -1])
+        self.assertIs(registry.find_by_player(2), session)
+
+
+class SeatTest(RegistryTestCase):
+    def test_seats_are_replaced(self):
+        registry = self.create_registry()
+        session = registry.get_or_create(-1)
+        registry.set_seats(-1, [1, 2])
+        self.assertIs(registry.find_by_player(1), session)
+        registry.set_seats(-1, [2, 3])
+        self.assertIsNone(registry.find_by_player(1))
+        self.assertIs(registry.find_by_player(3), session)
+        registry.set_seats(-1, [])
+        self.assertIsNone(registry.get_seated_chat(2))
+        self.assertEqual(registry._chat_seats, {})
+
+    def test_user_moving_to_another_game_keeps_the_new_seat(self):
+        registry = self.create_registry()
+        registry.get_or_create(-1)
+        registry.get_or_create(-2)
+        registry.set_seats(-1, [1, 2])
+        registry.set_seats(-2, [2, 3])
+        registry.set_seats(-1, [])
+        self.assertEqual(registry.get_seated_chat(2), -2)
+
+    def test_removed_and_expired_sessions_drop_their_seats(self):
+        registry = self.create_registry()
+        registry.get_or_create(-1)
+        registry.set_seats(-1, [1, 2])
+        registry.get_or_create(-2)
+        registry.set_seats(-2, [3, 4])
+        self.assertEqual(registry.remove(-1).chat_id, -1)
+        self.assertIsNone(registry.get_seated_chat(1))
+        self.assertIsNone(registry.remove(-1))
+        self.now += TTL
+        registry.evict_idle()
+        self.assertIsNone(registry.find_by_player(3))
+        self.assertEqual((registry._seats, registry._chat_seats), ({}, {}))
+
+
+if __name__ == '__main__':
+    unittest.main()
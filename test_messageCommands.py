@@ -0,0 +1,149 @@
+import os
+import tempfile
+import unittest
+
+from telebot import types
+
+from messageCommands import CommandFilter, CommandType, classify
+from models import Card, CardSuit
+
+# goat.py builds its bot and opens its database on import
+_directory = tempfile.TemporaryDirectory()
+os.environ.setdefault('GOAT_DB_PATH', os.path.join(_directory.name, 'goat.db'))
+os.environ.setdefault('GOAT_TOKEN', '1:test')
+import goat  # noqa: E402
+
+GROUP = -100
+USER = 7
+BOT = {'id': 1, 'is_bot': True, 'first_name': 'Goat', 'username': 'GoatGroupBot'}
+OTHER_BOT = {'id': 2, 'is_bot': True, 'first_name': 'Other', 'username': 'OtherBot'}
+PLAYER = {'id': 8, 'is_bot': False, 'first_name': 'Player'}
+
+
+def make_message(text: str | None, chat_id: int = GROUP, reply_to: dict | None = None) -> types.Message:
+    chat = {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'}
+    data = {'message_id': 2, 'date': 0, 'chat': chat, 'from': {'id': USER, 'is_bot': False, 'first_name': 'u'}}
+    if text is not None:
+        data['text'] = text
+    else:
+        data['sticker'] = {'file_id': 'a', 'file_unique_id': 'a', 'type': 'regular', 'width': 1, 'height': 1,
+                           'is_animated': False, 'is_video': False}
+    if reply_to is not None:
+        data['reply_to_message'] = {'message_id': 1, 'date': 0, 'chat': chat, 'text': 'prompt', 'from': reply_to}
+    return types.Message.de_json(data)
+
+
+def card(text: str) -> Card:
+    return Card.try_parse(text)[1]
+
+
+# text, chat, replied to, expected command type, expected value
+CASES = [
+    # private chat: cards and card pairs only
+    ('7♦', USER, None, CommandType.PRIVATE_CARD, card('7♦')),
+    (' 10♥ ', USER, None, CommandType.PRIVATE_CARD, card('10♥')),
+    ('т♠', USER, None, CommandType.PRIVATE_CARD, card('Т♠')),
+    ('7♦ 8♦', USER, None, CommandType.CARD_PAIR, (card('7♦'), card('8♦'))),
+    ('Погнали', USER, None, None, None),
+    ('♦', USER, None, None, None),
+    # group: only answers to the bot, except for card pairs
+    ('7♦', GROUP, BOT, CommandType.CARD, card('7♦')),
+    ('7♦', GROUP, None, None, None),
+    ('7♦', GROUP, OTHER_BOT, None, None),
+    ('7♦', GROUP, PLAYER, None, None),
+    ('10♥ Т♠', GROUP, None, CommandType.CARD_PAIR, (card('10♥'), card('Т♠'))),
+    ('7♦  8♦', GROUP, BOT, None, None),
+    ('7♦ 8♦ 9♦', GROUP, BOT, None, None),
+    ('Погнали', GROUP, BOT, CommandType.JOIN, None),
+    ('погнали', GROUP, BOT, CommandType.JOIN, None),
+    ('Пас', GROUP, BOT, CommandType.JOIN, None),
+    ('Погнали', GROUP, None, None, None),
+    ('♥', GROUP, BOT, CommandType.TRUMP, CardSuit.HEARTS),
+    ('Без козыря', GROUP, BOT, CommandType.TRUMP, CardSuit.NONE),
+    ('♥', GROUP, OTHER_BOT, None, None),
+    ('По 3', GROUP, BOT, CommandType.DEAL, 'По 3'),
+    ('двойные штаны', GROUP, BOT, CommandType.DEAL, 'Двойные штаны'),
+    ('По 3', GROUP, None, None, None),
+    # bot commands are matched by telebot, not here
+    ('/deal@GoatGroupBot', GROUP, None, None, None),
+    ('/start', USER, None, None, None),
+    ('X♦', GROUP, BOT, None, None),
+    ('', GROUP, BOT, None, None),
+    (None, GROUP, BOT, None, None),
+]
+
+
+def _value(command) -> object:
+    if command.type in (CommandType.CARD, CommandType.PRIVATE_CARD):
+        return command.card
+    if command.type is CommandType.CARD_PAIR:
+        return command.cards
+    if command.type is CommandType.TRUMP:
+        return command.trump
+    return command.deal_name
+
+
+class ClassifyTest(unittest.TestCase):
+    def test_cases(self):
+        for text, chat_id, reply_to, command_type, value in CASES:
+            with self.subTest(text=text, chat_id=chat_id, reply_to=reply_to and reply_to['first_name']):
+                command = classify(make_message(text, chat_id, reply_to))
+                if command_type is None:
+                    self.assertIsNone(command)
+                    continue
+                self.assertIs(command.type, command_type)
+                self.assertEqual(_value(command), value)
+
+    def test_command_filter_matches_only_the_classified_type(self):
+        for text, chat_id, reply_to, command_type, _ in CASES:
+            message = make_message(text, chat_id, reply_to)
+            for checked_type in CommandType:
+                with self.subTest(text=text, chat_id=chat_id, checked_type=checked_type):
+                    self.assertEqual(CommandFilter.check(message, checked_type), checked_type is command_type)
+
+    def test_result_is_kept_on_the_message(self):
+        message = make_message('7♦', GROUP, BOT)
+        command = classify(message)
+        message.text = '8♦'
+        self.assertIs(classify(message), command)
+        self.assertTrue(CommandFilter.check(message, CommandType.CARD))
+        # no command is remembered too
+        message = make_message('hello', GROUP, BOT)
+        self.assertIsNone(classify(message))
+        message.text = '8♦'
+        self.assertIsNone(classify(message))
+
+    def test_cards_are_shared(self):
+        self.assertIs(classify(make_message('7♦', GROUP, BOT)), classify(make_message('7♦', GROUP, BOT)))
+        self.assertIs(classify(make_message('7♦', USER)).card, classify(make_message('7♦', GROUP, BOT)).card)
+
+
+# text, chat, replied to, goat handler
+DISPATCH_CASES = [
+    ('/start', USER, None, 'start'),
+    ('/start@GoatGroupBot', GROUP, None, 'start'),
+    ('/deal@GoatGroupBot', GROUP, None, 'deal'),
+    ('/stop', GROUP, None, 'stop'),
+    ('Погнали', GROUP, BOT, 'on_apply_to_game_received'),
+    ('♠', GROUP, BOT, 'on_trump_received'),
+    ('7♦', GROUP, BOT, 'on_card_received'),
+    ('7♦', USER, None, 'on_card_private_received'),
+    ('7♦ 8♦', USER, None, 'on_card_pair_received'),
+    ('7♦ 8♦', GROUP, None, 'on_card_pair_received'),
+    ('По 4', GROUP, BOT, 'on_deal_received'),
+    ('7♦', GROUP, None, 'on_message_received'),
+    ('Погнали', USER, None, 'on_message_received'),
+]
+
+
+class DispatchTest(unittest.TestCase):
+    def test_messages_reach_their_handler(self):
+        for text, chat_id, reply_to, handler_name in DISPATCH_CASES:
+            with self.subTest(text=text, chat_id=chat_id):
+                message = make_message(text, chat_id, reply_to)
+                handler = next(x for x in goat.bot.message_handlers if goat.bot._test_message_handler(x, message))
+                self.assertEqual(handler['function'].__name__, handler_name)
+
+
+if __name__ == '__main__':
+    unittest.main()
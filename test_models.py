@@ -0,0 +1,108 @@
+import random
+import unittest
+from itertools import product
+
+from models import Card, CardKind, CardSuit, get_trick_winner
+
+# The comparison rules as Card had them before the lookup table, written over (kind, suit) so that they do not
+# share any code with models.
+_VALUES = {CardKind.ACE: 11, CardKind.KING: 4, CardKind.QUEEN: 3, CardKind.JACK: 2, CardKind.TEN: 10,
+           CardKind.NINE: 0, CardKind.EIGHT: 0, CardKind.SEVEN: 0, CardKind.SIX: 0}
+TRUMPS = list(CardSuit) + [None]
+
+
+def _is_default_trump(card: tuple) -> bool:
+    kind, suit = card
+    return (kind == CardKind.SIX and suit == CardSuit.CLUBS) or kind == CardKind.QUEEN or kind == CardKind.JACK
+
+
+def _is_trump(card: tuple, trump_suit) -> bool:
+    if trump_suit is CardSuit.NONE:
+        return _is_default_trump(card)
+    return card[1] == trump_suit or _is_default_trump(card)
+
+
+def _is_greater_by_kind(card: tuple, other: tuple) -> bool:
+    if card == (CardKind.SIX, CardSuit.CLUBS):
+        return True
+    if other == (CardKind.SIX, CardSuit.CLUBS):
+        return False
+    return _VALUES[card[0]] > _VALUES[other[0]]
+
+
+def _greater_than(card: tuple, other: tuple, trump_suit) -> bool:
+    if card == other:
+        return False
+    card_default, other_default = _is_default_trump(card), _is_default_trump(other)
+    if trump_suit is CardSuit.NONE:
+        if card_default == other_default:
+            return _is_greater_by_kind(card, other)
+        return card_default and not other_default
+    if (card_default or card[1] == trump_suit) and (other_default or other[1] == trump_suit):
+        return _is_greater_by_kind(card, other)
+    if not card_default and card[1] != trump_suit and not other_default and other[1] != trump_suit:
+        return _is_greater_by_kind(card, other)
+    if (card_default or card[1] == trump_suit) and not other_default and other[1] != trump_suit:
+        return True
+    if not card_default and card[1] != trump_suit and (other_default or other[1] == trump_suit):
+        return False
+    return True
+
+
+def _less_than(card: tuple, other: tuple, trump_suit) -> bool:
+    if card == other:
+        return False
+    return not _greater_than(card, other, trump_suit)
+
+
+def _trick_winner(cards: list[tuple], trump_suit) -> int:
+    # the loop of Deal._get_bribe_data
+    top_index = 0
+    for i in range(1, len(cards)):
+        if _less_than(cards[top_index], cards[i], trump_suit):
+            top_index = i
+    return top_index
+
+
+def _key(card: Card) -> tuple:
+    return card.kind, card.suit
+
+
+class CardComparisonTest(unittest.TestCase):
+    def test_all_cards(self):
+        cards = Card.get_all()
+        self.assertEqual(len(cards), Card.COUNT)
+        self.assertEqual(len({_key(card) for card in cards}), Card.COUNT)
+
+    def test_is_trump(self):
+        for trump, card in product(TRUMPS, Card.get_all()):
+            with self.subTest(trump=trump, card=card):
+                self.assertEqual(card.is_trump(trump), _is_trump(_key(card), trump))
+
+    def test_greater_than_and_less_than(self):
+        for trump, card, other in product(TRUMPS, Card.get_all(), Card.get_all()):
+            with self.subTest(trump=trump, card=card, other=other):
+                self.assertEqual(card.greater_than(other, trump), _greater_than(_key(card), _key(other), trump))
+                self.assertEqual(card.less_than(other, trump), _less_than(_key(card), _key(other), trump))
+
+    def test_trick_winner_of_every_pair_and_triple(self):
+        cards = Card.get_all()
+        for trump in TRUMPS:
+            for size in (1, 2, 3):
+                for trick in product(cards, repeat=size):
+                    expected = _trick_winner([_key(card) for card in trick], trump)
+                    if get_trick_winner(list(trick), trump) != expected:
+                        self.fail(f'{trick} with trump {trump}: expected {expected}')
+
+    def test_trick_winner_of_random_tricks(self):
+        rng = random.Random(0)
+        cards = Card.get_all()
+        for _ in range(20000):
+            trump = rng.choice(TRUMPS)
+            trick = rng.sample(cards, 4)
+            self.assertEqual(get_trick_winner(trick, trump), _trick_winner([_key(card) for card in trick], trump),
+                             f'{trick} with trump {trump}')
+
+
+if __name__ == '__main__':
+    unittest.main()
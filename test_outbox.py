@@ -0,0 +1,186 @@
+import threading
+import unittest
+
+import requests
+from telebot.apihelper import ApiTelegramException
+
+from outbox import OutboundMessage, Outbox
+
+
+def api_error(error_code: int, retry_after: int | None = None) -> ApiTelegramException:
+    result_json = {'ok': False, 'error_code': error_code, 'description': f'error {error_code}'}
+    if retry_after is not None:
+        result_json['parameters'] = {'retry_after': retry_after}
+    return ApiTelegramException('sendMessage', None, result_json)
+
+
+class FakeBot:
+    """Fails with the queued errors first, then answers every call with the (chat_id, text) it got."""
+
+    def __init__(self, errors=()):
+        self.errors = list(errors)
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def send_message(self, chat_id: int, text: str, parse_mode=None, reply_markup=None, reply_to_message_id=None):
+        return self._call('send', chat_id, text)
+
+    def edit_message_text(self, text: str, chat_id: int, message_id: int, parse_mode=None):
+        return self._call('edit', chat_id, text)
+
+    def _call(self, method: str, chat_id: int, text: str):
+        with self._lock:
+            self.calls.append((method, chat_id, text))
+            if len(self.errors) > 0:
+                raise self.errors.pop(0)
+        return chat_id, text
+
+
+class FakePrivateChats:
+    def __init__(self):
+        self.reachable = {}
+
+    def mark_reachable(self, user_id: int):
+        self.reachable[user_id] = True
+
+    def mark_unreachable(self, user_id: int):
+        self.reachable[user_id] = False
+
+
+class OutboxSendTest(unittest.TestCase):
+    """Outbox._send on a fake clock, without the worker threads."""
+
+    def setUp(self):
+        self.now = 100.0
+        self.private_chats = FakePrivateChats()
+
+    def create_outbox(self, errors=()) -> Outbox:
+        self.bot = FakeBot(errors)
+        return Outbox(self.bot, clock=lambda: self.now, private_chats=self.private_chats)
+
+    def test_server_errors_back_off_and_give_up(self):
+        outbox = self.create_outbox([api_error(502)] * Outbox.MAX_ATTEMPTS)
+        errors = []
+        message = OutboundMessage(-1, 'text', on_error=errors.append)
+        retries = [outbox._send(message) for _ in range(Outbox.MAX_ATTEMPTS)]
+        self.assertEqual(retries[:-1], [self.now + Outbox.BACKOFF * 2 ** i for i in range(Outbox.MAX_ATTEMPTS - 1)])
+        self.assertIsNone(retries[-1])
+        self.assertEqual(len(errors), 1)
+        self.assertEqual(errors[0].error_code, 502)
+
+    def test_network_errors_are_retried(self):
+        outbox = self.create_outbox([requests.ConnectionError('reset')])
+        sent = []
+        message = OutboundMessage(-1, 'text', on_sent=sent.append)
+        self.assertEqual(outbox._send(message), self.now + Outbox.BACKOFF)
+        self.assertIsNone(outbox._send(message))
+        self.assertEqual(sent, [(-1, 'text')])
+
+    def test_programming_errors_are_not_retried(self):
+        outbox = self.create_outbox([TypeError('bad argument')])
+        errors = []
+        with self.assertLogs('goat.outbox', 'ERROR'):
+            self.assertIsNone(outbox._send(OutboundMessage(-1, 'text', on_error=errors.append)))
+        self.assertEqual(len(self.bot.calls), 1)
+        self.assertIsInstance(errors[0], TypeError)
+
+    def test_client_errors_are_not_retried(self):
+        outbox = self.create_outbox([api_error(400)])
+        errors = []
+        self.assertIsNone(outbox._send(OutboundMessage(-1, 'text', on_error=errors.append)))
+        self.assertEqual(len(errors), 1)
+
+    def test_rate_limit_pauses_every_chat(self):
+        outbox = self.create_outbox([api_error(429, retry_after=7)])
+        self.assertEqual(outbox._send(OutboundMessage(-1, 'text')), self.now + 7)
+        self.assertGreaterEqual(outbox._global_bucket.delay(self.now), 7)
+        self.now += 8
+        self.assertEqual(outbox._global_bucket.delay(self.now), 0)
+
+    def test_rate_limit_retries_are_capped(self):
+        outbox = self.create_outbox([api_error(429, retry_after=1)] * Outbox.MAX_ATTEMPTS)
+        errors = []
+        message = OutboundMessage(-1, 'text', on_error=errors.append)
+        retries = [outbox._send(message) for _ in range(Outbox.MAX_ATTEMPTS)]
+        self.assertNotIn(None, retries[:-1])
+        self.assertIsNone(retries[-1])
+        self.assertEqual(len(errors), 1)
+
+    def test_private_sends_update_reachability(self):
+        outbox = self.create_outbox([api_error(403)])
+        errors = []
+        outbox._send(OutboundMessage(5, 'text', on_error=errors.append))
+        self.assertEqual(self.private_chats.reachable, {5: False})
+        self.assertEqual(len(errors), 1)
+        outbox._send(OutboundMessage(5, 'text'))
+        self.assertEqual(self.private_chats.reachable, {5: True})
+        # group sends and edits say nothing about private chats
+        outbox._send(OutboundMessage(-1, 'text'))
+        outbox._send(OutboundMessage(6, 'text', edit_message_id=1))
+        self.assertEqual(self.private_chats.reachable, {5: True})
+
+    def test_failing_callback_does_not_stop_the_others(self):
+        outbox = self.create_outbox()
+        sent = []
+        message = OutboundMessage(-1, 'first', on_sent=lambda x: 1 / 0)
+        message.merge(OutboundMessage(-1, 'second', on_sent=sent.append))
+        with self.assertLogs('goat.outbox', 'ERROR'):
+            outbox._send(message)
+        self.assertEqual(sent, [(-1, 'first\r\n\r\nsecond')])
+
+
+class OutboxQueueTest(unittest.TestCase):
+    def setUp(self):
+        self.bot = FakeBot()
+        self.outbox = Outbox(self.bot)
+
+    def test_consecutive_messages_are_merged(self):
+        sent = []
+        self.outbox.send_message(-1, 'a', on_sent=sent.append)
+        self.outbox.send_message(-1, 'b', on_sent=sent.append)
+        self.outbox.send_message(-1, 'c', reply_markup='keyboard')
+        self.outbox.send_message(-1, 'd')
+        first = self.outbox._take_batch(-1)
+        self.assertEqual(first.text, 'a\r\n\r\nb\r\n\r\nc')
+        self.assertEqual(first.reply_markup, 'keyboard')
+        self.assertEqual(len(first.callbacks), 2)
+        # a message with a keyboard ends a batch
+        self.assertEqual(self.outbox._take_batch(-1).text, 'd')
+
+    def test_messages_that_must_stay_apart_are_not_merged(self):
+        self.outbox.send_message(-1, 'a')
+        self.outbox.send_message(-1, 'b', parse_mode='MarkdownV2')
+        self.outbox.send_message(-1, 'c', parse_mode='MarkdownV2', mergeable=False)
+        self.outbox.send_message(-1, 'd', parse_mode='MarkdownV2', reply_to_message_id=3)
+        self.assertEqual([self.outbox._take_batch(-1).text for _ in range(4)], ['a', 'b', 'c', 'd'])
+
+    def test_queued_edit_is_replaced(self):
+        self.outbox.send_message(-1, 'a', mergeable=False)
+        self.outbox.edit_message_text(-1, 10, 'first')
+        self.outbox.edit_message_text(-1, 10, 'second')
+        self.outbox._take_batch(-1)
+        edit = self.outbox._take_batch(-1)
+        self.assertEqual((edit.edit_message_id, edit.text), (10, 'second'))
+        self.assertEqual(len(self.outbox._queues[-1]), 0)
+
+
+class OutboxDeliveryTest(unittest.TestCase):
+    def test_retried_messages_keep_their_order(self):
+        bot = FakeBot([requests.ConnectionError('reset'), api_error(500)])
+        outbox = Outbox(bot)
+        outbox.BACKOFF = 0.01
+        outbox.start()
+        done = threading.Event()
+        for i in range(3):
+            outbox.send_message(-1, str(i), mergeable=False)
+            outbox.send_message(5, str(i), mergeable=False, on_sent=lambda x, i=i: i == 2 and done.set())
+        outbox.stop()
+        self.assertTrue(done.is_set())
+        for chat_id in (-1, 5):
+            delivered = [text for _, x, text in bot.calls if x == chat_id]
+            self.assertEqual(delivered[-3:], ['0', '1', '2'])
+        self.assertEqual(outbox.pending_count(), 0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,174 @@
+import queue
+import unittest
+from collections import Counter
+from itertools import count
+
+from shardSupervisor import HashRing, ShardSupervisor, _Worker
+
+_message_ids = count(1)
+
+
+def make_message(chat_id: int, user_id: int, text: str, reply_to_bot: bool = False) -> dict:
+    message = {'message_id': next(_message_ids), 'date': 0, 'text': text,
+               'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'},
+               'from': {'id': user_id, 'is_bot': False, 'first_name': f'user{user_id}'}}
+    if reply_to_bot:
+        message['reply_to_message'] = {'message_id': 1, 'date': 0, 'text': 'Кто играет?',
+                                       'chat': message['chat'],
+                                       'from': {'id': 1, 'is_bot': True, 'first_name': 'Goat',
+                                                'username': 'GoatGroupBot'}}
+    return message
+
+
+class HashRingTest(unittest.TestCase):
+    KEYS = range(-5000, 5000)
+
+    def test_empty_ring(self):
+        ring = HashRing()
+        self.assertEqual(len(ring), 0)
+        self.assertIsNone(ring.get_node(1))
+
+    def test_placement_is_stable_and_even(self):
+        ring = HashRing(range(4))
+        self.assertEqual(len(ring), 4)
+        other = HashRing(reversed(range(4)))
+        self.assertEqual([ring.get_node(x) for x in self.KEYS], [other.get_node(x) for x in self.KEYS])
+        shares = Counter(ring.get_node(x) for x in self.KEYS)
+        for node in range(4):
+            self.assertAlmostEqual(shares[node] / len(self.KEYS), 0.25, delta=0.05)
+
+    def test_only_the_share_of_a_changed_node_moves(self):
+        ring = HashRing(range(4))
+        before = {x: ring.get_node(x) for x in self.KEYS}
+        ring.add_node(4)
+        moved = [x for x in self.KEYS if ring.get_node(x) != before[x]]
+        self.assertGreater(len(moved), 0)
+        self.assertTrue(all(ring.get_node(x) == 4 for x in moved))
+        ring.remove_node(4)
+        self.assertEqual({x: ring.get_node(x) for x in self.KEYS}, before)
+
+
+class FakeProcess:
+    exitcode = None
+
+    def __init__(self):
+        self.alive = True
+
+    def is_alive(self) -> bool:
+        return self.alive
+
+    def join(self, timeout: float | None = None):
+        pass
+
+    def terminate(self):
+        self.alive = False
+
+
+class LocalSupervisor(ShardSupervisor):
+    """The workers are plain queues read by the test, no process is started."""
+
+    def _start_worker(self, shard_id: int):
+        self._workers[shard_id] = _Worker(shard_id, FakeProcess(), queue.Queue())
+
+
+class ShardRoutingTest(unittest.TestCase):
+    def setUp(self):
+        self.supervisor = LocalSupervisor(2)
+
+    def tearDown(self):
+        self.supervisor.stop()
+
+    def take(self, shard_id: int) -> list:
+        inbox = self.supervisor._workers[shard_id].inbox
+        items = []
+        while not inbox.empty():
+            action, chat_id, data = inbox.get_nowait()
+            items.append((action, chat_id, data['text'] if data is not None else None))
+        return items
+
+    def take_all(self) -> dict:
+        return {shard_id: self.take(shard_id) for shard_id in self.supervisor.get_worker_ids()}
+
+    def chat_on(self, shard_id: int) -> int:
+        return next(x for x in range(-1, -1000, -1) if self.supervisor._ring.get_node(x) == shard_id)
+
+    def test_group_chat_is_placed_once(self):
+        chat_id = self.chat_on(1)
+        self.supervisor.route(make_message(chat_id, 10, 'a'))
+        self.supervisor.route(make_message(chat_id, 10, 'b'))
+        self.assertEqual(self.take_all(), {0: [], 1: [('acquire', chat_id, None), ('update', chat_id, 'a'),
+                                                      ('update', chat_id, 'b')]})
+        self.assertEqual(self.supervisor.get_shard(chat_id), 1)
+
+    def test_private_messages_follow_the_seat(self):
+        chat_id = self.chat_on(0)
+        user_id = next(x for x in range(1, 1000) if self.supervisor._ring.get_node(x) == 1)
+        self.supervisor.route(make_message(user_id, user_id, '/start'))
+        # not seated: by the user's own chat, without placing it
+        self.assertEqual(self.take_all(), {0: [], 1: [('update', user_id, '/start')]})
+        self.assertIsNone(self.supervisor.get_shard(user_id))
+        self.supervisor.route(make_message(chat_id, 10, '/deal'))
+        self.supervisor._on_event('seats', chat_id, frozenset({user_id, 11}))
+        self.take_all()
+        self.supervisor.route(make_message(user_id, user_id, '7♦'))
+        self.assertEqual(self.take_all(), {0: [('update', chat_id, '7♦')], 1: []})
+        self.supervisor._on_event('seats', chat_id, frozenset({11}))
+        self.assertIsNone(self.supervisor.get_seated_chat(user_id))
+        self.assertEqual(self.supervisor.get_seated_chat(11), chat_id)
+
+    def test_join_to_a_second_chat_is_refused(self):
+        first, second = self.chat_on(0), self.chat_on(1)
+        self.supervisor.route(make_message(first, 10, 'Погнали', reply_to_bot=True))
+        # the seats of the first chat are not reported yet
+        self.supervisor.route(make_message(second, 10, 'Погнали', reply_to_bot=True))
+        self.supervisor.route(make_message(second, 11, 'Погнали', reply_to_bot=True))
+        self.assertEqual(self.take_all(), {0: [('acquire', first, None), ('join', first, 'Погнали')],
+                                           1: [('acquire', second, None), ('reject_join', second, 'Погнали'),
+                                               ('join', second, 'Погнали')]})
+        self.supervisor._on_event('seats', first, frozenset({10}))
+        self.supervisor._on_event('joined', first, 10)
+        self.supervisor.route(make_message(second, 10, 'Погнали', reply_to_bot=True))
+        self.assertEqual(self.take(1), [('reject_join', second, 'Погнали')])
+
+    def test_failed_join_lifts_the_reservation(self):
+        first, second = self.chat_on(0), self.chat_on(1)
+        self.supervisor.route(make_message(first, 10, 'Погнали', reply_to_bot=True))
+        self.supervisor._on_event('joined', first, 10)
+        self.supervisor.route(make_message(second, 10, 'Погнали', reply_to_bot=True))
+        self.assertEqual(self.take(1), [('acquire', second, None), ('join', second, 'Погнали')])
+
+    def test_card_text_and_plain_replies_are_not_joins(self):
+        chat_id = self.chat_on(0)
+        self.supervisor.route(make_message(chat_id, 10, '7♦', reply_to_bot=True))
+        self.supervisor.route(make_message(chat_id, 10, 'Погнали'))
+        self.assertEqual([x[0] for x in self.take(0)], ['acquire', 'update', 'update'])
+
+    def test_moving_chat_is_released_before_it_is_resumed(self):
+        ring = HashRing(range(3))
+        chat_id = next(x for x in range(-1, -1000, -1) if ring.get_node(x) == 2)
+        shard_id = self.supervisor._ring.get_node(chat_id)
+        self.supervisor.route(make_message(chat_id, 10, 'a'))
+        self.take_all()
+        self.assertEqual(self.supervisor.add_worker(), 2)
+        self.supervisor.route(make_message(chat_id, 10, 'b'))
+        self.supervisor.route(make_message(chat_id, 11, 'Погнали', reply_to_bot=True))
+        self.assertEqual(self.take(shard_id), [('release', chat_id, None)])
+        self.assertEqual(self.take(2), [])
+        self.supervisor._on_event('released', chat_id, None)
+        self.assertEqual(self.take(2), [('acquire', chat_id, None), ('update', chat_id, 'b'),
+                                        ('join', chat_id, 'Погнали')])
+        self.assertEqual(self.supervisor.get_shard(chat_id), 2)
+
+    def test_restarted_worker_resumes_its_chats(self):
+        chat_id = self.chat_on(1)
+        self.supervisor.route(make_message(chat_id, 10, 'Погнали', reply_to_bot=True))
+        with self.assertLogs('goat.shards', 'WARNING'):
+            self.supervisor.restart_worker(1)
+        self.assertEqual(self.take(1), [('acquire', chat_id, None)])
+        # the join was lost with the old queue
+        self.supervisor.route(make_message(self.chat_on(0), 10, 'Погнали', reply_to_bot=True))
+        self.assertEqual(self.take(0)[-1][0], 'join')
+
+
+if __name__ == '__main__':
+    unittest.main()
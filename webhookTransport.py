@@ -0,0 +1,128 @@
+import json
+import logging
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit
+
+from telebot import types
+
+from chatExecutor import ChatExecutor
+
+logger = logging.getLogger('goat.webhook')
+
+SECRET_HEADER = 'X-Telegram-Bot-Api-Secret-Token'
+# Telegram retries a webhook delivery that did not get a 2xx answer
+RETRY_AFTER = 1
+
+
+class _WebhookHTTPServer(ThreadingHTTPServer):
+    # Telegram opens up to max_connections (100 at most) connections at once
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class _WebhookRequestHandler(BaseHTTPRequestHandler):
+    # set on the subclass made by WebhookServer
+    webhook = None
+
+    def do_POST(self):
+        webhook = self.webhook
+        if self.path != webhook.path:
+            self.send_error(404)
+            return
+        if webhook.secret_token is not None and self.headers.get(SECRET_HEADER) != webhook.secret_token:
+            self.send_error(403)
+            return
+        try:
+            body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+        except ValueError:
+            self.send_error(400)
+            return
+        if not webhook.accept(body if isinstance(body, list) else [body]):
+            self.send_response(503)
+            self.send_header('Retry-After', str(RETRY_AFTER))
+            self.send_header('Content-Length', '0')
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header('Content-Length', '0')
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        logger.debug('webhook %s', format % args)
+
+
+class WebhookServer:
+    """Receives updates over HTTP and runs the bot's message handlers on a ChatExecutor.
+
+    Requests are read concurrently; each chat's updates are handled one at a time in arrival order. A batch that
+    does not fit in max_pending is refused with 503 as a whole, so Telegram delivers it again later."""
+
+    def __init__(self, tele_bot, chat_key, host: str = '0.0.0.0', port: int = 8080, path: str = '/',
+                 secret_token: str | None = None, max_workers: int = 16, max_pending: int = 1000,
+                 executor: ChatExecutor | None = None):
+        logger.debug('WebhookServer constructor called %s:%s%s', host, port, path)
+        self.bot = tele_bot
+        # handlers run on the executor threads, not on the bot's own worker pool
+        tele_bot.threaded = False
+        self.chat_key = chat_key
+        self.path = path
+        self.secret_token = secret_token
+        # one passed in belongs to the caller and is left running by stop()
+        self._owns_executor = executor is None
+        self.executor = executor if executor is not None else ChatExecutor(max_workers, max_pending)
+        handler = type('WebhookRequestHandler', (_WebhookRequestHandler,), {'webhook': self})
+        self._server = _WebhookHTTPServer((host, port), handler)
+        self._thread = None
+        self.accepted = 0
+        self.refused = 0
+
+    @property
+    def server_address(self) -> tuple:
+        return self._server.server_address
+
+    def accept(self, updates: list[dict]) -> bool:
+        tasks = []
+        for data in updates:
+            message = types.Update.de_json(data).message
+            if message is not None:
+                tasks.append((self.chat_key(message), self.bot.process_new_messages, ([message],)))
+        if not self.executor.try_submit_all(tasks):
+            self.refused += len(updates)
+            logger.warning('WebhookServer refused %s updates, %s pending', len(updates),
+                           self.executor.pending_count())
+            return False
+        self.accepted += len(updates)
+        return True
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='goat-webhook', daemon=True)
+        self._thread.start()
+        logger.info('Webhook listening on %s:%s%s', *self.server_address[:2], self.path)
+
+    def stop(self):
+        logger.debug('WebhookServer.stop called')
+        self._server.shutdown()
+        self._server.server_close()
+        if self._owns_executor:
+            self.executor.shutdown()
+
+    def serve_forever(self):
+        self.start()
+        try:
+            self._thread.join()
+        finally:
+            self.stop()
+
+
+def run_webhook(tele_bot, chat_key, url: str | None, host: str, port: int, secret_token: str | None = None,
+                max_workers: int = 16, max_pending: int = 1000, executor: ChatExecutor | None = None):
+    """Registers `url` with Telegram, when given, and serves the webhook on its path until interrupted."""
+    path = (urlsplit(url).path or '/') if url is not None else '/'
+    server = WebhookServer(tele_bot, chat_key, host, port, path, secret_token, max_workers, max_pending, executor)
+    if url is not None:
+        tele_bot.set_webhook(url=url, secret_token=secret_token, max_connections=max_workers)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info('Webhook stopped')